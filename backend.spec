@@ -25,6 +25,12 @@ datas = [
     # Application templates
     ('backend/templates', 'templates'),
 
+    # Bundled fonts (embedded into PDFs / served to the print view offline)
+    ('backend/static/fonts', 'static/fonts'),
+
+    # Versioned schema migrations (applied by schema_migrations.py at startup)
+    ('backend/migrations', 'migrations'),
+
     # Desktop HTML files and static assets
     ('desktop/index.html', 'desktop'),
     ('desktop/static', 'desktop/static'),
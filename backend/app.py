@@ -1,144 +1,391 @@
-from flask import Flask, send_from_directory, jsonify
-from flask_cors import CORS
+"""
+Flask application for the Smart Purchase Slip backend
+
+create_app() only builds the Flask app (blueprints and page routes) and never
+touches the database, so the HTTP port can be listening within a few hundred
+milliseconds. The slow work is an explicit startup step, run_startup():
+
+- init_schema(): connection pool, database and table migrations (init_db)
+- start_background_services(): scheduled backup, idempotency key purge, PDF
+  browser pool pre-launch, PDF job queue
+
+start_deferred_startup() runs that step in a background thread; python app.py
+and serve.py call it as soon as the app exists, and the first request starts it
+under any other WSGI host. Pages and static assets are served straight away;
+other requests wait (up to schema_wait seconds) for the schema step. Modules
+only some requests need (PDF service, WhatsApp, NumPy) are imported on first use.
+
+Every phase is timed; the timings are logged and returned by GET /api/startup.
+Logging is set up first (see logging_setup.py), before any module logs.
+
+CONFIGURATION (config.json "startup" block, all optional):
+- schema: "background" (default) runs the startup step in a thread,
+  "blocking" runs it inside create_app(), "skip" leaves the schema step to
+  `python app.py --init-db` / `flask --app app init-db` (services still start)
+- schema_wait: seconds a request waits for the schema step before it is
+  handled anyway
+"""
+import time
+
+_PROCESS_START = time.perf_counter()
+
 import sys
 import os
-import traceback
+import logging
+import threading
 
-print("\n" + "="*60)
-print("SMART PURCHASE SLIP BACKEND - STARTUP")
-print("="*60)
-print(f"[INFO] Python version: {sys.version}")
-print(f"[INFO] Platform: {sys.platform}")
-print(f"[INFO] Frozen: {getattr(sys, 'frozen', False)}")
-print(f"[INFO] CWD: {os.getcwd()}")
+from flask import Flask, send_from_directory, jsonify, request
+from flask_cors import CORS
 
 # Setup path for imports (works in both dev and PyInstaller)
 if getattr(sys, 'frozen', False):
     # Running as compiled executable
     bundle_dir = sys._MEIPASS
     sys.path.insert(0, bundle_dir)
-    print(f"[INFO] Bundle dir (_MEIPASS): {bundle_dir}")
-    print(f"[INFO] Executable: {sys.executable}")
-    print(f"[INFO] Executable dir: {os.path.dirname(sys.executable)}")
 else:
     # Running in normal Python environment
-    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    print(f"[INFO] Running in development mode")
-
-print(f"[INFO] sys.path: {sys.path[:3]}...")
-
-# Import modules with detailed error reporting
-try:
-    print("[INFO] Importing database module...")
-    from database import init_db, get_next_bill_no
-    print("[OK] Database module imported")
-
-    print("[INFO] Importing routes modules...")
-    from routes.slips import slips_bp
-    from routes.auth import auth_bp
-    print("[OK] Routes modules imported")
-
-    print("[INFO] Importing backup service...")
-    from scheduled_backup import start_backup_service
-    print("[OK] Backup service imported")
-except ImportError as e:
-    print(f"[FATAL] Import error: {e}")
-    print(f"[FATAL] Traceback:\n{traceback.format_exc()}")
-    print(f"[FATAL] sys.path: {sys.path}")
-    print(f"[FATAL] Current directory: {os.getcwd()}")
-    if getattr(sys, 'frozen', False):
-        print(f"[FATAL] Bundle directory: {sys._MEIPASS}")
-        print(f"[FATAL] Bundle contents: {os.listdir(sys._MEIPASS)[:20]}")
-    sys.exit(1)
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(backend_dir))
+    # Bare module imports (database, routes, ...) also when loaded as backend.app (flask --app)
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
 
-# Setup Flask paths (works in both dev and PyInstaller)
-print("[INFO] Setting up Flask paths...")
+from config_loader import get_config_section
+from logging_setup import setup_logging, init_request_logging
+from metrics import init_metrics
+
+setup_logging()
+logger = logging.getLogger(__name__)
+logger.info("Smart Purchase Slip backend starting")
+logger.info(f"Python {sys.version.split()[0]} on {sys.platform} (frozen: {getattr(sys, 'frozen', False)})")
 if getattr(sys, 'frozen', False):
-    # Running as compiled executable - all files are bundled in _MEIPASS
-    template_folder = os.path.join(sys._MEIPASS, 'templates')
-    static_folder = os.path.join(sys._MEIPASS, 'frontend', 'static')
-    frontend_folder = os.path.join(sys._MEIPASS, 'frontend')
-    print(f"[INFO] Template folder: {template_folder}")
-    print(f"[INFO] Static folder: {static_folder}")
-    print(f"[INFO] Frontend folder: {frontend_folder}")
-    print(f"[INFO] Template folder exists: {os.path.exists(template_folder)}")
-    print(f"[INFO] Frontend folder exists: {os.path.exists(frontend_folder)}")
-    if os.path.exists(template_folder):
-        print(f"[INFO] Templates: {os.listdir(template_folder)}")
-    if os.path.exists(frontend_folder):
-        print(f"[INFO] Frontend files: {os.listdir(frontend_folder)}")
-else:
+    logger.info(f"Bundle dir (_MEIPASS): {sys._MEIPASS}")
+
+STARTUP_DEFAULTS = {
+    'schema': 'background',
+    'schema_wait': 30,
+}
+
+STARTUP_SCHEMA_MODES = ('background', 'blocking', 'skip')
+
+# Endpoints served without waiting for the schema step (what the UI needs to appear)
+STARTUP_EXEMPT_ENDPOINTS = {
+    'index', 'app_page', 'serve_assets', 'serve_fonts', 'static', 'startup_status',
+    'prometheus_metrics', 'metrics_summary',
+}
+
+# Scheduled jobs run in one process only (serve.py sets "0" in the other gunicorn workers)
+BACKGROUND_JOBS_ENV = 'SLIP_SERVER_BACKGROUND_JOBS'
+
+
+class StartupTimer:
+    """Wall-clock duration of each startup phase"""
+
+    def __init__(self, started):
+        self.started = started
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        return _TimedPhase(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        with self._lock:
+            return ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+
+    def to_dict(self):
+        with self._lock:
+            return {name: round(seconds * 1000, 1) for name, seconds in self.phases}
+
+
+class _TimedPhase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StartupState:
+    """Progress of the startup step (app.extensions['startup'])"""
+
+    def __init__(self, settings, timer):
+        self.settings = settings
+        self.timer = timer
+        self.schema_ready = threading.Event()
+        self.schema_error = None
+        self.services_started = False
+        self._claimed = False
+        self._lock = threading.Lock()
+
+    def claim(self):
+        """True for the first caller only - the startup step runs once per process"""
+        with self._lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+
+def _flask_folders():
+    """(template_folder, static_folder, frontend_folder) in dev and PyInstaller builds"""
+    if getattr(sys, 'frozen', False):
+        # Running as compiled executable - all files are bundled in _MEIPASS
+        return (
+            os.path.join(sys._MEIPASS, 'templates'),
+            os.path.join(sys._MEIPASS, 'frontend', 'static'),
+            os.path.join(sys._MEIPASS, 'frontend'),
+        )
     # Running in normal Python environment
-    template_folder = 'templates'
-    static_folder = '../frontend/static'
-    frontend_folder = '../frontend'
-
-print("[INFO] Creating Flask app...")
-app = Flask(__name__,
-            static_folder=static_folder,
-            template_folder=template_folder)
-
-print("[INFO] Enabling CORS...")
-CORS(app)
-
-print("[INFO] Registering blueprints...")
-app.register_blueprint(slips_bp)
-app.register_blueprint(auth_bp)
-print("[OK] Blueprints registered")
-
-# Initialize database with error handling
-print("[INFO] Initializing database...")
-try:
-    init_db()
-    print("[OK] Database initialized successfully")
-except Exception as e:
-    print(f"[ERROR] Database initialization failed: {e}")
-    print(f"[ERROR] Traceback:\n{traceback.format_exc()}")
-    print("[WARNING] Continuing without database - some features may not work")
-    # Don't exit - allow Flask to start so we can see error messages
-
-# Start automated backup service
-print("[INFO] Starting automated backup service...")
-try:
-    start_backup_service()
-    print("[OK] Automated backup service started")
-except Exception as e:
-    print(f"[WARNING] Failed to start backup service: {e}")
-    print("[INFO] Backups will not run automatically")
-
-@app.route('/')
-def index():
-    """Serve the login page"""
-    return send_from_directory(frontend_folder, 'login.html')
-
-@app.route('/app')
-def app_page():
-    """Serve the main application page - SINGLE HTML FILE"""
-    return send_from_directory(frontend_folder, 'app.html')
-
-# /create route REMOVED - form is now embedded in app.html
-
-@app.route('/assets/<path:filename>')
-def serve_assets(filename):
-    """Serve static assets"""
-    assets_folder = os.path.join(frontend_folder if isinstance(frontend_folder, str) and not frontend_folder.startswith('..') else os.path.join(os.path.dirname(__file__), frontend_folder), 'assets')
-    return send_from_directory(assets_folder, filename)
-
-@app.route('/api/next-bill-no')
-def next_bill_no_route():
-    """Get next bill number"""
-    return jsonify({'bill_no': get_next_bill_no()})
+    return 'templates', '../frontend/static', '../frontend'
+
+
+def _register_pages(app, frontend_folder):
+    @app.route('/')
+    def index():
+        """Serve the login page"""
+        return send_from_directory(frontend_folder, 'login.html')
+
+    @app.route('/app')
+    def app_page():
+        """Serve the main application page - SINGLE HTML FILE"""
+        return send_from_directory(frontend_folder, 'app.html')
+
+    # /create route REMOVED - form is now embedded in app.html
+
+    @app.route('/assets/<path:filename>')
+    def serve_assets(filename):
+        """Serve static assets"""
+        assets_folder = os.path.join(frontend_folder if isinstance(frontend_folder, str) and not frontend_folder.startswith('..') else os.path.join(os.path.dirname(__file__), frontend_folder), 'assets')
+        return send_from_directory(assets_folder, filename)
+
+    @app.route('/fonts/<path:filename>')
+    def serve_fonts(filename):
+        """Serve bundled fonts so the print view works without internet access"""
+        from pdf_assets import get_fonts_dir
+        return send_from_directory(get_fonts_dir(), filename)
+
+    @app.route('/api/next-bill-no')
+    def next_bill_no_route():
+        """
+        Preview of the next bill number for the current financial year
+        (nothing is reserved; the number is assigned when the slip is saved)
+        """
+        from datetime import datetime
+        from pytz import timezone
+        from database import db_session
+        from bill_numbers import get_bill_number_allocator, fiscal_year_of, format_fiscal_year
+
+        fiscal_year = fiscal_year_of(datetime.now(timezone('Asia/Kolkata')))
+        with db_session() as session:
+            bill_no = get_bill_number_allocator().peek(session, fiscal_year)
+        return jsonify({'bill_no': bill_no, 'fiscal_year': format_fiscal_year(fiscal_year)})
+
+
+def _register_startup_hooks(app, state):
+    schema_wait = float(state.settings['schema_wait'])
+
+    @app.before_request
+    def wait_for_schema():
+        if state.schema_ready.is_set() or request.endpoint in STARTUP_EXEMPT_ENDPOINTS:
+            return None
+        # Under a WSGI host that did not call start_deferred_startup()
+        start_deferred_startup(app)
+        if not state.schema_ready.wait(schema_wait):
+            logger.warning(f"Schema step still running after {schema_wait:g}s - handling {request.path} anyway")
+        return None
+
+    @app.route('/api/startup')
+    def startup_status():
+        """Startup phase timings (ms) and progress of the startup step"""
+        return jsonify({
+            'success': True,
+            'schema_ready': state.schema_ready.is_set(),
+            'schema_error': state.schema_error,
+            'services_started': state.services_started,
+            'phases_ms': state.timer.to_dict(),
+        })
+
+
+def create_app(settings=None):
+    """
+    Build the Flask app without touching the database
+
+    Args:
+        settings (dict): "startup" settings (default: the config.json block)
+
+    Returns:
+        Flask: The app; app.extensions['startup'] holds its StartupState
+
+    Raises:
+        ValueError: If startup.schema is not a known mode
+    """
+    settings = settings or get_config_section('startup', STARTUP_DEFAULTS)
+    if settings['schema'] not in STARTUP_SCHEMA_MODES:
+        raise ValueError(f"startup.schema must be one of: {', '.join(STARTUP_SCHEMA_MODES)}")
+
+    timer = StartupTimer(_PROCESS_START)
+    timer.record('flask imports', time.perf_counter() - _PROCESS_START)
+    state = StartupState(settings, timer)
+
+    try:
+        with timer.phase('route imports'):
+            from routes.slips import slips_bp
+            from routes.auth import auth_bp
+    except ImportError as e:
+        logger.critical(f"Import error: {e}", exc_info=True)
+        logger.critical(f"sys.path: {sys.path}")
+        if getattr(sys, 'frozen', False):
+            logger.critical(f"Bundle contents: {os.listdir(sys._MEIPASS)[:20]}")
+        raise
+
+    with timer.phase('app setup'):
+        template_folder, static_folder, frontend_folder = _flask_folders()
+        app = Flask(__name__,
+                    static_folder=static_folder,
+                    template_folder=template_folder)
+        CORS(app)
+        init_request_logging(app)
+        init_metrics(app)
+        app.register_blueprint(slips_bp)
+        app.register_blueprint(auth_bp)
+        _register_pages(app, frontend_folder)
+        _register_startup_hooks(app, state)
+        app.extensions['startup'] = state
+
+        @app.cli.command('init-db')
+        def init_db_command():
+            """Create the database and run the schema migrations"""
+            if not init_schema(app):
+                sys.exit(1)
+
+    logger.info(f"App created in {timer.elapsed() * 1000:.0f}ms ({timer.summary()})")
+
+    if settings['schema'] == 'blocking':
+        run_startup(app)
+    return app
+
+
+def init_schema(app):
+    """
+    The schema step: connection pool, database and table migrations
+
+    Returns:
+        bool: True if the schema is up to date
+    """
+    state = app.extensions['startup']
+    with state.timer.phase('schema'):
+        try:
+            from database import init_db
+            init_db()
+            state.schema_error = None
+            logger.info("Database initialized successfully")
+            return True
+        except Exception as e:
+            state.schema_error = str(e)
+            logger.exception(f"Database initialization failed: {e}")
+            logger.warning("Continuing without database - some features may not work")
+            return False
+
+
+def start_background_services(app):
+    """Start the scheduled jobs and pre-warm the PDF pipeline (each one optional)"""
+    state = app.extensions['startup']
+    with state.timer.phase('background services'):
+        if os.environ.get(BACKGROUND_JOBS_ENV, '1') != '0':
+            try:
+                from scheduled_backup import start_backup_service
+                start_backup_service()
+                logger.info("Automated backup service started")
+            except Exception as e:
+                logger.warning(f"Failed to start backup service: {e}")
+                logger.info("Backups will not run automatically")
+
+            # Purge expired idempotency keys in the background
+            try:
+                from idempotency import start_idempotency_purger
+                start_idempotency_purger()
+            except Exception as e:
+                logger.warning(f"Could not start idempotency key purge: {e}")
+
+            # Run background PDF jobs, including those persisted before the last shutdown
+            # (other workers only queue them)
+            try:
+                from pdf_jobs import start_pdf_job_queue
+                start_pdf_job_queue()
+            except Exception as e:
+                logger.warning(f"Could not start PDF job queue: {e}")
+        else:
+            logger.info("Scheduled backup, idempotency purge and PDF jobs run in another worker")
+
+        # Pre-launch the PDF browser pool so the first slip does not pay Chromium startup
+        try:
+            from pdf_engine import start_pdf_engine
+            start_pdf_engine()
+            logger.info("PDF browser pool launching in background")
+        except Exception as e:
+            logger.warning(f"Could not pre-launch PDF browser pool: {e}")
+            logger.info("Browsers will be launched on the first PDF request")
+    state.services_started = True
+
+
+def _startup_step(app):
+    state = app.extensions['startup']
+    try:
+        if state.settings['schema'] == 'skip':
+            logger.info("Schema step skipped (startup.schema = \"skip\") - run 'python app.py --init-db'")
+        else:
+            init_schema(app)
+    finally:
+        # Waiting requests go ahead either way; after a failure they report their own DB errors
+        state.schema_ready.set()
+    start_background_services(app)
+    logger.info(f"Startup complete in {state.timer.elapsed() * 1000:.0f}ms ({state.timer.summary()})")
+
+
+def run_startup(app):
+    """The startup step: schema (unless skipped), then background services; once per process"""
+    if app.extensions['startup'].claim():
+        _startup_step(app)
+
+
+def start_deferred_startup(app):
+    """run_startup() in a background thread (no-op once the step has been started)"""
+    if app.extensions['startup'].claim():
+        threading.Thread(target=_startup_step, args=(app,), name='app-startup', daemon=True).start()
+
+
+app = create_app()
 
 if __name__ == '__main__':
-    print("\n" + "="*60)
-    print("RICE MILL PURCHASE SLIP MANAGER")
-    print("="*60)
-    print("\n[OK] Server starting...")
-    print("[INFO] Backend running on: http://127.0.0.1:5000")
-    if getattr(sys, 'frozen', False):
-        print("[INFO] Running from packaged executable")
-    print("\n[INFO] Press CTRL+C to stop the server\n")
+    if '--init-db' in sys.argv[1:]:
+        sys.exit(0 if init_schema(app) else 1)
 
     # Use debug mode only in development
     is_debug = not getattr(sys, 'frozen', False)
+
+    # With debug on, the reloader's parent process only watches files; start the
+    # schema step, job workers and browser pool in the child that serves requests
+    if not is_debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_deferred_startup(app)
+
+    logger.info("Rice Mill Purchase Slip Manager - backend running on: http://127.0.0.1:5000")
+    if getattr(sys, 'frozen', False):
+        logger.info("Running from packaged executable")
+    logger.info("Development server - use 'python -m backend.serve' in production")
+    logger.info("Press CTRL+C to stop the server")
+
     app.run(debug=is_debug, host='127.0.0.1', port=5000)
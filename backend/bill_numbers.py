@@ -0,0 +1,150 @@
+"""
+Bill number allocation per Indian financial year (April - March)
+
+Bill numbers restart at 1 every financial year and are handed out from the
+bill_sequences counter table with a single atomic statement:
+
+    UPDATE bill_sequences SET last_value = LAST_INSERT_ID(last_value + n) WHERE fiscal_year = %s
+
+LAST_INSERT_ID(expr) hands the new value back on the same connection (no SELECT
+MAX, no extra round trip), and concurrent counters can never get the same number.
+purchase_slips has UNIQUE (fiscal_year, bill_no) as a backstop.
+
+- block_size 1 (default): the number is taken inside the slip's insert
+  transaction, so a rolled-back insert also gives its number back (no gaps)
+- block_size > 1: each process reserves a block of numbers in its own short
+  transaction and hands them out from memory, so the counter row is touched once
+  per block. Numbers left in a block when the process stops are skipped.
+
+A fiscal year is stored as its starting calendar year (2026 = FY 2026-27).
+
+CONFIGURATION (config.json "bill_numbers" block, all optional):
+- block_size: numbers reserved per round trip to the counter table
+"""
+import threading
+
+from config_loader import get_config_section
+from database import transaction
+
+BILL_NUMBER_DEFAULTS = {
+    'block_size': 1,
+}
+
+# SQL equivalent of fiscal_year_of() for backfilling existing slips
+FISCAL_YEAR_SQL = 'YEAR(date) - (MONTH(date) < 4)'
+
+
+def fiscal_year_of(value):
+    """Financial year (starting calendar year) of a date: Jan-Mar belong to the previous year"""
+    return value.year if value.month >= 4 else value.year - 1
+
+
+def format_fiscal_year(fiscal_year):
+    """2026 -> '2026-27'"""
+    return f'{fiscal_year}-{(fiscal_year + 1) % 100:02d}'
+
+
+def _ensure_sequence(session, fiscal_year):
+    # First use of a year: start after the highest bill already stored for it
+    session.execute('''
+        INSERT IGNORE INTO bill_sequences (fiscal_year, last_value)
+        SELECT %s, COALESCE(MAX(bill_no), 0) FROM purchase_slips WHERE fiscal_year = %s
+    ''', (fiscal_year, fiscal_year), name='bills.sequence_create')
+
+
+def reserve_bill_numbers(session, fiscal_year, count=1):
+    """
+    Atomically take `count` consecutive bill numbers for a financial year
+
+    Args:
+        session (DBSession): Session whose transaction the reservation belongs to
+        fiscal_year (int): Financial year (starting calendar year)
+        count (int): How many numbers
+
+    Returns:
+        int: First number of the reserved range [first, first + count)
+    """
+    count = int(count)
+    if count < 1:
+        raise ValueError('count must be at least 1')
+
+    sql = 'UPDATE bill_sequences SET last_value = LAST_INSERT_ID(last_value + %s) WHERE fiscal_year = %s'
+    cursor = session.execute(sql, (count, fiscal_year), name='bills.reserve')
+    if cursor.rowcount == 0:
+        _ensure_sequence(session, fiscal_year)
+        cursor = session.execute(sql, (count, fiscal_year), name='bills.reserve')
+    return cursor.lastrowid - count + 1
+
+
+class BillNumberAllocator:
+    """Hands out bill numbers, optionally from blocks reserved per process"""
+
+    def __init__(self, block_size=1):
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._blocks = {}   # fiscal_year -> [next number, end (exclusive)]
+
+    def _take_from_block(self, fiscal_year):
+        block = self._blocks.get(fiscal_year)
+        if block is None or block[0] >= block[1]:
+            return None
+        number = block[0]
+        block[0] += 1
+        return number
+
+    def allocate(self, session, fiscal_year):
+        """
+        Next bill number for a financial year
+
+        With block_size 1 the number is reserved in `session`'s transaction; with
+        blocks it comes from this process's current block (refilled in a separate
+        transaction when empty).
+        """
+        if self.block_size == 1:
+            return reserve_bill_numbers(session, fiscal_year)
+
+        with self._lock:
+            number = self._take_from_block(fiscal_year)
+            if number is None:
+                with transaction() as block_session:
+                    first = reserve_bill_numbers(block_session, fiscal_year, self.block_size)
+                self._blocks[fiscal_year] = [first, first + self.block_size]
+                number = self._take_from_block(fiscal_year)
+            return number
+
+    def peek(self, session, fiscal_year):
+        """
+        Number the next slip of the year will probably get (for the entry form)
+
+        Nothing is reserved, so under concurrent entry the saved slip may get a
+        later number; the saved number is returned by POST /api/add-slip.
+        """
+        with self._lock:
+            block = self._blocks.get(fiscal_year)
+            if block is not None and block[0] < block[1]:
+                return block[0]
+
+        row = session.fetchone(
+            'SELECT last_value FROM bill_sequences WHERE fiscal_year = %s', (fiscal_year,), name='bills.peek'
+        )
+        if row is None:
+            # Year not started yet: served by the (fiscal_year, bill_no) unique index
+            row = session.fetchone(
+                'SELECT COALESCE(MAX(bill_no), 0) as last_value FROM purchase_slips WHERE fiscal_year = %s',
+                (fiscal_year,), name='bills.peek_max'
+            )
+        return int(row['last_value']) + 1
+
+
+# Global allocator instance (created lazily)
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_bill_number_allocator():
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            settings = get_config_section('bill_numbers', BILL_NUMBER_DEFAULTS)
+            _allocator = BillNumberAllocator(block_size=settings['block_size'])
+        return _allocator
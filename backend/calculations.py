@@ -0,0 +1,284 @@
+"""
+Slip calculations: weights, amounts, deductions and payment totals
+
+One implementation shared by the routes, the bulk import and the PDF service.
+
+- calculate_fields() / calculate_payment_totals(): one slip (dict) at a time
+- calculate_batch(): many slips at once. With NumPy installed (optional,
+  `pip install numpy`) the formulas run on whole columns; without it every row
+  goes through calculate_fields().
+
+Both paths give identical results, down to the type: every number is a float
+(a blank input is 0.0, never the int 0), so a slip serializes the same from
+either path. NumPy rounds by scaling, rint() and scaling back, which only picks
+a different neighbour than Python's round() when the scaled value sits within
+rounding error of a .5 tie; those few elements are re-rounded with round() (see
+_round). tests/test_calculations.py checks the two paths against each other.
+"""
+import importlib.util
+import threading
+
+# NumPy is imported on the first batch call, not at startup (the import alone
+# takes ~60ms and most processes never run a batch)
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+np = None
+_numpy_lock = threading.Lock()
+
+# Payment slots per slip (instalment_1_* .. instalment_5_* columns)
+INSTALMENT_COUNT = 5
+
+RATE_BASES = ('Quintal', 'Khandi')
+
+# Inputs read by calculate_fields
+INPUT_FIELDS = [
+    'net_weight_kg', 'gunny_weight_kg', 'bags', 'rate_value',
+    'bank_commission', 'postage', 'freight', 'rate_diff', 'quality_diff', 'moisture_ded', 'tds',
+    'batav_percent', 'shortage_percent', 'dalali_rate', 'hammali_rate',
+]
+
+# Fields calculate_fields sets on the slip
+CALCULATED_FIELDS = [
+    'net_weight_kg', 'gunny_weight_kg', 'final_weight_kg', 'weight_quintal', 'weight_khandi',
+    'avg_bag_weight', 'rate_basis', 'rate_value', 'total_purchase_amount', 'batav', 'shortage',
+    'dalali', 'hammali', 'freight', 'rate_diff', 'quality_diff', 'moisture_ded', 'tds', 'postage',
+    'total_deduction', 'payable_amount',
+]
+
+
+def safe_float(value, default=0.0):
+    """Safely convert value to float, handling empty strings and None"""
+    try:
+        if value in (None, '', ' '):
+            return default
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# ==================== SCALAR PATH ====================
+
+def calculate_payment_totals(data):
+    """
+    Calculate Total Paid Amount and Balance Amount dynamically
+    Total Paid = stored total_paid (sum of slip_payments), or the sum of all
+    instalment amounts for rows not migrated yet
+    Balance = stored balance, or Payable Amount - Total Paid
+
+    Returns:
+        tuple: (total_paid, balance_amount)
+    """
+    payable_amount = safe_float(data.get('payable_amount'))
+
+    if data.get('total_paid') is not None:
+        total_paid = safe_float(data['total_paid'])
+    else:
+        total_paid = 0.0
+        for i in range(1, INSTALMENT_COUNT + 1):
+            total_paid += safe_float(data.get(f'instalment_{i}_amount', 0), 0)
+
+    total_paid = round(total_paid, 2)
+    if data.get('balance') is not None:
+        balance_amount = round(safe_float(data['balance']), 2)
+    else:
+        balance_amount = round(payable_amount - total_paid, 2)
+
+    return total_paid, balance_amount
+
+
+def calculate_fields(data):
+    """Calculate all computed fields with NEW weight & rate system"""
+    net_weight_kg = safe_float(data.get('net_weight_kg'))
+    gunny_weight_kg = safe_float(data.get('gunny_weight_kg'))
+    bags = safe_float(data.get('bags'))
+    rate_basis = data.get('rate_basis', 'Quintal')
+    rate_value = safe_float(data.get('rate_value'))
+
+    bank_commission = safe_float(data.get('bank_commission'))
+    postage = safe_float(data.get('postage'))
+    freight = safe_float(data.get('freight'))
+    rate_diff = safe_float(data.get('rate_diff'))
+    quality_diff = safe_float(data.get('quality_diff'))
+    moisture_ded = safe_float(data.get('moisture_ded'))
+    tds = safe_float(data.get('tds'))
+    batav_percent = safe_float(data.get('batav_percent'))
+    shortage_percent = safe_float(data.get('shortage_percent'))
+    dalali_rate = safe_float(data.get('dalali_rate'))
+    hammali_rate = safe_float(data.get('hammali_rate'))
+
+    final_weight_kg = round(max(0.0, net_weight_kg - gunny_weight_kg), 2)
+    weight_quintal = round(final_weight_kg / 100, 3)
+    weight_khandi = round(final_weight_kg / 150, 3)
+    avg_bag_weight = round(final_weight_kg / bags, 2) if bags > 0 else 0.0
+
+    if rate_basis == 'Quintal':
+        total_purchase_amount = round(weight_quintal * rate_value, 2)
+    elif rate_basis == 'Khandi':
+        total_purchase_amount = round(weight_khandi * rate_value, 2)
+    else:
+        total_purchase_amount = 0.0
+
+    batav = round(total_purchase_amount * (batav_percent / 100), 2) if batav_percent > 0 else 0.0
+    shortage = round(total_purchase_amount * (shortage_percent / 100), 2) if shortage_percent > 0 else 0.0
+
+    # NEW CALCULATION: Dalali & Hamali based on Net Weight KG / 100
+    dalali = round((net_weight_kg / 100) * dalali_rate, 2) if dalali_rate > 0 else 0.0
+    hammali = round((net_weight_kg / 100) * hammali_rate, 2) if hammali_rate > 0 else 0.0
+
+    total_deduction = round(bank_commission + postage + batav + shortage + dalali + hammali + freight + rate_diff + quality_diff + moisture_ded + tds, 2)
+    payable_amount = round(total_purchase_amount - total_deduction, 2)
+
+    data.update({
+        'net_weight_kg': net_weight_kg,
+        'gunny_weight_kg': gunny_weight_kg,
+        'final_weight_kg': final_weight_kg,
+        'weight_quintal': weight_quintal,
+        'weight_khandi': weight_khandi,
+        'avg_bag_weight': avg_bag_weight,
+        'rate_basis': rate_basis,
+        'rate_value': rate_value,
+        'total_purchase_amount': total_purchase_amount,
+        'batav': batav,
+        'shortage': shortage,
+        'dalali': dalali,
+        'hammali': hammali,
+        'freight': freight,
+        'rate_diff': rate_diff,
+        'quality_diff': quality_diff,
+        'moisture_ded': moisture_ded,
+        'tds': tds,
+        'postage': postage,
+        'total_deduction': total_deduction,
+        'payable_amount': payable_amount
+    })
+    return data
+
+
+# ==================== BATCH PATH ====================
+
+def _load_numpy():
+    global np
+    with _numpy_lock:
+        if np is None:
+            import numpy
+            np = numpy
+    return np
+
+
+def _round(values, digits):
+    """Element-wise round(value, digits), bit-for-bit the same as Python's round()"""
+    scale = 10.0 ** digits
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+
+    # rint() can only disagree with round() when the exact scaled value is a .5
+    # tie or the multiplication's rounding error (<= 1/2 ulp) could have moved it
+    # across one
+    distance = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = np.nonzero(distance <= 2 * np.spacing(np.abs(scaled)))[0]
+    for i in near_tie:
+        rounded[i] = round(float(values[i]), digits)
+    return rounded
+
+
+def _column(rows, name):
+    return np.fromiter((safe_float(row.get(name)) for row in rows), dtype=np.float64, count=len(rows))
+
+
+def _calculate_batch_numpy(rows):
+    _load_numpy()
+    count = len(rows)
+    col = {name: _column(rows, name) for name in INPUT_FIELDS}
+    rate_basis = [row.get('rate_basis', 'Quintal') for row in rows]
+    quintal = np.fromiter((basis == 'Quintal' for basis in rate_basis), dtype=bool, count=count)
+    khandi = np.fromiter((basis == 'Khandi' for basis in rate_basis), dtype=bool, count=count)
+
+    # max(0, x) semantics (NaN -> 0), unlike np.maximum
+    net_of_gunny = col['net_weight_kg'] - col['gunny_weight_kg']
+    final_weight_kg = _round(np.where(net_of_gunny > 0, net_of_gunny, 0), 2)
+    weight_quintal = _round(final_weight_kg / 100, 3)
+    weight_khandi = _round(final_weight_kg / 150, 3)
+    bags = col['bags']
+    has_bags = bags > 0
+    avg_bag_weight = np.where(
+        has_bags, _round(np.divide(final_weight_kg, bags, out=np.zeros(count), where=has_bags), 2), 0
+    )
+
+    total_purchase_amount = np.where(
+        quintal, _round(weight_quintal * col['rate_value'], 2),
+        np.where(khandi, _round(weight_khandi * col['rate_value'], 2), 0)
+    )
+
+    batav_percent = col['batav_percent']
+    shortage_percent = col['shortage_percent']
+    batav = np.where(batav_percent > 0, _round(total_purchase_amount * (batav_percent / 100), 2), 0)
+    shortage = np.where(shortage_percent > 0, _round(total_purchase_amount * (shortage_percent / 100), 2), 0)
+
+    net_weight_kg = col['net_weight_kg']
+    dalali_rate = col['dalali_rate']
+    hammali_rate = col['hammali_rate']
+    dalali = np.where(dalali_rate > 0, _round((net_weight_kg / 100) * dalali_rate, 2), 0)
+    hammali = np.where(hammali_rate > 0, _round((net_weight_kg / 100) * hammali_rate, 2), 0)
+
+    # Same left-to-right order as the scalar sum
+    total_deduction = _round(
+        col['bank_commission'] + col['postage'] + batav + shortage + dalali + hammali + col['freight']
+        + col['rate_diff'] + col['quality_diff'] + col['moisture_ded'] + col['tds'], 2
+    )
+    payable_amount = _round(total_purchase_amount - total_deduction, 2)
+
+    columns = {
+        'net_weight_kg': net_weight_kg,
+        'gunny_weight_kg': col['gunny_weight_kg'],
+        'final_weight_kg': final_weight_kg,
+        'weight_quintal': weight_quintal,
+        'weight_khandi': weight_khandi,
+        'avg_bag_weight': avg_bag_weight,
+        'rate_value': col['rate_value'],
+        'total_purchase_amount': total_purchase_amount,
+        'batav': batav,
+        'shortage': shortage,
+        'dalali': dalali,
+        'hammali': hammali,
+        'freight': col['freight'],
+        'rate_diff': col['rate_diff'],
+        'quality_diff': col['quality_diff'],
+        'moisture_ded': col['moisture_ded'],
+        'tds': col['tds'],
+        'postage': col['postage'],
+        'total_deduction': total_deduction,
+        'payable_amount': payable_amount,
+    }
+    lists = {name: values.tolist() for name, values in columns.items()}
+    return [
+        {name: (rate_basis[i] if name == 'rate_basis' else lists[name][i]) for name in CALCULATED_FIELDS}
+        for i in range(count)
+    ]
+
+
+def calculate_batch(rows, use_numpy=None):
+    """
+    calculate_fields() for many slips
+
+    Args:
+        rows (list): Slip input dicts (not modified)
+        use_numpy (bool): Force (True) or skip (False) the NumPy path; default:
+            use it when installed
+
+    Returns:
+        list: One dict of CALCULATED_FIELDS per row, in order
+    """
+    if use_numpy is None:
+        use_numpy = NUMPY_AVAILABLE
+    if use_numpy and not NUMPY_AVAILABLE:
+        raise ImportError('NumPy is not installed')
+    if not rows:
+        return []
+
+    if not use_numpy:
+        results = []
+        for row in rows:
+            data = calculate_fields(dict(row))
+            results.append({name: data[name] for name in CALCULATED_FIELDS})
+        return results
+
+    return _calculate_batch_numpy(rows)
@@ -0,0 +1,91 @@
+"""
+Shared config.json loader
+Resolves config.json in both dev and PyInstaller/Electron layouts and exposes
+individual sections (database, server, pdf, ...) with defaults applied.
+"""
+import logging
+import os
+import sys
+import json
+import threading
+
+logger = logging.getLogger(__name__)
+
+_config_cache = None
+_config_path = None
+_config_lock = threading.Lock()
+
+
+def get_config_paths():
+    """Return candidate config.json locations in lookup order"""
+    config_paths = []
+
+    if getattr(sys, 'frozen', False):
+        bundle_dir = sys._MEIPASS
+        exe_dir = os.path.dirname(sys.executable)
+
+        # 1. In resources folder (Electron packaged app)
+        config_paths.append(os.path.join(exe_dir, '..', '..', 'resources', 'config.json'))
+        # 2. Next to dist-backend folder
+        config_paths.append(os.path.join(exe_dir, '..', 'config.json'))
+        # 3. In bundle directory
+        config_paths.append(os.path.join(bundle_dir, 'config.json'))
+        # 4. Same directory as executable
+        config_paths.append(os.path.join(exe_dir, 'config.json'))
+    else:
+        config_paths.append(os.path.join(os.path.dirname(__file__), '..', 'config.json'))
+
+    return [os.path.normpath(os.path.abspath(path)) for path in config_paths]
+
+
+def load_config(reload=False):
+    """
+    Load and cache the full config.json contents
+
+    Returns:
+        dict: Parsed config, or an empty dict if no readable file was found
+    """
+    global _config_cache, _config_path
+
+    with _config_lock:
+        if _config_cache is not None and not reload:
+            return _config_cache
+
+        for config_file in get_config_paths():
+            if not os.path.exists(config_file):
+                continue
+            try:
+                with open(config_file, 'r') as f:
+                    _config_cache = json.load(f)
+                    _config_path = config_file
+                    return _config_cache
+            except Exception as e:
+                logger.warning(f"Error reading config from {config_file}: {e}")
+
+        _config_cache = {}
+        _config_path = None
+        return _config_cache
+
+
+def get_loaded_config_path():
+    """Path of the config.json that was loaded, or None if defaults are in use"""
+    load_config()
+    return _config_path
+
+
+def get_config_section(name, defaults=None):
+    """
+    Get one top-level section of config.json merged over defaults
+
+    Args:
+        name (str): Section name, e.g. 'pdf'
+        defaults (dict): Values used for keys missing from config.json
+
+    Returns:
+        dict: New dict with defaults overridden by configured values
+    """
+    section = dict(defaults or {})
+    configured = load_config().get(name) or {}
+    if isinstance(configured, dict):
+        section.update(configured)
+    return section
@@ -0,0 +1,395 @@
+"""
+Dashboard aggregation engine
+
+The dashboard used to run ten aggregate queries over the same period of
+purchase_slips, each one re-scanning the rows and recomputing the instalment sums.
+Now the period is read from purchase_daily_rollup (one row per day x party x godown
+x material, carrying every sum the widgets need, maintained on write by rollup.py)
+and each widget is computed from those rows in a single pass in Python.
+
+Widgets: metrics, dailyPurchase, rateTrend, deductions, topSuppliers, ageing,
+paymentMode, godownStock, outstanding (response shape unchanged).
+
+build_dashboard(..., collect_timings=True) also returns a per-widget timing
+breakdown (the route exposes it in debug mode).
+"""
+import time
+
+from rollup import ROLLUP_TABLE, PAYMENT_MODES
+
+# Period -> WHERE condition on the rollup day (primary key prefix, so a range scan)
+PERIOD_CONDITIONS = {
+    'today': "day = CURDATE()",
+    'week': "day >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)",
+    'month': "day >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)",
+    'year': "day >= DATE_SUB(CURDATE(), INTERVAL 365 DAY)",
+}
+
+DEDUCTION_FIELDS = [
+    ('moisture', 'moisture_ded', 'Moisture'),
+    ('quality', 'quality_diff', 'Quality'),
+    ('dalali', 'dalali', 'Dalali'),
+    ('hammali', 'hammali', 'Hammali'),
+    ('commission', 'bank_commission', 'Commission'),
+    ('freight', 'freight', 'Freight'),
+]
+
+# Rollup rows renamed to the group fields the widgets read; blank names ('' key) become NULL
+DASHBOARD_GROUP_QUERY = '''
+    SELECT
+        day,
+        DATEDIFF(CURDATE(), day) as age_days,
+        CASE WHEN party_key = '' THEN NULL ELSE party_name END as party_name,
+        CASE WHEN godown_key = '' THEN NULL ELSE godown END as godown,
+        bills,
+        weight_quintal,
+        total_purchase_amount as purchase_amount,
+        total_deduction,
+        payable_amount,
+        paid_amount as paid,
+        {deductions},
+        {modes},
+        rate_sum,
+        rate_rows,
+        last_payment_date as last_payment
+    FROM {table}
+    {{where}}
+'''.format(
+    table=ROLLUP_TABLE,
+    deductions=',\n        '.join(f'{column} as ded_{key}' for key, column, _ in DEDUCTION_FIELDS),
+    modes=',\n        '.join(f'paid_{key}' for key, _ in PAYMENT_MODES),
+)
+
+
+def _num(value):
+    return float(value) if value else 0.0
+
+
+def _name_key(name):
+    # Rollup cells are keyed case-insensitively; merge rows the same way
+    return name.strip().lower() if isinstance(name, str) else name
+
+
+def _format_day(value):
+    if value is None:
+        return ''
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)[:10]
+
+
+# ==================== WIDGETS ====================
+
+class Widget:
+    """One dashboard widget: fed every group once, then asked for its result"""
+    name = None
+
+    def add(self, group):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class MetricsWidget(Widget):
+    name = 'metrics'
+
+    def __init__(self):
+        self.qntl = self.purchase = self.deductions = self.payable = self.paid = 0.0
+        self.bills = 0
+
+    def add(self, group):
+        self.qntl += _num(group['weight_quintal'])
+        self.purchase += _num(group['purchase_amount'])
+        self.deductions += _num(group['total_deduction'])
+        self.payable += _num(group['payable_amount'])
+        self.paid += _num(group['paid'])
+        self.bills += int(group['bills'] or 0)
+
+    def result(self):
+        return {
+            'totalPaddyQntl': self.qntl,
+            'totalPurchaseAmount': self.purchase,
+            'totalDeductions': self.deductions,
+            'netPayable': self.payable,
+            'totalBills': self.bills,
+            'totalPaid': self.paid,
+            'totalOutstanding': self.payable - self.paid,
+            'avgEffectiveRate': self.payable / self.qntl if self.qntl > 0 else 0.0,
+        }
+
+
+class DailyPurchaseWidget(Widget):
+    """Quintals per day (first 30 days of the period)"""
+    name = 'dailyPurchase'
+
+    def __init__(self):
+        self.by_day = {}
+
+    def add(self, group):
+        day = group['day']
+        self.by_day[day] = self.by_day.get(day, 0.0) + _num(group['weight_quintal'])
+
+    def result(self):
+        days = sorted(self.by_day)[:30]
+        return {
+            'dates': [_format_day(day) for day in days],
+            'quantities': [self.by_day[day] for day in days],
+        }
+
+
+class RateTrendWidget(Widget):
+    """Average payable per quintal per day, over slips with weight (first 30 days)"""
+    name = 'rateTrend'
+
+    def __init__(self):
+        self.by_day = {}
+
+    def add(self, group):
+        rows = int(group['rate_rows'] or 0)
+        if rows == 0:
+            return
+        rate_sum, count = self.by_day.get(group['day'], (0.0, 0))
+        self.by_day[group['day']] = (rate_sum + _num(group['rate_sum']), count + rows)
+
+    def result(self):
+        days = sorted(self.by_day)[:30]
+        return {
+            'dates': [_format_day(day) for day in days],
+            'rates': [self.by_day[day][0] / self.by_day[day][1] for day in days],
+        }
+
+
+class DeductionsWidget(Widget):
+    name = 'deductions'
+
+    def __init__(self):
+        self.totals = {key: 0.0 for key, _, _ in DEDUCTION_FIELDS}
+
+    def add(self, group):
+        for key in self.totals:
+            self.totals[key] += _num(group[f'ded_{key}'])
+
+    def result(self):
+        return {
+            'labels': [label for _, _, label in DEDUCTION_FIELDS],
+            'amounts': [self.totals[key] for key, _, _ in DEDUCTION_FIELDS],
+        }
+
+
+class TopSuppliersWidget(Widget):
+    """Top 10 parties by quintals"""
+    name = 'topSuppliers'
+
+    def __init__(self):
+        self.parties = {}
+
+    def add(self, group):
+        if group['party_name'] is None:
+            return
+        key = _name_key(group['party_name'])
+        name, qntl = self.parties.get(key, (group['party_name'], 0.0))
+        self.parties[key] = (name, qntl + _num(group['weight_quintal']))
+
+    def result(self):
+        top = sorted(self.parties.values(), key=lambda party: party[1], reverse=True)[:10]
+        return {
+            'names': [name for name, _ in top],
+            'quantities': [qntl for _, qntl in top],
+        }
+
+
+class _PartyBalance:
+    __slots__ = ('name', 'purchase', 'paid', 'payable', 'last_payment', 'min_age')
+
+    def __init__(self, name):
+        self.name = name
+        self.purchase = self.paid = self.payable = 0.0
+        self.last_payment = None
+        self.min_age = None
+
+
+class OutstandingWidget(Widget):
+    """Top 20 farmers by outstanding balance"""
+    name = 'outstanding'
+
+    def __init__(self):
+        self.parties = {}
+
+    def add(self, group):
+        if group['party_name'] is None:
+            return
+        key = _name_key(group['party_name'])
+        party = self.parties.get(key)
+        if party is None:
+            party = self.parties[key] = _PartyBalance(group['party_name'])
+        party.purchase += _num(group['purchase_amount'])
+        party.paid += _num(group['paid'])
+        party.payable += _num(group['payable_amount'])
+        last_payment = _format_day(group['last_payment'])
+        if last_payment and (party.last_payment is None or last_payment > party.last_payment):
+            party.last_payment = last_payment
+        age = group['age_days']
+        if age is not None and (party.min_age is None or age < party.min_age):
+            party.min_age = age
+
+    def result(self):
+        owing = [party for party in self.parties.values() if party.payable - party.paid > 0]
+        owing.sort(key=lambda party: party.payable - party.paid, reverse=True)
+        return [
+            {
+                'farmerName': party.name,
+                'totalPurchase': party.purchase,
+                'totalPaid': party.paid,
+                'outstanding': party.payable - party.paid,
+                'lastPaymentDate': None if not party.last_payment or party.last_payment.startswith('1900-01-01')
+                else party.last_payment,
+                'daysOverdue': party.min_age,
+            }
+            for party in owing[:20]
+        ]
+
+
+class AgeingWidget(Widget):
+    """Outstanding amount bucketed by slip age: 0-7, 8-30, 31-60, 60+ days"""
+    name = 'ageing'
+
+    def __init__(self):
+        self.buckets = [0.0, 0.0, 0.0, 0.0]
+
+    def add(self, group):
+        age = group['age_days']
+        if age is None:
+            return
+        outstanding = _num(group['payable_amount']) - _num(group['paid'])
+        if age <= 7:
+            self.buckets[0] += outstanding
+        elif age <= 30:
+            self.buckets[1] += outstanding
+        elif age <= 60:
+            self.buckets[2] += outstanding
+        else:
+            self.buckets[3] += outstanding
+
+    def result(self):
+        return {'amounts': list(self.buckets)}
+
+
+class PaymentModeWidget(Widget):
+    name = 'paymentMode'
+
+    def __init__(self):
+        self.totals = {key: 0.0 for key, _ in PAYMENT_MODES}
+
+    def add(self, group):
+        for key in self.totals:
+            self.totals[key] += _num(group[f'paid_{key}'])
+
+    def result(self):
+        return {
+            'modes': [mode for _, mode in PAYMENT_MODES],
+            'amounts': [self.totals[key] for key, _ in PAYMENT_MODES],
+        }
+
+
+class GodownStockWidget(Widget):
+    name = 'godownStock'
+
+    def __init__(self):
+        self.stock = {}
+
+    def add(self, group):
+        if group['godown'] is None:
+            return
+        key = _name_key(group['godown'])
+        godown, quantity = self.stock.get(key, (group['godown'], 0.0))
+        self.stock[key] = (godown, quantity + _num(group['weight_quintal']))
+
+    def result(self):
+        if not self.stock:
+            return {'godowns': ['No Data'], 'quantities': [0]}
+        ordered = sorted(self.stock.values(), key=lambda item: item[1], reverse=True)
+        return {
+            'godowns': [godown for godown, _ in ordered],
+            'quantities': [quantity for _, quantity in ordered],
+        }
+
+
+WIDGETS = [
+    MetricsWidget,
+    DailyPurchaseWidget,
+    RateTrendWidget,
+    DeductionsWidget,
+    TopSuppliersWidget,
+    AgeingWidget,
+    PaymentModeWidget,
+    GodownStockWidget,
+    OutstandingWidget,
+]
+
+
+# ==================== ENGINE ====================
+
+def fetch_period_groups(session, period):
+    """Rollup rows of the period (per day x party x godown x material)"""
+    condition = PERIOD_CONDITIONS.get(period)
+    where = f'WHERE {condition}' if condition else ''
+    return session.fetchall(DASHBOARD_GROUP_QUERY.format(where=where), name='dashboard.groups')
+
+
+def compute_widgets(groups, collect_timings=False):
+    """
+    Feed every group to every widget in one pass
+
+    Returns:
+        tuple: ({widget name: result}, {widget name: seconds} or None)
+    """
+    widgets = [widget_class() for widget_class in WIDGETS]
+    timings = {widget.name: 0.0 for widget in widgets} if collect_timings else None
+
+    if collect_timings:
+        clock = time.perf_counter
+        for group in groups:
+            for widget in widgets:
+                started = clock()
+                widget.add(group)
+                timings[widget.name] += clock() - started
+    else:
+        for group in groups:
+            for widget in widgets:
+                widget.add(group)
+
+    results = {}
+    for widget in widgets:
+        started = time.perf_counter()
+        results[widget.name] = widget.result()
+        if collect_timings:
+            timings[widget.name] += time.perf_counter() - started
+    return results, timings
+
+
+def build_dashboard(session, period, collect_timings=False):
+    """
+    Compute all dashboard widgets for a period
+
+    Args:
+        session (DBSession): Session to read from
+        period (str): 'today', 'week', 'month', 'year' (anything else = all time)
+        collect_timings (bool): Also measure query and per-widget time
+
+    Returns:
+        tuple: (widgets dict, timings dict in milliseconds or None)
+    """
+    started = time.perf_counter()
+    groups = fetch_period_groups(session, period)
+    query_seconds = time.perf_counter() - started
+
+    results, widget_seconds = compute_widgets(groups, collect_timings)
+
+    timings = None
+    if collect_timings:
+        timings = {
+            'query_ms': round(query_seconds * 1000, 3),
+            'groups': len(groups),
+            'widgets_ms': {name: round(seconds * 1000, 3) for name, seconds in widget_seconds.items()},
+            'total_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+    return results, timings
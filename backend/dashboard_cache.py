@@ -0,0 +1,280 @@
+"""
+Response cache for GET /api/dashboard
+
+The dashboard is polled by every office PC and the answer for a period only
+changes when a slip is written, so the computed widgets are cached per period.
+
+- Entries expire after `ttl` seconds (CURDATE()-relative periods roll over even
+  without writes)
+- Every slip add/update/delete bumps a generation counter (invalidate()); an entry
+  is only served if it was computed under the current generation. The generation
+  is read BEFORE the dashboard is computed, so a result that raced with a write is
+  stored under the old generation and never served.
+- Two stores: "memory" (per process) and "sqlite" (a local file shared by every
+  server process on the machine, so a write in one invalidates all of them)
+
+CONFIGURATION (config.json "dashboard_cache" block, all optional):
+- enabled: set false to always recompute
+- ttl: seconds an entry stays valid
+- store: "memory" or "sqlite"
+- database: SQLite file path for the sqlite store
+  (default ~/Documents/smart_purchase_slip_dashboard_cache.db)
+"""
+import logging
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from config_loader import get_config_section
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_DEFAULTS = {
+    'enabled': True,
+    'ttl': 30,
+    'store': 'memory',
+    'database': os.path.join(
+        os.path.expanduser("~"),
+        "Documents",
+        "smart_purchase_slip_dashboard_cache.db"
+    ),
+}
+
+
+# ==================== STORES ====================
+
+class MemoryStore:
+    """Entries and generation counter in this process"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}   # key -> (generation, expires_at, payload)
+        self._generation = 0
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            return self._generation
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, generation, expires_at, payload):
+        with self._lock:
+            self._entries[key] = (generation, expires_at, payload)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteStore:
+    """Entries and generation counter in a local SQLite file (shared between processes)"""
+
+    name = 'sqlite'
+
+    def __init__(self, database):
+        self.database = database
+        directory = os.path.dirname(os.path.abspath(self.database))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS dashboard_cache (
+                    key TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS dashboard_cache_meta (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            conn.execute("INSERT OR IGNORE INTO dashboard_cache_meta (name, value) VALUES ('generation', 0)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.database, timeout=10, isolation_level=None)
+
+    def generation(self):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM dashboard_cache_meta WHERE name = 'generation'").fetchone()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def bump_generation(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute("UPDATE dashboard_cache_meta SET value = value + 1 WHERE name = 'generation'")
+            conn.execute('DELETE FROM dashboard_cache')
+            row = conn.execute("SELECT value FROM dashboard_cache_meta WHERE name = 'generation'").fetchone()
+            conn.execute('COMMIT')
+            return row[0]
+        finally:
+            conn.close()
+
+    def get(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT generation, expires_at, payload FROM dashboard_cache WHERE key = ?', (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def set(self, key, generation, expires_at, payload):
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO dashboard_cache (key, generation, expires_at, payload) VALUES (?, ?, ?, ?)',
+                (key, generation, expires_at, json.dumps(payload))
+            )
+        finally:
+            conn.close()
+
+    def size(self):
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM dashboard_cache').fetchone()[0]
+        finally:
+            conn.close()
+
+
+# ==================== CACHE ====================
+
+class DashboardCache:
+    """TTL + generation cache of dashboard widget payloads, keyed by period"""
+
+    def __init__(self, store, ttl=30):
+        self.store = store
+        self.ttl = max(0.0, float(ttl))
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0, 'stores': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key):
+        """
+        Look up a cached payload
+
+        Returns:
+            tuple: (payload or None, generation) - pass the generation to put()
+            after computing on a miss (None if the store failed)
+        """
+        try:
+            generation = self.store.generation()
+            entry = self.store.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Dashboard cache lookup failed: {e}")
+            self._count('misses')
+            return None, None
+        if entry is None:
+            self._count('misses')
+            return None, generation
+
+        entry_generation, expires_at, payload = entry
+        # Not deleted here: the next put() overwrites it
+        if entry_generation != generation:
+            self._count('stale')
+            self._count('misses')
+            return None, generation
+        if expires_at <= time.time():
+            self._count('expired')
+            self._count('misses')
+            return None, generation
+
+        self._count('hits')
+        return payload, generation
+
+    def put(self, key, generation, payload):
+        """Store a payload computed under `generation` (as returned by get())"""
+        if generation is None:
+            return
+        try:
+            self.store.set(key, generation, time.time() + self.ttl, payload)
+        except sqlite3.Error as e:
+            logger.warning(f"Dashboard cache store failed: {e}")
+            return
+        self._count('stores')
+
+    def invalidate(self):
+        """Called after every slip write: nothing computed before it is served again"""
+        generation = self.store.bump_generation()
+        self._count('invalidations')
+        return generation
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'hit_ratio': round(stats['hits'] / lookups, 4) if lookups else 0.0,
+            'entries': self.store.size(),
+            'generation': self.store.generation(),
+            'store': self.store.name,
+            'ttl': self.ttl,
+        })
+        return stats
+
+
+# Global cache instance (created lazily)
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_dashboard_cache():
+    """
+    Return the process-wide dashboard cache, or None when caching is disabled
+    or the configured store cannot be opened
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = get_config_section('dashboard_cache', DASHBOARD_CACHE_DEFAULTS)
+            if not settings['enabled']:
+                return None
+            try:
+                if settings['store'] == 'sqlite':
+                    store = SQLiteStore(settings['database'])
+                else:
+                    store = MemoryStore()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Dashboard cache disabled - cannot use {settings['database']}: {e}")
+                return None
+            _cache = DashboardCache(store, ttl=settings['ttl'])
+        return _cache
+
+
+def invalidate_dashboard_cache():
+    """Bump the generation after a slip write (no-op if caching is disabled)"""
+    cache = get_dashboard_cache()
+    if cache is None:
+        return
+    try:
+        cache.invalidate()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not invalidate dashboard cache: {e}")
@@ -1,65 +1,45 @@
+import logging
 import os
 import sys
-import json
+import time
+import threading
+from contextlib import contextmanager
 
 # CRITICAL: Force pure-Python MySQL connector to prevent ACCESS_VIOLATION crashes
 os.environ['MYSQL_CONNECTOR_PYTHON_USE_PURE'] = '1'
 
 import mysql.connector
-from mysql.connector.pooling import MySQLConnectionPool
+
+from config_loader import load_config, get_loaded_config_path, get_config_paths, get_config_section
+from db_pool import ConnectionPool
+from metrics import PhaseTimer, record_phase
+
+logger = logging.getLogger(__name__)
 
 # Verify pure-Python mode is enabled
-print(f"[INFO] MySQL Connector version: {mysql.connector.__version__}")
-print(f"[INFO] MySQL Connector pure mode: {os.environ.get('MYSQL_CONNECTOR_PYTHON_USE_PURE', 'not set')}")
+logger.info(f"MySQL Connector version: {mysql.connector.__version__}")
+logger.info(f"MySQL Connector pure mode: {os.environ.get('MYSQL_CONNECTOR_PYTHON_USE_PURE', 'not set')}")
 
 # Load MySQL configuration from config file or environment
 def load_db_config():
-    # Try multiple locations for config.json
-    config_paths = []
-
-    # If running as PyInstaller bundle
     if getattr(sys, 'frozen', False):
-        # Running as compiled executable
-        bundle_dir = sys._MEIPASS
-        exe_dir = os.path.dirname(sys.executable)
-
-        # Try these locations in order:
-        # 1. In resources folder (Electron packaged app)
-        config_paths.append(os.path.join(exe_dir, '..', '..', 'resources', 'config.json'))
-        # 2. Next to dist-backend folder
-        config_paths.append(os.path.join(exe_dir, '..', 'config.json'))
-        # 3. In bundle directory
-        config_paths.append(os.path.join(bundle_dir, 'config.json'))
-        # 4. Same directory as executable
-        config_paths.append(os.path.join(exe_dir, 'config.json'))
-
-        print(f"[INFO] Running as packaged exe from: {exe_dir}")
-        print(f"[INFO] Bundle dir (_MEIPASS): {bundle_dir}")
+        logger.info(f"Running as packaged exe from: {os.path.dirname(sys.executable)}")
+        logger.info(f"Bundle dir (_MEIPASS): {sys._MEIPASS}")
     else:
-        # Running in normal Python environment
-        config_paths.append(os.path.join(os.path.dirname(__file__), '..', 'config.json'))
-        print(f"[INFO] Running in development mode from: {os.path.dirname(__file__)}")
+        logger.info(f"Running in development mode from: {os.path.dirname(__file__)}")
 
-    # Try each path
-    for config_file in config_paths:
-        normalized_path = os.path.normpath(os.path.abspath(config_file))
-        print(f"[INFO] Trying config path: {normalized_path}")
+    config = load_config()
+    config_path = get_loaded_config_path()
 
-        if os.path.exists(normalized_path):
-            try:
-                with open(normalized_path, 'r') as f:
-                    config = json.load(f)
-                    db_config = config.get('database', {})
-                    print(f"[OK] Loaded config from: {normalized_path}")
-                    print(f"[INFO] MySQL connection: {db_config.get('user')}@{db_config.get('host')}:{db_config.get('port')}/{db_config.get('database')}")
-                    return db_config
-            except Exception as e:
-                print(f"[WARNING] Error reading config from {normalized_path}: {e}")
-                continue
+    if config_path and config.get('database'):
+        db_config = dict(config['database'])
+        logger.info(f"Loaded config from: {config_path}")
+        logger.info(f"MySQL connection: {db_config.get('user')}@{db_config.get('host')}:{db_config.get('port')}/{db_config.get('database')}")
+        return db_config
 
     # Fallback to defaults
-    print("[WARNING] No config.json found in any location, using default configuration")
-    print(f"[WARNING] Searched paths: {config_paths}")
+    logger.warning("No config.json found in any location, using default configuration")
+    logger.warning(f"Searched paths: {get_config_paths()}")
     return {
         'host': 'localhost',
         'port': 1396,
@@ -71,39 +51,65 @@ def load_db_config():
 # MySQL Configuration
 DB_CONFIG = load_db_config()
 
+# Connection pool settings (config.json "pool" block, all optional)
+POOL_DEFAULTS = {
+    'size': 10,
+    'checkout_timeout': 10,     # seconds to wait for a free connection before failing
+    'ping_after_idle': 30,      # only ping connections idle longer than this (seconds)
+    'max_lifetime': 3600,       # recycle connections older than this (seconds, 0 = never)
+    'reset_session': True,      # reset session state when a connection is returned
+}
+
 # Global connection pool
 connection_pool = None
+_pool_lock = threading.Lock()
+
+def _create_pool():
+    settings = get_config_section('pool', POOL_DEFAULTS)
+
+    # Force pure-Python implementation (prevents ACCESS_VIOLATION crashes)
+    pool_config = DB_CONFIG.copy()
+    pool_config['use_pure'] = True  # CRITICAL: Force pure-Python mode
+
+    pool = ConnectionPool(
+        pool_config,
+        size=settings['size'],
+        checkout_timeout=settings['checkout_timeout'],
+        ping_after_idle=settings['ping_after_idle'],
+        max_lifetime=settings['max_lifetime'],
+        reset_session=settings['reset_session']
+    )
+    # Open one connection up front so config/database errors surface at startup
+    pool.get_connection().close()
+    logger.info(f"MySQL connection pool created successfully (size: {pool.size}, "
+                f"checkout timeout: {pool.checkout_timeout:g}s, pure-Python mode)")
+    return pool
 
 def init_connection_pool():
     """
-    Initialize MySQL connection pool using mysql.connector
+    Initialize the MySQL connection pool (settings from the config.json "pool" block)
     """
     global connection_pool
-    try:
-        # Force pure-Python implementation (prevents ACCESS_VIOLATION crashes)
-        pool_config = DB_CONFIG.copy()
-        pool_config['use_pure'] = True  # CRITICAL: Force pure-Python mode
-
-        connection_pool = MySQLConnectionPool(
-            pool_name="purchase_pool",
-            pool_size=10,
-            pool_reset_session=True,
-            **pool_config
-        )
-        print("[OK] MySQL connection pool created successfully (size: 10, pure-Python mode)")
-    except mysql.connector.Error as err:
-        if err.errno == 1049:
-            print("Database doesn't exist. Creating database...")
-            create_database()
-            connection_pool = MySQLConnectionPool(
-                pool_name="purchase_pool",
-                pool_size=10,
-                pool_reset_session=True,
-                **pool_config
-            )
-        else:
-            print(f"[ERROR] Error creating connection pool: {err}")
-            raise
+    with _pool_lock:
+        old_pool = connection_pool
+        try:
+            connection_pool = _create_pool()
+        except mysql.connector.Error as err:
+            if err.errno == 1049:
+                logger.info("Database doesn't exist. Creating database...")
+                create_database()
+                connection_pool = _create_pool()
+            else:
+                logger.error(f"Error creating connection pool: {err}")
+                raise
+        if old_pool is not None:
+            old_pool.close_all()
+
+def close_connection_pool():
+    """Close the pool at shutdown (idle connections now, checked-out ones when returned)"""
+    pool = connection_pool
+    if pool is not None:
+        pool.close_all()
 
 def create_database():
     """Create the database if it doesn't exist"""
@@ -117,9 +123,9 @@ def create_database():
         conn = mysql.connector.connect(**temp_config)
         cursor = conn.cursor()
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database_name}")
-        print(f"[OK] Database '{database_name}' created successfully")
+        logger.info(f"Database '{database_name}' created successfully")
     except mysql.connector.Error as err:
-        print(f"[ERROR] Error creating database: {err}")
+        logger.error(f"Error creating database: {err}")
         raise
     finally:
         if cursor:
@@ -131,287 +137,210 @@ def get_db_connection():
     """
     Get a database connection from the pool
     ALWAYS returns a connection with dictionary cursor support
+
+    Waits up to pool.checkout_timeout seconds when every connection is in use
+    (counted as the request's pool_wait time, see metrics.py).
+    Calling close() on the connection returns it to the pool.
     """
-    global connection_pool
     if connection_pool is None:
         init_connection_pool()
 
     try:
-        conn = connection_pool.get_connection()
-        conn.ping(reconnect=True, attempts=3, delay=2)
-        return conn
+        with PhaseTimer('pool_wait'):
+            return connection_pool.get_connection()
     except mysql.connector.Error as e:
-        print(f"[ERROR] Error getting connection from pool: {e}")
+        logger.error(f"Error getting connection from pool: {e}")
         raise
 
-def init_db():
+def get_pool_stats():
     """
-    Initialize the database and create tables if they don't exist
+    Connection pool counters (checkouts, waits, timeouts, wait-time histogram, in-use/idle)
+
+    Returns:
+        dict: Pool statistics, or None if the pool has not been created yet
     """
-    conn = None
-    cursor = None
-    try:
-        init_connection_pool()
+    pool = connection_pool
+    return pool.stats() if pool is not None else None
+
+# ==================== SESSIONS / TRANSACTIONS ====================
+
+# Per-statement timings (keyed by the name passed to DBSession.execute & co.)
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+
+def _record_query(name, seconds):
+    record_phase('db', seconds)
+    with _query_stats_lock:
+        stats = _query_stats.get(name)
+        if stats is None:
+            stats = _query_stats[name] = {'count': 0, 'seconds_total': 0.0, 'seconds_max': 0.0}
+        stats['count'] += 1
+        stats['seconds_total'] += seconds
+        stats['seconds_max'] = max(stats['seconds_max'], seconds)
+
+def get_query_stats():
+    """
+    Timing per named statement since startup
 
-        print(f"[OK] Initializing database: {DB_CONFIG['database']}")
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Create purchase_slips table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS purchase_slips (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                company_name TEXT,
-                company_address TEXT,
-                document_type VARCHAR(255) DEFAULT 'Purchase Slip',
-                vehicle_no VARCHAR(255),
-                date DATETIME NOT NULL,
-                bill_no INT NOT NULL,
-                party_name TEXT,
-                material_name TEXT,
-                ticket_no VARCHAR(255),
-                broker VARCHAR(255),
-                terms_of_delivery TEXT,
-                sup_inv_no VARCHAR(255),
-                gst_no VARCHAR(255),
-                bags DOUBLE DEFAULT 0,
-                avg_bag_weight DOUBLE DEFAULT 0,
-                net_weight DOUBLE DEFAULT 0,
-                net_weight_kg DOUBLE DEFAULT 0,
-                gunny_weight_kg DOUBLE DEFAULT 0,
-                final_weight_kg DOUBLE DEFAULT 0,
-                weight_quintal DOUBLE DEFAULT 0,
-                weight_khandi DOUBLE DEFAULT 0,
-                shortage_kg DOUBLE DEFAULT 0,
-                rate DOUBLE DEFAULT 0,
-                rate_basis VARCHAR(50) DEFAULT 'Quintal',
-                rate_value DOUBLE DEFAULT 0,
-                calculated_rate DOUBLE DEFAULT 0,
-                total_purchase_amount DOUBLE DEFAULT 0,
-                amount DOUBLE DEFAULT 0,
-                bank_commission DOUBLE DEFAULT 0,
-                postage DOUBLE DEFAULT 0,
-                batav_percent DOUBLE DEFAULT 0,
-                batav DOUBLE DEFAULT 0,
-                shortage_percent DOUBLE DEFAULT 0,
-                shortage DOUBLE DEFAULT 0,
-                dalali_rate DOUBLE DEFAULT 0,
-                dalali DOUBLE DEFAULT 0,
-                hammali_rate DOUBLE DEFAULT 0,
-                hammali DOUBLE DEFAULT 0,
-                freight DOUBLE DEFAULT 0,
-                rate_diff DOUBLE DEFAULT 0,
-                quality_diff DOUBLE DEFAULT 0,
-                quality_diff_comment TEXT,
-                moisture_ded DOUBLE DEFAULT 0,
-                moisture_ded_percent DOUBLE DEFAULT 0,
-                tds DOUBLE DEFAULT 0,
-                total_deduction DOUBLE DEFAULT 0,
-                payable_amount DOUBLE DEFAULT 0,
-                payment_method VARCHAR(255),
-                payment_date DATETIME,
-                payment_amount DOUBLE DEFAULT 0,
-                payment_bank_account TEXT,
-                payment_due_date DATETIME,
-                payment_due_comment TEXT,
-                instalment_1_date DATETIME,
-                instalment_1_amount DOUBLE DEFAULT 0,
-                instalment_1_comment TEXT,
-                instalment_1_payment_method VARCHAR(255),
-                instalment_1_payment_bank_account TEXT,
-                instalment_2_date DATETIME,
-                instalment_2_amount DOUBLE DEFAULT 0,
-                instalment_2_comment TEXT,
-                instalment_2_payment_method VARCHAR(255),
-                instalment_2_payment_bank_account TEXT,
-                instalment_3_date DATETIME,
-                instalment_3_amount DOUBLE DEFAULT 0,
-                instalment_3_comment TEXT,
-                instalment_3_payment_method VARCHAR(255),
-                instalment_3_payment_bank_account TEXT,
-                instalment_4_date DATETIME,
-                instalment_4_amount DOUBLE DEFAULT 0,
-                instalment_4_comment TEXT,
-                instalment_4_payment_method VARCHAR(255),
-                instalment_4_payment_bank_account TEXT,
-                instalment_5_date DATETIME,
-                instalment_5_amount DOUBLE DEFAULT 0,
-                instalment_5_comment TEXT,
-                instalment_5_payment_method VARCHAR(255),
-                instalment_5_payment_bank_account TEXT,
-                prepared_by VARCHAR(255),
-                authorised_sign VARCHAR(255),
-                paddy_unloading_godown TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_date (date),
-                INDEX idx_party_name (party_name(255)),
-                INDEX idx_bill_no (bill_no)
-            )
-        ''')
-
-        # Create users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(255) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                full_name VARCHAR(255),
-                role VARCHAR(50) DEFAULT 'user',
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP NULL
-            )
-        ''')
-
-        # Create unloading_godowns table for dynamic dropdown
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS unloading_godowns (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        print("[OK] Table 'unloading_godowns' verified/created")
-
-        # Check and add missing columns to purchase_slips
-        cursor.execute("SHOW COLUMNS FROM purchase_slips")
-        existing_columns = {row['Field'] for row in cursor.fetchall()}
-
-        columns_to_add = {
-            'shortage_kg': "DOUBLE DEFAULT 0",
-            'rate_basis': "VARCHAR(50) DEFAULT 'Quintal'",
-            'calculated_rate': "DOUBLE DEFAULT 0",
-            'postage': "DOUBLE DEFAULT 0",
-            'payment_due_comment': "TEXT",
-            'payment_bank_account': "TEXT",
-            'mobile_number': "VARCHAR(255)",
-            'moisture_ded_comment': "TEXT",
-            'moisture_percent': "DOUBLE DEFAULT 0",
-            'moisture_kg': "DOUBLE DEFAULT 0",
-            'company_gst_no': "VARCHAR(255)",
-            'company_mobile_no': "VARCHAR(255)",
-            'instalment_1_amount': "DOUBLE DEFAULT 0",
-            'instalment_1_comment': "TEXT",
-            'instalment_1_payment_method': "VARCHAR(255)",
-            'instalment_1_payment_bank_account': "TEXT",
-            'instalment_2_amount': "DOUBLE DEFAULT 0",
-            'instalment_2_comment': "TEXT",
-            'instalment_2_payment_method': "VARCHAR(255)",
-            'instalment_2_payment_bank_account': "TEXT",
-            'instalment_3_amount': "DOUBLE DEFAULT 0",
-            'instalment_3_comment': "TEXT",
-            'instalment_3_payment_method': "VARCHAR(255)",
-            'instalment_3_payment_bank_account': "TEXT",
-            'instalment_4_amount': "DOUBLE DEFAULT 0",
-            'instalment_4_comment': "TEXT",
-            'instalment_4_payment_method': "VARCHAR(255)",
-            'instalment_4_payment_bank_account': "TEXT",
-            'instalment_5_amount': "DOUBLE DEFAULT 0",
-            'instalment_5_comment': "TEXT",
-            'instalment_5_payment_method': "VARCHAR(255)",
-            'instalment_5_payment_bank_account': "TEXT",
-            'quality_diff_comment': "TEXT",
-            'moisture_ded_percent': "DOUBLE DEFAULT 0",
-            'prepared_by': "VARCHAR(255)",
-            'authorised_sign': "VARCHAR(255)",
-            'paddy_unloading_godown': "TEXT",
-            'net_weight_kg': "DOUBLE DEFAULT 0",
-            'gunny_weight_kg': "DOUBLE DEFAULT 0",
-            'final_weight_kg': "DOUBLE DEFAULT 0",
-            'weight_quintal': "DOUBLE DEFAULT 0",
-            'weight_khandi': "DOUBLE DEFAULT 0",
-            'rate_value': "DOUBLE DEFAULT 0",
-            'total_purchase_amount': "DOUBLE DEFAULT 0",
-            'created_at': "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
-        }
-
-        # Convert date columns to DATETIME
-        date_columns_to_convert = [
-            'date', 'payment_date', 'payment_due_date',
-            'instalment_1_date', 'instalment_2_date', 'instalment_3_date',
-            'instalment_4_date', 'instalment_5_date'
-        ]
-
-        for col_name in date_columns_to_convert:
-            if col_name in existing_columns:
-                try:
-                    cursor.execute(f"ALTER TABLE purchase_slips MODIFY COLUMN {col_name} DATETIME")
-                    print(f"[OK] Converted column {col_name} to DATETIME")
-                except mysql.connector.Error as err:
-                    print(f"Warning: Could not convert column {col_name}: {err}")
+    Returns:
+        dict: {name: {'count', 'seconds_total', 'seconds_max'}}
+    """
+    with _query_stats_lock:
+        return {name: dict(stats) for name, stats in _query_stats.items()}
+
+class DBSession:
+    """
+    One pooled connection for a unit of work (see db_session() / transaction())
 
-        for col_name, col_type in columns_to_add.items():
-            if col_name not in existing_columns:
+    Every statement runs through this class, which is the single place they are timed.
+    Rows are returned as dictionaries.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = None
+
+    def _get_cursor(self):
+        if self._cursor is None:
+            self._cursor = self.connection.cursor(dictionary=True, buffered=True)
+        return self._cursor
+
+    def _run(self, sql, params, name, fetch):
+        cursor = self._get_cursor()
+        started = time.perf_counter()
+        try:
+            cursor.execute(sql, params or ())
+            if fetch is None:
+                return cursor
+            rows = cursor.fetchall() if cursor.with_rows else []
+            if fetch == 'one':
+                return rows[0] if rows else None
+            return rows
+        finally:
+            _record_query(name or 'unnamed', time.perf_counter() - started)
+
+    def execute(self, sql, params=None, name=None):
+        """
+        Run a statement without fetching
+
+        Returns:
+            cursor: For lastrowid / rowcount (read them before the next statement)
+        """
+        return self._run(sql, params, name, None)
+
+    def fetchone(self, sql, params=None, name=None):
+        """Run a query and return the first row (dict) or None"""
+        return self._run(sql, params, name, 'one')
+
+    def fetchall(self, sql, params=None, name=None):
+        """Run a query and return all rows (list of dicts)"""
+        return self._run(sql, params, name, 'all')
+
+    def executemany(self, sql, seq_params, name=None):
+        """Run one statement for many parameter sets (multi-row INSERT where possible)"""
+        cursor = self._get_cursor()
+        started = time.perf_counter()
+        try:
+            cursor.executemany(sql, seq_params)
+            return cursor
+        finally:
+            _record_query(name or 'unnamed', time.perf_counter() - started)
+
+    def iterate(self, sql, params=None, name=None, batch_size=1000):
+        """
+        Run a query and yield its rows (dicts) as they arrive from the server
+
+        Uses an unbuffered cursor, so memory stays flat however many rows match.
+        The connection is busy until the generator is exhausted or closed: run
+        nothing else on this session while iterating.
+        """
+        cursor = self.connection.cursor(dictionary=True, buffered=False)
+        started = time.perf_counter()
+        finished = False
+        try:
+            cursor.execute(sql, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+            finished = True
+        finally:
+            if not finished:
+                # Abandoned part-way (e.g. client disconnected): read off the rest
+                # of the result so the connection can go back to the pool
                 try:
-                    cursor.execute(f"ALTER TABLE purchase_slips ADD COLUMN {col_name} {col_type}")
-                    print(f"[OK] Added column: {col_name}")
-                except mysql.connector.Error as err:
-                    if err.errno != 1060:  # Ignore duplicate column error
-                        print(f"Warning: Could not add column {col_name}: {err}")
-
-        # Create default admin user if no users exist
-        cursor.execute("SELECT COUNT(*) as count FROM users")
-        result = cursor.fetchone()
-        user_count = result['count']
-
-        if user_count == 0:
-            cursor.execute('''
-                INSERT INTO users (username, password, full_name, role)
-                VALUES (%s, %s, %s, %s)
-            ''', ('admin', 'admin', 'Administrator', 'admin'))
-            print("[OK] Default admin user created (username: admin, password: admin)")
-
-        # Add default unloading godowns if table is empty
-        cursor.execute("SELECT COUNT(*) as count FROM unloading_godowns")
-        result = cursor.fetchone()
-        godown_count = result['count']
-
-        if godown_count == 0:
-            default_godowns = [
-                'Godown A',
-                'Godown B',
-                'Main Warehouse',
-                'Storage Unit 1'
-            ]
-            for godown in default_godowns:
-                cursor.execute('INSERT IGNORE INTO unloading_godowns (name) VALUES (%s)', (godown,))
-            print(f"[OK] Added {len(default_godowns)} default unloading godowns")
-
-        conn.commit()
-        print("[OK] Database tables initialized successfully")
+                    self.connection.consume_results()
+                except Exception:
+                    pass
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            _record_query(name or 'unnamed', time.perf_counter() - started)
 
-    except mysql.connector.Error as err:
-        print(f"[ERROR] Error initializing database: {err}")
-        if conn:
-            conn.rollback()
-        raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        """Close the cursor and return the connection to the pool"""
+        cursor, self._cursor = self._cursor, None
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.connection.close()
 
-def get_next_bill_no():
+@contextmanager
+def db_session():
     """
-    Get the next bill number
+    Check out a connection for a unit of work; it is always returned to the pool
+
+    Usage:
+        with db_session() as session:
+            rows = session.fetchall('SELECT ...', name='slips.list')
     """
-    conn = None
-    cursor = None
+    session = DBSession(get_db_connection())
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT MAX(bill_no) as max_bill FROM purchase_slips')
-        result = cursor.fetchone()
+        yield session
+    finally:
+        session.close()
 
-        if result['max_bill'] is None:
-            return 1
-        return result['max_bill'] + 1
+@contextmanager
+def transaction():
+    """
+    db_session() that commits when the block completes and rolls back on any exception
+    """
+    with db_session() as session:
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+def init_db():
+    """
+    Create the database if needed and apply pending schema migrations
 
+    Table definitions and changes live in backend/migrations (see
+    schema_migrations.py) and each runs once, so with a current schema this is
+    one query on schema_version.
+    """
+    from schema_migrations import migrate
+
+    init_connection_pool()
+    logger.info(f"Initializing database: {DB_CONFIG['database']}")
+    try:
+        applied = migrate()
     except mysql.connector.Error as err:
-        print(f"[ERROR] Error getting next bill number: {err}")
+        logger.error(f"Error initializing database: {err}")
         raise
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    if applied:
+        logger.info(f"Applied {len(applied)} schema migration(s)")
+    else:
+        logger.info("Database schema is up to date")
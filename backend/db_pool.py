@@ -0,0 +1,252 @@
+"""
+Instrumented MySQL connection pool
+
+Replaces mysql.connector's MySQLConnectionPool, which fails immediately when all
+connections are in use and has no lifetime/idle handling:
+
+- Checkout waits up to checkout_timeout for a free connection instead of failing
+- A connection is only pinged if it sat idle longer than ping_after_idle seconds
+  (no extra round trip per request for a hot pool)
+- Connections older than max_lifetime are closed and replaced on checkout
+- Counters: checkouts, waits, timeouts, wait-time histogram, in-use/idle, etc.
+
+Callers use it exactly like the old pool: conn = pool.get_connection() ... conn.close()
+(close() hands the connection back to the pool).
+"""
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+# Upper bounds (seconds) of the checkout wait-time histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+
+class PoolTimeoutError(PoolError):
+    """No connection became free within checkout_timeout"""
+
+
+class _PoolEntry:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class PooledConnection:
+    """
+    Proxy for a checked-out connection
+    Attribute access goes to the real connection; close() returns it to the pool
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get('_entry')
+        if entry is None:
+            raise AttributeError(f"Connection already returned to the pool (accessing '{name}')")
+        return getattr(entry.connection, name)
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        entry = self._entry
+        if entry is None:
+            return
+        self._entry = None
+        self._pool._release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # A leaked connection must not permanently shrink the pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections with checkout queueing and statistics"""
+
+    def __init__(self, db_config, size=10, checkout_timeout=10, ping_after_idle=30,
+                 max_lifetime=3600, reset_session=True):
+        self.db_config = dict(db_config)
+        self.size = max(1, int(size))
+        self.checkout_timeout = max(0.0, float(checkout_timeout))
+        self.ping_after_idle = max(0.0, float(ping_after_idle))
+        self.max_lifetime = max(0.0, float(max_lifetime))
+        self.reset_session = bool(reset_session)
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'connections_discarded': 0,
+            'pings': 0,
+            'ping_failures': 0,
+            'in_use': 0,
+        }
+        self._wait_histogram = [0] * len(WAIT_BUCKETS)
+
+    # ==================== CHECKOUT ====================
+
+    def get_connection(self):
+        """
+        Check out a connection, waiting up to checkout_timeout if all are in use
+
+        Raises:
+            PoolTimeoutError: If no connection became free in time
+            mysql.connector.Error: If a new connection could not be opened
+        """
+        started = time.perf_counter()
+        acquired = self._slots.acquire(blocking=False)
+        waited = not acquired
+        if not acquired:
+            acquired = self._slots.acquire(timeout=self.checkout_timeout)
+        wait_seconds = time.perf_counter() - started
+
+        with self._lock:
+            self._record_wait(wait_seconds, waited)
+            if not acquired:
+                self._stats['timeouts'] += 1
+        if not acquired:
+            raise PoolTimeoutError(
+                f'Timed out after {self.checkout_timeout:g}s waiting for a database connection '
+                f'(pool size {self.size}, all in use)'
+            )
+
+        try:
+            entry = self._take_idle() or self._open()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._stats['in_use'] += 1
+        return PooledConnection(self, entry)
+
+    def _record_wait(self, wait_seconds, waited):
+        if waited:
+            self._stats['waits'] += 1
+        self._stats['wait_seconds_total'] += wait_seconds
+        self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait_seconds)
+        for index, bound in enumerate(WAIT_BUCKETS):
+            if wait_seconds <= bound:
+                self._wait_histogram[index] += 1
+                break
+
+    def _open(self):
+        connection = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return _PoolEntry(connection)
+
+    def _take_idle(self):
+        """Pop the most recently used idle connection that is still usable"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                entry = self._idle.pop()
+
+            now = time.monotonic()
+            if self.max_lifetime and now - entry.created_at > self.max_lifetime:
+                self._discard(entry)
+                with self._lock:
+                    self._stats['connections_recycled'] += 1
+                continue
+
+            if now - entry.last_used > self.ping_after_idle:
+                with self._lock:
+                    self._stats['pings'] += 1
+                try:
+                    entry.connection.ping(reconnect=False)
+                except mysql.connector.Error:
+                    with self._lock:
+                        self._stats['ping_failures'] += 1
+                    self._discard(entry)
+                    continue
+
+            return entry
+
+    # ==================== RETURN ====================
+
+    def _release(self, entry):
+        try:
+            connection = entry.connection
+            if self.reset_session:
+                connection.reset_session()
+            elif connection.in_transaction:
+                connection.rollback()
+            entry.last_used = time.monotonic()
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._idle.append(entry)
+            if closed:
+                self._discard(entry)
+        except Exception:
+            # Broken connection - drop it; the next checkout opens a fresh one
+            self._discard(entry)
+        finally:
+            with self._lock:
+                self._stats['in_use'] -= 1
+            self._slots.release()
+
+    def _discard(self, entry):
+        with self._lock:
+            self._stats['connections_discarded'] += 1
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """
+        Close idle connections and mark the pool closed
+
+        Checked-out connections are closed when returned instead of going back
+        on the idle list.
+        """
+        with self._lock:
+            self._closed = True
+            entries = list(self._idle)
+            self._idle.clear()
+        for entry in entries:
+            self._discard(entry)
+
+    def stats(self):
+        """Snapshot of pool counters and the checkout wait-time histogram"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            cumulative = 0
+            histogram = []
+            for bound, count in zip(WAIT_BUCKETS, self._wait_histogram):
+                cumulative += count
+                histogram.append(('+Inf' if bound == float('inf') else bound, cumulative))
+        stats.update({
+            'size': self.size,
+            'checkout_timeout': self.checkout_timeout,
+            'wait_histogram': histogram,
+        })
+        return stats
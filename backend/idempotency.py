@@ -0,0 +1,157 @@
+"""
+Idempotency keys for POST /api/add-slip
+
+The entry form sends an Idempotency-Key header (one random key per form, reused
+when a submit is retried). The key is claimed inside the slip's insert
+transaction and the 201 response is stored with it, so:
+
+- a replay of a saved request returns the original 201 (one primary key lookup)
+- a replay that arrives while the first request is still running waits on the
+  key's row lock and then gets the stored response (or proceeds, if the first
+  request rolled back)
+- the same key with a different request body is rejected (422)
+
+Keys expire after `ttl_hours`; a background thread deletes expired rows in
+small batches.
+
+CONFIGURATION (config.json "idempotency" block, all optional):
+- ttl_hours: how long a key (and its stored response) is kept
+- purge_interval: seconds between purge runs
+"""
+import logging
+import hashlib
+import json
+import threading
+import time
+
+import mysql.connector
+
+from config_loader import get_config_section
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_DEFAULTS = {
+    'ttl_hours': 24,
+    'purge_interval': 3600,
+}
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 128
+PURGE_BATCH_SIZE = 1000
+
+
+class IdempotencyKeyMismatch(Exception):
+    """The key was already used for a different request"""
+
+
+def validate_key(key):
+    """Header value -> key, or ValueError for keys we will not store"""
+    key = (key or '').strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise ValueError(f'{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} printable characters')
+    return key
+
+
+def request_fingerprint(scope, payload):
+    """SHA-256 of the endpoint and the canonical JSON request body"""
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f'{scope}\0{body}'.encode('utf-8')).hexdigest()
+
+
+class IdempotencyRepository:
+    """idempotency_keys table; use within the transaction of the guarded write"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def claim(self, key, scope, request_hash, ttl_hours):
+        """
+        Claim a key for this request
+
+        Returns:
+            dict or None: None if the key is now ours (go ahead with the write);
+            otherwise the stored {'response_code', 'response_body'} to replay
+
+        Raises:
+            IdempotencyKeyMismatch: Key already used for a different request
+        """
+        try:
+            self.session.execute('''
+                INSERT INTO idempotency_keys (idem_key, scope, request_hash, expires_at)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s HOUR)
+            ''', (key, scope, request_hash, int(ttl_hours)), name='idempotency.claim')
+            return None
+        except mysql.connector.IntegrityError as err:
+            if err.errno != 1062:
+                raise
+
+        # Key exists and its first request has finished (the INSERT above waited for it).
+        # Locking read: sees the latest committed row, not this transaction's snapshot.
+        row = self.session.fetchone('''
+            SELECT scope, request_hash, response_code, response_body, expires_at < NOW() as expired
+            FROM idempotency_keys WHERE idem_key = %s FOR UPDATE
+        ''', (key,), name='idempotency.lookup')
+
+        if row is None or row['expired'] or row['response_code'] is None:
+            # Purged, expired or never completed: the key starts over for this request
+            self.session.execute('''
+                REPLACE INTO idempotency_keys (idem_key, scope, request_hash, expires_at)
+                VALUES (%s, %s, %s, NOW() + INTERVAL %s HOUR)
+            ''', (key, scope, request_hash, int(ttl_hours)), name='idempotency.reclaim')
+            return None
+
+        if row['scope'] != scope or row['request_hash'] != request_hash:
+            raise IdempotencyKeyMismatch(f'{IDEMPOTENCY_HEADER} was already used for a different request')
+
+        return {'response_code': row['response_code'], 'response_body': json.loads(row['response_body'])}
+
+    def store_response(self, key, response_code, response_body):
+        """Record the response to replay (same transaction as the write it describes)"""
+        self.session.execute(
+            'UPDATE idempotency_keys SET response_code = %s, response_body = %s WHERE idem_key = %s',
+            (response_code, json.dumps(response_body), key), name='idempotency.store'
+        )
+
+    def purge_expired(self, limit=PURGE_BATCH_SIZE):
+        """Delete up to `limit` expired keys (idx_idempotency_expires); returns the row count"""
+        cursor = self.session.execute(
+            'DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT %s', (int(limit),),
+            name='idempotency.purge'
+        )
+        return cursor.rowcount
+
+
+def get_idempotency_settings():
+    return get_config_section('idempotency', IDEMPOTENCY_DEFAULTS)
+
+
+def purge_expired_keys():
+    """Delete all expired keys, one short transaction per batch; returns the total"""
+    from database import transaction
+
+    total = 0
+    while True:
+        with transaction() as session:
+            deleted = IdempotencyRepository(session).purge_expired()
+        total += deleted
+        if deleted < PURGE_BATCH_SIZE:
+            return total
+
+
+def _purge_loop(interval):
+    while True:
+        try:
+            purged = purge_expired_keys()
+            if purged:
+                logger.info(f"Purged {purged} expired idempotency key(s)")
+        except Exception as e:
+            logger.warning(f"Idempotency key purge failed: {e}")
+        time.sleep(interval)
+
+
+def start_idempotency_purger():
+    """Start the background purge of expired keys as a daemon thread"""
+    interval = max(60.0, float(get_idempotency_settings()['purge_interval']))
+    thread = threading.Thread(target=_purge_loop, args=(interval,), name='idempotency-purge', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,279 @@
+"""
+Logging: leveled, structured, and written off the request path
+
+setup_logging() puts a QueueHandler on the root logger. Logging a record only
+appends it to an in-memory queue; a QueueListener thread formats and writes it:
+
+- file: one JSON object per line (ts, level, logger, msg, request_id, thread,
+  exc, plus extra fields such as method / path / status / duration_ms), rotated
+  at max_bytes with backup_count old files kept
+- console (stdout): "[LEVEL] message", as the backend has always printed
+
+A request never waits for log I/O: when the queue is full (the writer cannot
+keep up, e.g. stdout is a pipe nobody reads), new records are dropped and
+counted instead of blocking.
+
+init_request_logging(app) gives every request an id (the client's X-Request-ID
+header if it sent one, otherwise random). The id is attached to every record
+logged while the request is handled and returned in the X-Request-ID response
+header, and one "access" record per request carries method, path, status and
+duration.
+
+Modules log through logging.getLogger(__name__); set per-module levels with
+"modules", e.g. {"routes.slips": "DEBUG", "access": "WARNING"}.
+
+A forked child (gunicorn worker) starts without the writer thread; it is set up
+again when the child imports the app. Workers share the log file, so with
+workers > 1 rotation can race: raise max_bytes or rotate externally.
+
+CONFIGURATION (config.json "logging" block, all optional):
+- level: root level
+- modules: logger name -> level
+- file: log file path ("" for no file)
+- max_bytes, backup_count: log file rotation
+- console: also write to stdout
+- console_level: minimum level written to stdout (e.g. "WARNING" when stdout is
+  redirected to a file that is never rotated)
+- queue_size: records buffered for the writer thread before new ones are dropped
+- access_log: log one "access" record per request
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config_loader import get_config_section
+
+LOGGING_DEFAULTS = {
+    'level': 'INFO',
+    'modules': {'werkzeug': 'WARNING'},
+    'file': os.path.join(
+        os.path.expanduser("~"),
+        "Documents",
+        "smart_purchase_slip.log"
+    ),
+    'max_bytes': 10 * 1024 * 1024,
+    'backup_count': 5,
+    'console': True,
+    'console_level': 'INFO',
+    'queue_size': 10000,
+    'access_log': True,
+}
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+MAX_REQUEST_ID_LENGTH = 64
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+access_logger = logging.getLogger('access')
+
+
+def get_request_id():
+    """Id of the request being handled in this thread, or None"""
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id (runs in the thread that logs, not the writer)"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Format the message now (args may change later) but keep the exception
+        # separate, so the JSON formatter can put it in its own field
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry['thread'] = record.threadName
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def _level(value):
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {value}")
+    return level
+
+
+def setup_logging(settings=None):
+    """
+    Route all logging through the queue and start the writer thread (once per process)
+
+    Args:
+        settings (dict): "logging" settings (default: the config.json block)
+    """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        settings = settings or get_config_section('logging', LOGGING_DEFAULTS)
+
+        handlers = []
+        if settings['console']:
+            console = logging.StreamHandler(sys.stdout)
+            console.setLevel(_level(settings['console_level']))
+            console.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+            handlers.append(console)
+        file_error = None
+        if settings['file']:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(settings['file'])), exist_ok=True)
+                file_handler = RotatingFileHandler(
+                    settings['file'],
+                    maxBytes=int(settings['max_bytes']),
+                    backupCount=int(settings['backup_count']),
+                    encoding='utf-8',
+                    delay=True,
+                )
+                file_handler.setFormatter(JSONFormatter())
+                handlers.append(file_handler)
+            except OSError as e:
+                file_error = e
+
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(int(settings['queue_size'])))
+        _queue_handler.addFilter(RequestIdFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(_level(settings['level']))
+        for name, level in (settings.get('modules') or {}).items():
+            logging.getLogger(name).setLevel(_level(level))
+        access_logger.disabled = not settings['access_log']
+
+        _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+    if file_error is not None:
+        logging.getLogger(__name__).warning(f"Cannot write log file {settings['file']}: {file_error}")
+
+
+def _reset_after_fork():
+    # The writer thread does not survive fork(); the child calls setup_logging() again
+    global _listener, _queue_handler, _setup_lock
+    _listener = None
+    _queue_handler = None
+    _setup_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def get_logging_stats():
+    """
+    Returns:
+        dict: Records waiting for the writer and records dropped because the queue was full
+    """
+    handler = _queue_handler
+    if handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': handler.queue.qsize(), 'dropped': handler.dropped}
+
+
+def init_request_logging(app):
+    """Request ids and one access record per request"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_log():
+        request_id = (request.headers.get(REQUEST_ID_HEADER) or '')[:MAX_REQUEST_ID_LENGTH] or uuid.uuid4().hex
+        g.request_id = request_id
+        g.request_started = time.perf_counter()
+        g.request_id_token = _request_id.set(request_id)
+
+    @app.after_request
+    def _finish_request_log(response):
+        request_id = g.get('request_id')
+        if request_id is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+        duration_ms = round((time.perf_counter() - g.request_started) * 1000, 1)
+        access_logger.info(
+            f"{request.method} {request.path} {response.status_code} {duration_ms}ms",
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+            },
+        )
+        return response
+
+    @app.teardown_request
+    def _end_request_log(exc):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            try:
+                _request_id.reset(token)
+            except ValueError:
+                # Set in a different context (e.g. the request was copied); just clear it
+                _request_id.set(None)
@@ -0,0 +1,422 @@
+"""
+Request metrics: latency per route, where the time went, and error counts
+
+init_metrics(app) times every request from before_request to the finished
+response object and files it under its route rule (e.g. /api/slip/<int:slip_id>/pdf,
+so every slip shares one series; unmatched URLs are counted as "<unmatched>").
+While a request runs, the code doing the work adds to its phase timers:
+
+- pool_wait: checking out a database connection (database.get_db_connection)
+- db: running statements (every DBSession statement)
+- render: print template and Chromium PDF rendering (templating, pdf_engine)
+- serialize: building JSON responses (the app's JSON provider)
+
+A streamed body (CSV/XLSX export, batch ZIP) is sent after the response object
+is returned, so its generation is not part of the request duration.
+
+GET /metrics serves Prometheus text format: request duration and phase
+histograms per route, request and error (5xx) counters, and the connection
+pool, per-statement and logging counters. GET /api/metrics is the JSON summary:
+p50/p95/p99 per route and phase over the last `sample_size` requests of that
+route.
+
+Counters are per process: with gunicorn workers > 1 each scrape reaches one
+worker.
+
+CONFIGURATION (config.json "metrics" block, all optional):
+- enabled: record requests and serve /metrics and /api/metrics
+- buckets: upper bounds (seconds) of the duration histogram buckets
+- sample_size: recent requests per route kept for the percentile summary
+"""
+import time
+import threading
+import contextvars
+from collections import deque
+
+from config_loader import get_config_section
+
+METRICS_DEFAULTS = {
+    'enabled': True,
+    'buckets': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    'sample_size': 1024,
+}
+
+PHASES = ('pool_wait', 'db', 'render', 'serialize')
+PERCENTILES = (50, 95, 99)
+UNMATCHED_ROUTE = '<unmatched>'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Phase timers of the request being handled (None outside a request)
+_phases = contextvars.ContextVar('request_phases', default=None)
+
+
+def record_phase(phase, seconds):
+    """Add time spent in `phase` to the current request (no-op outside a request)"""
+    phases = _phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+class PhaseTimer:
+    """with PhaseTimer('render'): ... - record_phase() for the duration of the block"""
+
+    __slots__ = ('phase', 'started')
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_phase(self.phase, time.perf_counter() - self.started)
+        return False
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics); not thread-safe on its own"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self):
+        """[(bound, observations <= bound)], ending with ('+Inf', count)"""
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        result.append(('+Inf', self.count))
+        return result
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None if empty)"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _RouteMetrics:
+    def __init__(self, bounds, sample_size):
+        self.duration = Histogram(bounds)
+        self.phases = {}
+        self.statuses = {}
+        self.errors = 0
+        self.samples = deque(maxlen=sample_size)
+
+
+class RequestMetrics:
+    """Per-route request histograms, counters and recent samples"""
+
+    def __init__(self, buckets=None, sample_size=1024):
+        self.bounds = tuple(sorted(float(bound) for bound in (buckets or METRICS_DEFAULTS['buckets'])))
+        self.sample_size = max(1, int(sample_size))
+        self.started_at = time.time()
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, method, status, seconds, phases):
+        """
+        Record one finished request
+
+        Args:
+            route (str): URL rule (e.g. '/api/slip/<int:slip_id>/pdf')
+            method (str): HTTP method
+            status (int): Response status code
+            seconds (float): Request duration
+            phases (dict): phase -> seconds spent in it
+        """
+        key = (route, method)
+        with self._lock:
+            metrics = self._routes.get(key)
+            if metrics is None:
+                metrics = self._routes[key] = _RouteMetrics(self.bounds, self.sample_size)
+            metrics.duration.observe(seconds)
+            for phase, phase_seconds in phases.items():
+                histogram = metrics.phases.get(phase)
+                if histogram is None:
+                    histogram = metrics.phases[phase] = Histogram(self.bounds)
+                histogram.observe(phase_seconds)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            if status >= 500:
+                metrics.errors += 1
+            metrics.samples.append((seconds, phases))
+
+    def snapshot(self):
+        """Copy of every route's counters, taken under the lock"""
+        with self._lock:
+            return {
+                key: {
+                    'duration': (metrics.duration.cumulative(), metrics.duration.sum, metrics.duration.count),
+                    'phases': {
+                        phase: (histogram.cumulative(), histogram.sum, histogram.count)
+                        for phase, histogram in metrics.phases.items()
+                    },
+                    'statuses': dict(metrics.statuses),
+                    'errors': metrics.errors,
+                    'samples': list(metrics.samples),
+                }
+                for key, metrics in self._routes.items()
+            }
+
+    def summary(self):
+        """
+        Returns:
+            list: One dict per route/method: counts, errors and p50/p95/p99 (ms) of
+                the duration and of each phase over the recent samples, slowest p95 first
+        """
+        routes = []
+        for (route, method), data in self.snapshot().items():
+            samples = data['samples']
+            entry = {
+                'route': route,
+                'method': method,
+                'count': data['duration'][2],
+                'errors': data['errors'],
+                'statuses': {str(status): count for status, count in sorted(data['statuses'].items())},
+                'window': len(samples),
+                'duration_ms': _percentiles_ms([seconds for seconds, _ in samples]),
+                'phases_ms': {},
+            }
+            for phase in PHASES:
+                values = [phases[phase] for _, phases in samples if phase in phases]
+                if values:
+                    entry['phases_ms'][phase] = _percentiles_ms(values)
+            routes.append(entry)
+        routes.sort(key=lambda entry: entry['duration_ms'].get('p95') or 0, reverse=True)
+        return routes
+
+
+def _percentiles_ms(values):
+    values = sorted(values)
+    result = {f'p{pct}': round(percentile(values, pct) * 1000, 2) for pct in PERCENTILES} if values else {}
+    if values:
+        result['mean'] = round(sum(values) / len(values) * 1000, 2)
+    return result
+
+
+# ==================== PROMETHEUS TEXT FORMAT ====================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value == value and value not in (float('inf'), float('-inf')) else str(value)
+    return str(value)
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines = []
+        self._declared = set()
+
+    def declare(self, name, metric_type, help_text):
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f'# HELP {name} {help_text}')
+            self.lines.append(f'# TYPE {name} {metric_type}')
+
+    def sample(self, name, value, **labels):
+        self.lines.append(f'{name}{_labels(**labels)} {_number(value)}')
+
+    def histogram(self, name, help_text, data, **labels):
+        cumulative, total, count = data
+        self.declare(name, 'histogram', help_text)
+        for bound, observations in cumulative:
+            self.sample(f'{name}_bucket', observations, **labels, le=bound if bound == '+Inf' else _number(float(bound)))
+        self.sample(f'{name}_sum', total, **labels)
+        self.sample(f'{name}_count', count, **labels)
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def render_prometheus(request_metrics):
+    """
+    All metrics in Prometheus text exposition format
+
+    Args:
+        request_metrics (RequestMetrics): Request counters (None: only pool/query/logging)
+
+    Returns:
+        str: Exposition text
+    """
+    out = _Exposition()
+
+    if request_metrics is not None:
+        snapshot = request_metrics.snapshot()
+        for (route, method), data in sorted(snapshot.items()):
+            out.histogram(
+                'slip_http_request_duration_seconds', 'Time from request start to response object',
+                data['duration'], route=route, method=method
+            )
+        for (route, method), data in sorted(snapshot.items()):
+            for phase, phase_data in sorted(data['phases'].items()):
+                out.histogram(
+                    'slip_http_request_phase_seconds', 'Time per request spent in pool_wait, db, render, serialize',
+                    phase_data, route=route, method=method, phase=phase
+                )
+        out.declare('slip_http_requests_total', 'counter', 'Requests by route, method and status')
+        for (route, method), data in sorted(snapshot.items()):
+            for status, count in sorted(data['statuses'].items()):
+                out.sample('slip_http_requests_total', count, route=route, method=method, status=status)
+        out.declare('slip_http_request_errors_total', 'counter', 'Requests answered with a 5xx status')
+        for (route, method), data in sorted(snapshot.items()):
+            out.sample('slip_http_request_errors_total', data['errors'], route=route, method=method)
+        out.declare('slip_process_start_time_seconds', 'gauge', 'Unix time the metrics were reset (process start)')
+        out.sample('slip_process_start_time_seconds', request_metrics.started_at)
+
+    from database import get_pool_stats, get_query_stats
+
+    pool = get_pool_stats()
+    if pool is not None:
+        for key, metric_type, help_text in (
+            ('checkouts', 'counter', 'Connections checked out of the pool'),
+            ('waits', 'counter', 'Checkouts that had to wait for a free connection'),
+            ('timeouts', 'counter', 'Checkouts that gave up after checkout_timeout'),
+            ('connections_created', 'counter', 'Connections opened'),
+            ('connections_recycled', 'counter', 'Connections replaced after max_lifetime'),
+            ('connections_discarded', 'counter', 'Broken connections dropped'),
+            ('ping_failures', 'counter', 'Idle connections that failed their ping'),
+            ('in_use', 'gauge', 'Connections checked out now'),
+            ('idle', 'gauge', 'Open connections waiting in the pool'),
+            ('size', 'gauge', 'Maximum connections'),
+        ):
+            name = f'slip_db_pool_{key}' + ('_total' if metric_type == 'counter' else '')
+            out.declare(name, metric_type, help_text)
+            out.sample(name, pool[key])
+        out.histogram(
+            'slip_db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+            (pool['wait_histogram'][:-1], pool['wait_seconds_total'], pool['wait_histogram'][-1][1])
+        )
+
+    queries = get_query_stats()
+    if queries:
+        out.declare('slip_db_queries_total', 'counter', 'Statements run, by name')
+        for name, stats in sorted(queries.items()):
+            out.sample('slip_db_queries_total', stats['count'], query=name)
+        out.declare('slip_db_query_seconds_total', 'counter', 'Time spent running statements, by name')
+        for name, stats in sorted(queries.items()):
+            out.sample('slip_db_query_seconds_total', stats['seconds_total'], query=name)
+        out.declare('slip_db_query_seconds_max', 'gauge', 'Slowest run of each statement')
+        for name, stats in sorted(queries.items()):
+            out.sample('slip_db_query_seconds_max', stats['seconds_max'], query=name)
+
+    from logging_setup import get_logging_stats
+
+    logging_stats = get_logging_stats()
+    out.declare('slip_log_records_queued', 'gauge', 'Log records waiting for the writer thread')
+    out.sample('slip_log_records_queued', logging_stats['queued'])
+    out.declare('slip_log_records_dropped_total', 'counter', 'Log records dropped because the queue was full')
+    out.sample('slip_log_records_dropped_total', logging_stats['dropped'])
+
+    return out.text()
+
+
+# ==================== FLASK INTEGRATION ====================
+
+def _timed_json_provider(provider_class):
+    class TimedJSONProvider(provider_class):
+        """The app's JSON provider, with dumps() counted as the serialize phase"""
+
+        def dumps(self, obj, **kwargs):
+            with PhaseTimer('serialize'):
+                return super().dumps(obj, **kwargs)
+
+    return TimedJSONProvider
+
+
+def init_metrics(app, settings=None):
+    """
+    Time every request and serve /metrics (Prometheus) and /api/metrics (JSON summary)
+
+    Args:
+        app (Flask): The app
+        settings (dict): "metrics" settings (default: the config.json block)
+
+    Returns:
+        RequestMetrics: The app's counters (also app.extensions['metrics']), or None if disabled
+    """
+    from flask import g, request, jsonify, Response
+
+    settings = settings or get_config_section('metrics', METRICS_DEFAULTS)
+    if not settings['enabled']:
+        return None
+
+    request_metrics = RequestMetrics(settings['buckets'], settings['sample_size'])
+    app.extensions['metrics'] = request_metrics
+    app.json_provider_class = _timed_json_provider(app.json_provider_class)
+    app.json = app.json_provider_class(app)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = _phases.set({})
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        request_metrics.observe(route, request.method, response.status_code, seconds, dict(_phases.get() or {}))
+        return response
+
+    @app.teardown_request
+    def _end_request_metrics(exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            try:
+                _phases.reset(token)
+            except ValueError:
+                _phases.set(None)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Prometheus scrape endpoint"""
+        return Response(render_prometheus(request_metrics), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+    @app.route('/api/metrics')
+    def metrics_summary():
+        """p50/p95/p99 per route and phase, plus pool and statement counters"""
+        from database import get_pool_stats, get_query_stats
+        from logging_setup import get_logging_stats
+
+        pool = get_pool_stats()
+        if pool is not None:
+            pool = {key: value for key, value in pool.items() if key != 'wait_histogram'}
+        return jsonify({
+            'success': True,
+            'uptime_seconds': round(time.time() - request_metrics.started_at, 1),
+            'routes': request_metrics.summary(),
+            'pool': pool,
+            'queries': get_query_stats(),
+            'logging': get_logging_stats(),
+        })
+
+    return request_metrics
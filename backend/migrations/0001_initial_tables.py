@@ -0,0 +1,196 @@
+"""
+Tables as they were before versioned migrations: purchase_slips, users,
+unloading_godowns, the columns added to purchase_slips over time and the
+conversion of the date columns to DATETIME
+
+Databases created by older versions already have most of this; only what is
+missing is added, and a date column is converted only if it is not DATETIME yet.
+"""
+import logging
+
+from schema_migrations import add_columns, table_columns, alter_table
+
+logger = logging.getLogger(__name__)
+
+CREATE_PURCHASE_SLIPS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS purchase_slips (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        company_name TEXT,
+        company_address TEXT,
+        document_type VARCHAR(255) DEFAULT 'Purchase Slip',
+        vehicle_no VARCHAR(255),
+        date DATETIME NOT NULL,
+        bill_no INT NOT NULL,
+        party_name TEXT,
+        material_name TEXT,
+        ticket_no VARCHAR(255),
+        broker VARCHAR(255),
+        terms_of_delivery TEXT,
+        sup_inv_no VARCHAR(255),
+        gst_no VARCHAR(255),
+        bags DOUBLE DEFAULT 0,
+        avg_bag_weight DOUBLE DEFAULT 0,
+        net_weight DOUBLE DEFAULT 0,
+        net_weight_kg DOUBLE DEFAULT 0,
+        gunny_weight_kg DOUBLE DEFAULT 0,
+        final_weight_kg DOUBLE DEFAULT 0,
+        weight_quintal DOUBLE DEFAULT 0,
+        weight_khandi DOUBLE DEFAULT 0,
+        shortage_kg DOUBLE DEFAULT 0,
+        rate DOUBLE DEFAULT 0,
+        rate_basis VARCHAR(50) DEFAULT 'Quintal',
+        rate_value DOUBLE DEFAULT 0,
+        calculated_rate DOUBLE DEFAULT 0,
+        total_purchase_amount DOUBLE DEFAULT 0,
+        amount DOUBLE DEFAULT 0,
+        bank_commission DOUBLE DEFAULT 0,
+        postage DOUBLE DEFAULT 0,
+        batav_percent DOUBLE DEFAULT 0,
+        batav DOUBLE DEFAULT 0,
+        shortage_percent DOUBLE DEFAULT 0,
+        shortage DOUBLE DEFAULT 0,
+        dalali_rate DOUBLE DEFAULT 0,
+        dalali DOUBLE DEFAULT 0,
+        hammali_rate DOUBLE DEFAULT 0,
+        hammali DOUBLE DEFAULT 0,
+        freight DOUBLE DEFAULT 0,
+        rate_diff DOUBLE DEFAULT 0,
+        quality_diff DOUBLE DEFAULT 0,
+        quality_diff_comment TEXT,
+        moisture_ded DOUBLE DEFAULT 0,
+        moisture_ded_percent DOUBLE DEFAULT 0,
+        tds DOUBLE DEFAULT 0,
+        total_deduction DOUBLE DEFAULT 0,
+        payable_amount DOUBLE DEFAULT 0,
+        payment_method VARCHAR(255),
+        payment_date DATETIME,
+        payment_amount DOUBLE DEFAULT 0,
+        payment_bank_account TEXT,
+        payment_due_date DATETIME,
+        payment_due_comment TEXT,
+        instalment_1_date DATETIME,
+        instalment_1_amount DOUBLE DEFAULT 0,
+        instalment_1_comment TEXT,
+        instalment_1_payment_method VARCHAR(255),
+        instalment_1_payment_bank_account TEXT,
+        instalment_2_date DATETIME,
+        instalment_2_amount DOUBLE DEFAULT 0,
+        instalment_2_comment TEXT,
+        instalment_2_payment_method VARCHAR(255),
+        instalment_2_payment_bank_account TEXT,
+        instalment_3_date DATETIME,
+        instalment_3_amount DOUBLE DEFAULT 0,
+        instalment_3_comment TEXT,
+        instalment_3_payment_method VARCHAR(255),
+        instalment_3_payment_bank_account TEXT,
+        instalment_4_date DATETIME,
+        instalment_4_amount DOUBLE DEFAULT 0,
+        instalment_4_comment TEXT,
+        instalment_4_payment_method VARCHAR(255),
+        instalment_4_payment_bank_account TEXT,
+        instalment_5_date DATETIME,
+        instalment_5_amount DOUBLE DEFAULT 0,
+        instalment_5_comment TEXT,
+        instalment_5_payment_method VARCHAR(255),
+        instalment_5_payment_bank_account TEXT,
+        prepared_by VARCHAR(255),
+        authorised_sign VARCHAR(255),
+        paddy_unloading_godown TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_date (date),
+        INDEX idx_party_name (party_name(255)),
+        INDEX idx_bill_no (bill_no)
+    )
+'''
+
+CREATE_USERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(255) UNIQUE NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255),
+        role VARCHAR(50) DEFAULT 'user',
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP NULL
+    )
+'''
+
+# Dropdown values for the unloading godown field
+CREATE_UNLOADING_GODOWNS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS unloading_godowns (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Columns added to purchase_slips after it was first created
+LEGACY_COLUMNS = {
+    'shortage_kg': "DOUBLE DEFAULT 0",
+    'rate_basis': "VARCHAR(50) DEFAULT 'Quintal'",
+    'calculated_rate': "DOUBLE DEFAULT 0",
+    'postage': "DOUBLE DEFAULT 0",
+    'payment_due_comment': "TEXT",
+    'payment_bank_account': "TEXT",
+    'mobile_number': "VARCHAR(255)",
+    'moisture_ded_comment': "TEXT",
+    'moisture_percent': "DOUBLE DEFAULT 0",
+    'moisture_kg': "DOUBLE DEFAULT 0",
+    'company_gst_no': "VARCHAR(255)",
+    'company_mobile_no': "VARCHAR(255)",
+    'instalment_1_amount': "DOUBLE DEFAULT 0",
+    'instalment_1_comment': "TEXT",
+    'instalment_1_payment_method': "VARCHAR(255)",
+    'instalment_1_payment_bank_account': "TEXT",
+    'instalment_2_amount': "DOUBLE DEFAULT 0",
+    'instalment_2_comment': "TEXT",
+    'instalment_2_payment_method': "VARCHAR(255)",
+    'instalment_2_payment_bank_account': "TEXT",
+    'instalment_3_amount': "DOUBLE DEFAULT 0",
+    'instalment_3_comment': "TEXT",
+    'instalment_3_payment_method': "VARCHAR(255)",
+    'instalment_3_payment_bank_account': "TEXT",
+    'instalment_4_amount': "DOUBLE DEFAULT 0",
+    'instalment_4_comment': "TEXT",
+    'instalment_4_payment_method': "VARCHAR(255)",
+    'instalment_4_payment_bank_account': "TEXT",
+    'instalment_5_amount': "DOUBLE DEFAULT 0",
+    'instalment_5_comment': "TEXT",
+    'instalment_5_payment_method': "VARCHAR(255)",
+    'instalment_5_payment_bank_account': "TEXT",
+    'quality_diff_comment': "TEXT",
+    'moisture_ded_percent': "DOUBLE DEFAULT 0",
+    'prepared_by': "VARCHAR(255)",
+    'authorised_sign': "VARCHAR(255)",
+    'paddy_unloading_godown': "TEXT",
+    'net_weight_kg': "DOUBLE DEFAULT 0",
+    'gunny_weight_kg': "DOUBLE DEFAULT 0",
+    'final_weight_kg': "DOUBLE DEFAULT 0",
+    'weight_quintal': "DOUBLE DEFAULT 0",
+    'weight_khandi': "DOUBLE DEFAULT 0",
+    'rate_value': "DOUBLE DEFAULT 0",
+    'total_purchase_amount': "DOUBLE DEFAULT 0",
+    'created_at': "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+}
+
+DATE_COLUMNS = [
+    'date', 'payment_date', 'payment_due_date',
+    'instalment_1_date', 'instalment_2_date', 'instalment_3_date',
+    'instalment_4_date', 'instalment_5_date'
+]
+
+
+def upgrade(session):
+    session.execute(CREATE_PURCHASE_SLIPS_TABLE, name='migrations.create')
+    session.execute(CREATE_USERS_TABLE, name='migrations.create')
+    session.execute(CREATE_UNLOADING_GODOWNS_TABLE, name='migrations.create')
+
+    add_columns(session, 'purchase_slips', LEGACY_COLUMNS)
+
+    # Changing a column type rebuilds the table, so only the columns that need it
+    existing = table_columns(session, 'purchase_slips')
+    to_convert = [name for name in DATE_COLUMNS if name in existing and existing[name] != 'datetime']
+    if to_convert:
+        alter_table(session, 'purchase_slips', [f"MODIFY COLUMN {name} DATETIME" for name in to_convert])
+        logger.info(f"Converted column(s) to DATETIME: {', '.join(to_convert)}")
@@ -0,0 +1,80 @@
+"""
+Payments move from the instalment_N_* columns to the slip_payments table;
+purchase_slips.total_paid keeps their sum (see payments.py)
+
+The DDL and the copy are written out here rather than imported from payments.py,
+so later changes to the application code cannot change what this migration does.
+"""
+import logging
+
+from schema_migrations import add_columns
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+CREATE_PAYMENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS slip_payments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        slip_id INT NOT NULL,
+        seq TINYINT NOT NULL,
+        paid_on DATETIME NULL,
+        amount DOUBLE NOT NULL DEFAULT 0,
+        method VARCHAR(255),
+        bank_account TEXT,
+        comment TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_slip_payments_slip_seq (slip_id, seq),
+        INDEX idx_slip_payments_method_date (method, paid_on),
+        CONSTRAINT fk_slip_payments_slip FOREIGN KEY (slip_id)
+            REFERENCES purchase_slips (id) ON DELETE CASCADE
+    )
+'''
+
+# Instalment slots on purchase_slips at the time of this migration
+INSTALMENTS = (1, 2, 3, 4, 5)
+
+COPY_PAYMENTS_SQL = 'INSERT IGNORE INTO slip_payments (slip_id, seq, paid_on, amount, method, bank_account, comment) ' + ' UNION ALL '.join(
+    f'SELECT id, {i}, instalment_{i}_date, instalment_{i}_amount, instalment_{i}_payment_method, '
+    f'instalment_{i}_payment_bank_account, instalment_{i}_comment FROM purchase_slips '
+    f'WHERE id IN ({{ids}}) AND COALESCE(instalment_{i}_amount, 0) <> 0'
+    for i in INSTALMENTS
+)
+
+FILL_TOTAL_SQL = (
+    'UPDATE purchase_slips SET total_paid = ROUND('
+    + ' + '.join(f'COALESCE(instalment_{i}_amount, 0)' for i in INSTALMENTS)
+    + ', 2) WHERE id IN ({ids}) AND total_paid IS NULL'
+)
+
+
+def upgrade(session):
+    # NULL until the slip's instalments have been copied
+    add_columns(session, 'purchase_slips', {'total_paid': "DOUBLE NULL"})
+    session.execute(CREATE_PAYMENTS_TABLE, name='migrations.create')
+    migrated = copy_instalments(session)
+    if migrated:
+        logger.info(f"Migrated instalments of {migrated} slip(s) into slip_payments")
+
+
+def copy_instalments(session):
+    """Copy payments of slips with total_paid IS NULL in id batches (one commit per batch)"""
+    migrated = 0
+    while True:
+        rows = session.fetchall(
+            'SELECT id FROM purchase_slips WHERE total_paid IS NULL ORDER BY id LIMIT %s FOR UPDATE',
+            (BATCH_SIZE,), name='migrations.payments_batch'
+        )
+        if not rows:
+            session.commit()
+            return migrated
+
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(ids))
+        session.execute(
+            COPY_PAYMENTS_SQL.format(ids=placeholders), tuple(ids) * len(INSTALMENTS),
+            name='migrations.payments_rows'
+        )
+        session.execute(FILL_TOTAL_SQL.format(ids=placeholders), tuple(ids), name='migrations.payments_total')
+        session.commit()
+        migrated += len(ids)
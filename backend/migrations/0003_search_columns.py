@@ -0,0 +1,38 @@
+"""
+Normalized search / rollup key columns and the stored balance, with the indexes
+GET /api/slips/search and the outstanding report use
+
+The key columns are maintained by MySQL (see repository.normalize_*):
+- names: trimmed + lowercased, VARCHAR so they can be fully indexed
+- vehicle number: uppercased with spaces/dashes removed ("MH 12-AB 1234" -> "MH12AB1234")
+
+Each filter has an index whose leading column it constrains; the date range is
+the second column so "party + period" style queries stay a single range scan.
+"""
+from schema_migrations import add_columns, add_indexes
+
+GENERATED_COLUMNS = {
+    'party_name_norm': "VARCHAR(191) GENERATED ALWAYS AS (LOWER(TRIM(LEFT(party_name, 191)))) STORED",
+    'broker_norm': "VARCHAR(191) GENERATED ALWAYS AS (LOWER(TRIM(LEFT(broker, 191)))) STORED",
+    'godown_norm': "VARCHAR(191) GENERATED ALWAYS AS (LOWER(TRIM(LEFT(paddy_unloading_godown, 191)))) STORED",
+    'material_norm': "VARCHAR(191) GENERATED ALWAYS AS (LOWER(TRIM(LEFT(material_name, 191)))) STORED",
+    'vehicle_no_norm': "VARCHAR(64) GENERATED ALWAYS AS "
+                       "(LEFT(REPLACE(REPLACE(UPPER(vehicle_no), ' ', ''), '-', ''), 64)) STORED",
+    # Stored balance for outstanding / unpaid queries
+    'balance': "DOUBLE GENERATED ALWAYS AS (ROUND(payable_amount - COALESCE(total_paid, 0), 2)) STORED",
+}
+
+INDEXES = {
+    'idx_party_norm_date': "INDEX idx_party_norm_date (party_name_norm, date)",
+    'idx_broker_norm_date': "INDEX idx_broker_norm_date (broker_norm, date)",
+    'idx_godown_norm_date': "INDEX idx_godown_norm_date (godown_norm, date)",
+    'idx_vehicle_no_norm': "INDEX idx_vehicle_no_norm (vehicle_no_norm)",
+    'ft_party_name': "FULLTEXT INDEX ft_party_name (party_name)",
+    'idx_balance_party': "INDEX idx_balance_party (balance, party_name_norm)",
+}
+
+
+def upgrade(session):
+    # STORED generated columns are computed for every row: one table rebuild for all of them
+    add_columns(session, 'purchase_slips', GENERATED_COLUMNS)
+    add_indexes(session, 'purchase_slips', INDEXES)
@@ -0,0 +1,102 @@
+"""
+Bill numbers are unique per financial year (see bill_numbers.py); slips saved
+before purchase_slips.fiscal_year existed get the year of their date
+
+The old SELECT MAX(bill_no) + 1 allocation could hand two concurrent saves the
+same number, so existing data may hold duplicates the unique index rejects. In
+each duplicate group the earliest slip (lowest id) keeps its number; the others
+are renumbered after the year's highest bill and logged, old -> new, so their
+printed slips can be reissued. bill_sequences then starts after the highest
+bill of each year.
+"""
+import logging
+
+from schema_migrations import add_columns, add_indexes
+
+logger = logging.getLogger(__name__)
+
+# Financial year (starting calendar year) of purchase_slips.date, April to March;
+# frozen copy of bill_numbers.FISCAL_YEAR_SQL
+FISCAL_YEAR_SQL = 'YEAR(date) - (MONTH(date) < 4)'
+
+CREATE_BILL_SEQUENCES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS bill_sequences (
+        fiscal_year SMALLINT PRIMARY KEY,
+        last_value INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+'''
+
+
+def upgrade(session):
+    add_columns(session, 'purchase_slips', {'fiscal_year': "SMALLINT NULL"})
+    session.execute(CREATE_BILL_SEQUENCES_TABLE, name='migrations.create')
+    cursor = session.execute(
+        f"UPDATE purchase_slips SET fiscal_year = {FISCAL_YEAR_SQL} WHERE fiscal_year IS NULL",
+        name='migrations.fiscal_year_backfill'
+    )
+    if cursor.rowcount:
+        logger.info(f"Set fiscal_year on {cursor.rowcount} existing slip(s)")
+    renumber_duplicate_bills(session)
+    session.execute(
+        '''
+        INSERT INTO bill_sequences (fiscal_year, last_value)
+        SELECT fiscal_year, MAX(bill_no) FROM purchase_slips WHERE fiscal_year IS NOT NULL GROUP BY fiscal_year
+        ON DUPLICATE KEY UPDATE last_value = GREATEST(last_value, VALUES(last_value))
+        ''',
+        name='migrations.bill_sequences_seed'
+    )
+    session.commit()
+    add_indexes(session, 'purchase_slips', {
+        'uq_fiscal_year_bill_no': "UNIQUE INDEX uq_fiscal_year_bill_no (fiscal_year, bill_no)",
+    })
+
+
+def renumber_duplicate_bills(session):
+    """
+    Give every slip but the first of each duplicate (fiscal_year, bill_no) a new number
+
+    Returns:
+        list: (slip_id, fiscal_year, old bill_no, new bill_no) per renumbered slip
+    """
+    duplicates = session.fetchall(
+        '''
+        SELECT fiscal_year, bill_no, GROUP_CONCAT(id ORDER BY id) AS slip_ids
+        FROM purchase_slips WHERE fiscal_year IS NOT NULL
+        GROUP BY fiscal_year, bill_no HAVING COUNT(*) > 1
+        ORDER BY fiscal_year, bill_no
+        ''',
+        name='migrations.duplicate_bills'
+    )
+    if not duplicates:
+        return []
+
+    renumbered = []
+    next_bill = {}
+    for row in duplicates:
+        fiscal_year = row['fiscal_year']
+        if fiscal_year not in next_bill:
+            top = session.fetchone(
+                'SELECT MAX(bill_no) AS bill_no FROM purchase_slips WHERE fiscal_year = %s',
+                (fiscal_year,), name='migrations.max_bill'
+            )
+            next_bill[fiscal_year] = int(top['bill_no']) + 1
+        slip_ids = row['slip_ids']
+        if isinstance(slip_ids, (bytes, bytearray)):
+            # GROUP_CONCAT can come back as a binary string
+            slip_ids = slip_ids.decode('ascii')
+        slip_ids = [int(slip_id) for slip_id in slip_ids.split(',')]
+        for slip_id in slip_ids[1:]:
+            new_bill = next_bill[fiscal_year]
+            next_bill[fiscal_year] += 1
+            session.execute(
+                'UPDATE purchase_slips SET bill_no = %s WHERE id = %s',
+                (new_bill, slip_id), name='migrations.renumber_bill'
+            )
+            renumbered.append((slip_id, fiscal_year, row['bill_no'], new_bill))
+
+    logger.warning(
+        f"Renumbered {len(renumbered)} slip(s) that shared a bill number (slip id: old -> new): "
+        + ', '.join(f"{slip_id}: {old} -> {new} (FY {fiscal_year}-{(fiscal_year + 1) % 100:02d})" for slip_id, fiscal_year, old, new in renumbered)
+    )
+    return renumbered
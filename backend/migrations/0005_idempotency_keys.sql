@@ -0,0 +1,11 @@
+-- Idempotency keys of POST /api/add-slip (see idempotency.py)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idem_key VARCHAR(128) PRIMARY KEY,
+    scope VARCHAR(64) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    response_code SMALLINT NULL,
+    response_body MEDIUMTEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL,
+    INDEX idx_idempotency_expires (expires_at)
+);
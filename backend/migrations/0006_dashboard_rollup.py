@@ -0,0 +1,88 @@
+"""
+Daily rollup read by the dashboard (see rollup.py), backfilled when first created
+
+The DDL and the backfill are written out here rather than imported from rollup.py,
+so later changes to the application code cannot change what this migration does.
+"""
+import logging
+
+from schema_migrations import table_exists
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'purchase_daily_rollup'
+
+# Summed slip columns and payment methods at the time of this migration
+SUM_COLUMNS = [
+    'weight_quintal', 'total_purchase_amount', 'total_deduction', 'payable_amount',
+    'bank_commission', 'postage', 'batav', 'shortage', 'dalali', 'hammali',
+    'freight', 'rate_diff', 'quality_diff', 'moisture_ded', 'tds',
+]
+PAYMENT_MODES = [('cash', 'Cash'), ('online', 'Online Transfer'), ('cheque', 'Cheque')]
+
+CREATE_ROLLUP_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        day DATE NOT NULL,
+        party_key VARCHAR(191) NOT NULL DEFAULT '',
+        godown_key VARCHAR(191) NOT NULL DEFAULT '',
+        material_key VARCHAR(191) NOT NULL DEFAULT '',
+        party_name VARCHAR(191),
+        godown VARCHAR(191),
+        material_name VARCHAR(191),
+        bills INT NOT NULL DEFAULT 0,
+        {', '.join(f'{column} DOUBLE NOT NULL DEFAULT 0' for column in SUM_COLUMNS)},
+        paid_amount DOUBLE NOT NULL DEFAULT 0,
+        {', '.join(f'paid_{key} DOUBLE NOT NULL DEFAULT 0' for key, _ in PAYMENT_MODES)},
+        paid_other DOUBLE NOT NULL DEFAULT 0,
+        rate_sum DOUBLE NOT NULL DEFAULT 0,
+        rate_rows INT NOT NULL DEFAULT 0,
+        last_payment_date DATETIME NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (day, party_key, godown_key, material_key),
+        INDEX idx_rollup_party_day (party_key, day),
+        INDEX idx_rollup_godown_day (godown_key, day)
+    )
+'''
+
+
+def _payments(aggregate, condition=''):
+    return f'(SELECT {aggregate} FROM slip_payments p WHERE p.slip_id = purchase_slips.id{condition})'
+
+
+def _paid_by_method(method):
+    return _payments('COALESCE(SUM(p.amount), 0)', f" AND p.method = '{method}'")
+
+
+_KNOWN_METHODS = ', '.join(f"'{method}'" for _, method in PAYMENT_MODES)
+_PAID_OTHER = _payments('COALESCE(SUM(p.amount), 0)', f" AND COALESCE(p.method, '') NOT IN ({_KNOWN_METHODS})")
+_LAST_PAYMENT = _payments('MAX(p.paid_on)')
+
+BACKFILL_SQL = 'INSERT INTO {table} ({columns}) SELECT {exprs} FROM purchase_slips GROUP BY 1, 2, 3, 4'.format(
+    table=ROLLUP_TABLE,
+    columns=', '.join(
+        ['day', 'party_key', 'godown_key', 'material_key', 'party_name', 'godown', 'material_name', 'bills']
+        + SUM_COLUMNS
+        + ['paid_amount'] + [f'paid_{key}' for key, _ in PAYMENT_MODES] + ['paid_other']
+        + ['rate_sum', 'rate_rows', 'last_payment_date']
+    ),
+    exprs=', '.join(
+        ['DATE(date)', "COALESCE(party_name_norm, '')", "COALESCE(godown_norm, '')", "COALESCE(material_norm, '')",
+         'MAX(LEFT(party_name, 191))', 'MAX(LEFT(paddy_unloading_godown, 191))', 'MAX(LEFT(material_name, 191))',
+         'COUNT(*)']
+        + [f'COALESCE(SUM({column}), 0)' for column in SUM_COLUMNS]
+        + ['COALESCE(SUM(total_paid), 0)']
+        + [f'SUM({_paid_by_method(method)})' for _, method in PAYMENT_MODES]
+        + [f'SUM({_PAID_OTHER})']
+        + ['COALESCE(SUM(CASE WHEN weight_quintal > 0 THEN payable_amount / weight_quintal END), 0)',
+           'COUNT(CASE WHEN weight_quintal > 0 THEN 1 END)',
+           f'MAX({_LAST_PAYMENT})']
+    ),
+)
+
+
+def upgrade(session):
+    if table_exists(session, ROLLUP_TABLE):
+        return
+    session.execute(CREATE_ROLLUP_TABLE, name='migrations.create')
+    rows = session.execute(BACKFILL_SQL, name='migrations.rollup_backfill').rowcount
+    logger.info(f"Built {ROLLUP_TABLE} ({rows} rows)")
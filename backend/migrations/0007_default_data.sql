@@ -0,0 +1,14 @@
+-- Default admin user (username: admin, password: admin) on a database without users
+INSERT INTO users (username, password, full_name, role)
+SELECT 'admin', 'admin', 'Administrator', 'admin' FROM DUAL
+WHERE NOT EXISTS (SELECT 1 FROM users);
+
+-- Default unloading godowns on an empty dropdown
+INSERT IGNORE INTO unloading_godowns (name)
+SELECT name FROM (
+    SELECT 'Godown A' AS name UNION ALL
+    SELECT 'Godown B' UNION ALL
+    SELECT 'Main Warehouse' UNION ALL
+    SELECT 'Storage Unit 1'
+) AS defaults
+WHERE NOT EXISTS (SELECT 1 FROM unloading_godowns);
@@ -0,0 +1,109 @@
+"""
+Slip payments: the slip_payments table and its migration from instalment columns
+
+Payments used to live only in five hardwired instalment_N_* column groups on
+purchase_slips. They are now rows in slip_payments (indexed by slip and by
+method + date) and the slip carries a denormalized total_paid.
+
+- Writes go to both: slip_payments plus the instalment_N_* columns (mirrored
+  slot by slot), so the print template, the edit form and older clients keep
+  working. A slip therefore holds at most INSTALMENT_COUNT payments.
+- total_paid IS NULL marks a slip that has not been migrated yet. The migration
+  copies those in small id batches, each in its own short transaction with the
+  batch rows locked, so the table stays writable while it runs. It is resumable
+  and safe to run repeatedly (migration 0002_slip_payments ran its own copy once).
+
+Command line:
+    python backend/payments.py --migrate
+"""
+import sys
+import time
+
+from repository import INSTALMENT_COUNT, PAYMENT_INSTALMENT_FIELDS
+
+MIGRATION_BATCH_SIZE = 1000
+
+CREATE_PAYMENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS slip_payments (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        slip_id INT NOT NULL,
+        seq TINYINT NOT NULL,
+        paid_on DATETIME NULL,
+        amount DOUBLE NOT NULL DEFAULT 0,
+        method VARCHAR(255),
+        bank_account TEXT,
+        comment TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_slip_payments_slip_seq (slip_id, seq),
+        INDEX idx_slip_payments_method_date (method, paid_on),
+        CONSTRAINT fk_slip_payments_slip FOREIGN KEY (slip_id)
+            REFERENCES purchase_slips (id) ON DELETE CASCADE
+    )
+'''
+
+_MIGRATE_PAYMENTS_SQL = 'INSERT IGNORE INTO slip_payments (slip_id, seq, {columns}) {selects}'.format(
+    columns=', '.join(column for column, _ in PAYMENT_INSTALMENT_FIELDS),
+    selects=' UNION ALL '.join(
+        'SELECT id, {i}, {fields} FROM purchase_slips '
+        'WHERE id IN ({{ids}}) AND COALESCE(instalment_{i}_amount, 0) <> 0'.format(
+            i=i,
+            fields=', '.join(f'instalment_{i}_{suffix}' for _, suffix in PAYMENT_INSTALMENT_FIELDS),
+        )
+        for i in range(1, INSTALMENT_COUNT + 1)
+    ),
+)
+
+_MIGRATE_TOTAL_SQL = (
+    'UPDATE purchase_slips SET total_paid = ROUND({}, 2) WHERE id IN ({{ids}}) AND total_paid IS NULL'.format(
+        ' + '.join(f'COALESCE(instalment_{i}_amount, 0)' for i in range(1, INSTALMENT_COUNT + 1))
+    )
+)
+
+
+def migrate_instalments(session, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Copy instalment_N_* payments of unmigrated slips into slip_payments and fill total_paid
+
+    Commits after every batch, so the session must not be inside a caller's transaction.
+
+    Returns:
+        int: Number of slips migrated
+    """
+    migrated = 0
+    while True:
+        rows = session.fetchall(
+            'SELECT id FROM purchase_slips WHERE total_paid IS NULL ORDER BY id LIMIT %s FOR UPDATE',
+            (batch_size,), name='payments.migrate_batch'
+        )
+        if not rows:
+            session.commit()
+            return migrated
+
+        ids = [row['id'] for row in rows]
+        placeholders = ', '.join(['%s'] * len(ids))
+        session.execute(
+            _MIGRATE_PAYMENTS_SQL.format(ids=placeholders), tuple(ids) * INSTALMENT_COUNT,
+            name='payments.migrate_rows'
+        )
+        session.execute(_MIGRATE_TOTAL_SQL.format(ids=placeholders), tuple(ids), name='payments.migrate_total')
+        session.commit()
+        migrated += len(ids)
+
+
+def main(argv):
+    if '--migrate' not in argv:
+        print("Usage: python backend/payments.py --migrate")
+        return 2
+
+    from database import db_session
+
+    started = time.time()
+    with db_session() as session:
+        session.execute(CREATE_PAYMENTS_TABLE, name='payments.create')
+        migrated = migrate_instalments(session)
+    print(f"[OK] Migrated payments of {migrated} slip(s) in {time.time() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
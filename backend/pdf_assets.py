@@ -0,0 +1,109 @@
+"""
+Local assets for offline PDF rendering
+
+The print template normally loads Noto Sans Devanagari from fonts.gstatic.com.
+For offline rendering the bundled TTF is embedded into the HTML as a data: URI,
+so Chromium never needs the network. When fontTools is installed the font is
+first subset to the Devanagari + Latin ranges used on purchase slips (all
+OpenType layout features are kept so conjuncts still shape correctly).
+"""
+import logging
+import os
+import sys
+import base64
+import threading
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+FONT_FILENAME = 'NotoSansDevanagari-Regular.ttf'
+
+# Unicode ranges kept when subsetting
+FONT_SUBSET_RANGES = [
+    (0x0020, 0x007E),   # Basic Latin
+    (0x00A0, 0x00FF),   # Latin-1 Supplement
+    (0x0900, 0x097F),   # Devanagari
+    (0x1CD0, 0x1CFF),   # Vedic Extensions
+    (0x2000, 0x206F),   # General Punctuation (incl. ZWJ / ZWNJ)
+    (0x20B9, 0x20B9),   # Indian Rupee sign
+    (0x25CC, 0x25CC),   # Dotted circle (used by the shaper)
+    (0xA8E0, 0xA8FF),   # Devanagari Extended
+]
+
+_font_face = None
+_font_lock = threading.Lock()
+
+
+def get_fonts_dir():
+    """Folder containing the bundled fonts (dev tree or PyInstaller bundle)"""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(sys._MEIPASS, 'static', 'fonts')
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fonts')
+
+
+def _subset_font(font_bytes):
+    """Subset the font with fontTools; returns None if fontTools is unavailable"""
+    try:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        return None
+
+    options = subset.Options()
+    options.layout_features = ['*']
+    options.name_IDs = ['*']
+    options.notdef_outline = True
+    options.hinting = False
+
+    font = TTFont(BytesIO(font_bytes))
+    subsetter = subset.Subsetter(options=options)
+    unicodes = [code for start, end in FONT_SUBSET_RANGES for code in range(start, end + 1)]
+    subsetter.populate(unicodes=unicodes)
+    subsetter.subset(font)
+
+    output = BytesIO()
+    font.save(output)
+    return output.getvalue()
+
+
+def get_embedded_font_face():
+    """
+    Template context for an inlined @font-face (computed once per process)
+
+    Returns:
+        dict: {'font_src': data URI, 'font_format': 'truetype'}, or an empty dict
+              if the bundled font is missing (template then falls back to its default)
+    """
+    global _font_face
+
+    with _font_lock:
+        if _font_face is not None:
+            return _font_face
+
+        font_path = os.path.join(get_fonts_dir(), FONT_FILENAME)
+        try:
+            with open(font_path, 'rb') as f:
+                font_bytes = f.read()
+        except OSError as e:
+            logger.warning(f"Bundled font not found ({font_path}): {e}")
+            _font_face = {}
+            return _font_face
+
+        try:
+            subset_bytes = _subset_font(font_bytes)
+        except Exception as e:
+            logger.warning(f"Font subsetting failed, embedding full font: {e}")
+            subset_bytes = None
+
+        if subset_bytes:
+            logger.info(f"Embedded font subset: {len(font_bytes)} -> {len(subset_bytes)} bytes")
+            font_bytes = subset_bytes
+        else:
+            logger.info(f"Embedded full font ({len(font_bytes)} bytes) - install fonttools to subset")
+
+        encoded = base64.b64encode(font_bytes).decode('ascii')
+        _font_face = {
+            'font_src': f'data:font/ttf;base64,{encoded}',
+            'font_format': 'truetype',
+        }
+        return _font_face
@@ -0,0 +1,226 @@
+"""
+Bulk PDF export for purchase slips
+
+- stream_zip(): ZIP archive streamed to the client as each slip finishes rendering
+- build_merged_pdf(): one combined PDF in bill order (requires the optional pypdf package)
+- Progress for each export is tracked in an in-memory registry so long jobs can be
+  polled from another request via GET /api/slips/pdf-batch/<batch_id>
+"""
+import logging
+import re
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from io import BytesIO
+
+from pdf_service import iter_slip_pdfs, get_pdf_filename
+from streaming import ChunkWriter
+
+logger = logging.getLogger(__name__)
+
+# Finished batches kept around for progress polling
+MAX_TRACKED_BATCHES = 50
+
+BATCH_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class BatchProgress:
+    """Progress counters for one batch export"""
+
+    def __init__(self, batch_id, total, output_format):
+        self.batch_id = batch_id
+        self.total = total
+        self.output_format = output_format
+        self.completed = 0
+        self.failed = 0
+        self.status = 'running'
+        self.errors = []
+        self.started_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, slip, error=None):
+        with self._lock:
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+                self.errors.append({'slip_id': slip.get('id'), 'bill_no': slip.get('bill_no'), 'error': str(error)})
+
+    def finish(self, status):
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            processed = self.completed + self.failed
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            return {
+                'batch_id': self.batch_id,
+                'format': self.output_format,
+                'status': self.status,
+                'total': self.total,
+                'completed': self.completed,
+                'failed': self.failed,
+                'percent': round(processed * 100.0 / self.total, 1) if self.total else 100.0,
+                'elapsed_seconds': round(elapsed, 2),
+                'errors': list(self.errors),
+            }
+
+
+_batches = OrderedDict()
+_batches_lock = threading.Lock()
+
+
+def create_batch(total, output_format, batch_id=None):
+    """
+    Register a new batch export
+
+    Args:
+        total (int): Number of slips in the batch
+        output_format (str): 'zip' or 'pdf'
+        batch_id (str): Optional client-chosen ID so progress can be polled
+            while the export request is still running
+
+    Raises:
+        ValueError: If batch_id is malformed or already in use
+    """
+    if batch_id is None:
+        batch_id = uuid.uuid4().hex
+    elif not BATCH_ID_PATTERN.match(str(batch_id)):
+        raise ValueError('batch_id may only contain letters, digits, "-" and "_" (max 64)')
+
+    progress = BatchProgress(batch_id, total, output_format)
+    with _batches_lock:
+        existing = _batches.get(batch_id)
+        if existing is not None and existing.status == 'running':
+            raise ValueError(f'Batch {batch_id} is already running')
+        _batches[batch_id] = progress
+        _batches.move_to_end(batch_id)
+        while len(_batches) > MAX_TRACKED_BATCHES:
+            oldest_id, oldest = next(iter(_batches.items()))
+            if oldest.status == 'running':
+                break
+            del _batches[oldest_id]
+    return progress
+
+
+def get_batch(batch_id):
+    with _batches_lock:
+        return _batches.get(batch_id)
+
+
+def failed_slip_ids(progress):
+    """Comma-separated IDs of the slips that failed to render ('' if none)"""
+    return ','.join(str(error['slip_id']) for error in list(progress.errors))
+
+
+def _unique_name(name, slip_id, used_names):
+    if name in used_names:
+        stem = name[:-4] if name.lower().endswith('.pdf') else name
+        name = f"{stem}_{slip_id}.pdf"
+    used_names.add(name)
+    return name
+
+
+def stream_zip(slips, progress):
+    """
+    Generate a ZIP archive of slip PDFs chunk by chunk
+
+    PDFs are already compressed, so entries are STORED. Failed slips are listed
+    in errors.txt at the end of the archive.
+
+    Yields:
+        bytes: Next chunk of the ZIP stream
+    """
+    writer = ChunkWriter()
+    used_names = set()
+    status = 'failed'
+
+    try:
+        with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+            for slip, pdf_bytes, error in iter_slip_pdfs(slips):
+                progress.record(slip, error)
+                if error is not None:
+                    logger.error(f"Batch {progress.batch_id}: slip {slip.get('id')} failed: {error}")
+                    continue
+
+                name = _unique_name(get_pdf_filename(slip), slip.get('id'), used_names)
+                archive.writestr(name, pdf_bytes)
+                chunk = writer.take()
+                if chunk:
+                    yield chunk
+
+            if progress.errors:
+                lines = [f"slip_id={e['slip_id']} bill_no={e['bill_no']}: {e['error']}" for e in progress.errors]
+                archive.writestr('errors.txt', '\n'.join(lines) + '\n')
+
+        status = 'done'
+        yield writer.take()
+
+    except GeneratorExit:
+        # Client disconnected - pending renders are cancelled by iter_slip_pdfs
+        status = 'cancelled'
+        raise
+
+    finally:
+        progress.finish(status)
+        logger.info(f"Batch {progress.batch_id} {status}: {progress.completed} rendered, {progress.failed} failed")
+
+
+def is_merge_available():
+    try:
+        import pypdf  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_merged_pdf(slips, progress):
+    """
+    Render all slips and merge them into one PDF in the original (bill) order
+
+    Failed slips are left out of the PDF and listed in progress.errors (see
+    failed_slip_ids()); the route reports them in the X-Failed-Slips header.
+
+    Returns:
+        bytes: Merged PDF
+
+    Raises:
+        ImportError: If pypdf is not installed
+        RuntimeError: If no slip could be rendered
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    rendered = {}
+    status = 'failed'
+    try:
+        for slip, pdf_bytes, error in iter_slip_pdfs(slips):
+            progress.record(slip, error)
+            if error is None:
+                rendered[slip['id']] = pdf_bytes
+            else:
+                logger.error(f"Batch {progress.batch_id}: slip {slip.get('id')} failed: {error}")
+
+        if not rendered:
+            raise RuntimeError(f"None of the {len(slips)} slip(s) could be rendered")
+
+        writer = PdfWriter()
+        for slip in slips:
+            pdf_bytes = rendered.get(slip['id'])
+            if pdf_bytes is None:
+                continue
+            for page in PdfReader(BytesIO(pdf_bytes)).pages:
+                writer.add_page(page)
+
+        output = BytesIO()
+        writer.write(output)
+        status = 'done'
+        return output.getvalue()
+
+    finally:
+        progress.finish(status)
+        logger.info(f"Batch {progress.batch_id} {status}: {progress.completed} rendered, {progress.failed} failed")
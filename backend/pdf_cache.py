@@ -0,0 +1,336 @@
+"""
+Content-addressed cache for rendered purchase slip PDFs
+
+- Key = SHA-256 of the slip row + template version, so an edited slip or template
+  can never be served a stale PDF; the key doubles as the HTTP ETag
+- PDFs live on disk (<slip_id>_<key>.pdf); an in-memory LRU index tracks size and
+  recency and enforces the entry/byte limits
+- The directory is shared by every server worker: an index miss falls back to the
+  disk (and adopts the file), put() picks up files written by other workers before
+  evicting, and invalidate() removes the slip's files whoever wrote them
+- invalidate(slip_id) drops every cached PDF for a slip (called on update/delete)
+
+CONFIGURATION (config.json "pdf_cache" block, all optional):
+- enabled: set false to always render
+- directory: cache folder (default ~/Documents/smart_purchase_slip_pdf_cache)
+- max_entries: maximum number of cached PDFs
+- max_bytes: maximum total size of cached PDFs
+"""
+import logging
+import os
+import glob
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from config_loader import get_config_section
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DEFAULTS = {
+    'enabled': True,
+    'directory': os.path.join(
+        os.path.expanduser("~"),
+        "Documents",
+        "smart_purchase_slip_pdf_cache"
+    ),
+    'max_entries': 1000,
+    'max_bytes': 256 * 1024 * 1024,
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def compute_cache_key(slip, template_version):
+    """
+    Hash a slip row together with the template version
+
+    Args:
+        slip (dict): Raw purchase_slips row
+        template_version (str): Identifier of the template/render settings
+
+    Returns:
+        str: Hex digest used as cache key and ETag
+    """
+    payload = json.dumps(slip, sort_keys=True, default=_json_default)
+    digest = hashlib.sha256()
+    digest.update(template_version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(payload.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CacheEntry:
+    """Index record for one cached PDF file"""
+
+    __slots__ = ('key', 'slip_id', 'size', 'created_at', 'path')
+
+    def __init__(self, key, slip_id, size, created_at, path):
+        self.key = key
+        self.slip_id = slip_id
+        self.size = size
+        self.created_at = created_at
+        self.path = path
+
+
+class PDFCache:
+    """Disk-backed PDF store with an in-memory LRU index"""
+
+    def __init__(self, directory, max_entries=1000, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> CacheEntry, least recently used first
+        self._by_slip = {}              # slip_id -> set of keys
+        self._total_bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'invalidations': 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _path_for(self, slip_id, key):
+        return os.path.join(self.directory, f"{slip_id}_{key}.pdf")
+
+    def _load_index(self):
+        """Rebuild the LRU index from files left by a previous run (oldest first)"""
+        with self._lock:
+            self._sync_locked()
+            self._evict_locked()
+
+        if self._entries:
+            logger.info(f"PDF cache index loaded: {len(self._entries)} file(s), {self._total_bytes} bytes")
+
+    def _sync_locked(self):
+        """
+        Bring the index in line with the directory: add files written by other
+        workers (by age) and forget files they evicted or invalidated
+        """
+        names = set(os.listdir(self.directory))
+        for key in [key for key, entry in self._entries.items() if os.path.basename(entry.path) not in names]:
+            self._remove_entry_locked(key)
+
+        files = []
+        for name in names:
+            parsed = _parse_name(name)
+            if parsed is None or parsed[1] in self._entries:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, parsed[0], parsed[1], stat.st_size, path))
+
+        if not files:
+            return
+
+        # Unknown files count as least recently used
+        known = list(self._entries.values())
+        self._entries.clear()
+        for mtime, slip_id, key, size, path in sorted(files):
+            self._entries[key] = CacheEntry(key, slip_id, size, mtime, path)
+            self._by_slip.setdefault(slip_id, set()).add(key)
+            self._total_bytes += size
+        for entry in known:
+            self._entries[entry.key] = entry
+
+    def _adopt(self, key, slip_id=None):
+        """Index a file another worker stored under key; returns its CacheEntry or None"""
+        if slip_id is not None:
+            paths = [self._path_for(slip_id, key)]
+        else:
+            paths = glob.glob(os.path.join(glob.escape(self.directory), f"*_{key}.pdf"))
+
+        for path in paths:
+            parsed = _parse_name(os.path.basename(path))
+            if parsed is None or parsed[1] != key:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = CacheEntry(key, parsed[0], stat.st_size, stat.st_mtime, path)
+            with self._lock:
+                if key not in self._entries:
+                    self._add_entry(entry)
+                return self._entries[key]
+        return None
+
+    def _add_entry(self, entry):
+        self._entries[entry.key] = entry
+        self._by_slip.setdefault(entry.slip_id, set()).add(entry.key)
+        self._total_bytes += entry.size
+
+    def _remove_entry_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._total_bytes -= entry.size
+        keys = self._by_slip.get(entry.slip_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_slip[entry.slip_id]
+        return entry
+
+    def _evict_locked(self):
+        evicted = []
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            evicted.append(self._remove_entry_locked(key))
+            self._stats['evictions'] += 1
+        for entry in evicted:
+            _remove_file(entry.path)
+
+    def get(self, key, slip_id=None):
+        """
+        Look up a cached PDF, in the index first and then on disk
+
+        Args:
+            key (str): Cache key
+            slip_id (int): Slip the key belongs to, if known (saves a directory glob
+                when the file was stored by another worker)
+
+        Returns:
+            tuple: (pdf_bytes, created_at) or None on miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._adopt(key, slip_id)
+            if entry is None:
+                with self._lock:
+                    self._stats['misses'] += 1
+                return None
+
+        try:
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            # File removed behind our back - forget it and treat as a miss
+            with self._lock:
+                self._remove_entry_locked(key)
+                self._stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self._stats['hits'] += 1
+        return data, entry.created_at
+
+    def put(self, slip_id, key, pdf_bytes):
+        """
+        Store a rendered PDF (atomically via temp file + rename)
+
+        Returns:
+            float: Creation timestamp of the stored entry
+        """
+        path = self._path_for(slip_id, key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+        created_at = time.time()
+
+        with self._lock:
+            try:
+                self._sync_locked()
+            except OSError as e:
+                logger.warning(f"PDF cache: could not scan {self.directory}: {e}")
+            self._remove_entry_locked(key)
+            self._add_entry(CacheEntry(key, slip_id, len(pdf_bytes), created_at, path))
+            self._stats['stores'] += 1
+            self._evict_locked()
+        return created_at
+
+    def invalidate(self, slip_id):
+        """
+        Remove all cached PDFs for a slip, including files stored by other
+        workers; returns number of files dropped
+        """
+        pattern = os.path.join(glob.escape(self.directory), f"{slip_id}_*.pdf")
+        with self._lock:
+            keys = list(self._by_slip.get(slip_id, ()))
+            paths = {self._remove_entry_locked(key).path for key in keys}
+            self._stats['invalidations'] += 1
+        paths.update(glob.glob(pattern))
+        for path in paths:
+            _remove_file(path)
+        return len(paths)
+
+    def clear(self):
+        with self._lock:
+            removed = [self._remove_entry_locked(key) for key in list(self._entries)]
+        for entry in removed:
+            _remove_file(entry.path)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            })
+        return stats
+
+
+def _parse_name(name):
+    """Split '<slip_id>_<key>.pdf' into (slip_id, key), or None for other files"""
+    if not name.endswith('.pdf'):
+        return None
+    slip_part, _, key = name[:-4].partition('_')
+    if not slip_part.isdigit() or not key:
+        return None
+    return int(slip_part), key
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Global cache instance (created lazily)
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache():
+    """
+    Return the process-wide PDF cache, or None when caching is disabled
+    or the cache directory cannot be created
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            settings = get_config_section('pdf_cache', PDF_CACHE_DEFAULTS)
+            if not settings['enabled']:
+                return None
+            try:
+                _cache = PDFCache(
+                    settings['directory'],
+                    max_entries=settings['max_entries'],
+                    max_bytes=settings['max_bytes'],
+                )
+            except OSError as e:
+                logger.warning(f"PDF cache disabled - cannot use {settings['directory']}: {e}")
+                return None
+        return _cache
@@ -0,0 +1,400 @@
+"""
+Persistent Playwright/Chromium engine for PDF rendering
+
+ARCHITECTURE:
+- One dedicated background thread owns an asyncio event loop and the Playwright driver
+- A pool of pre-launched Chromium browsers, each with one reusable page ("slot")
+- Flask handlers submit HTML via submit()/render() and receive the PDF through a
+  concurrent.futures.Future - no per-request browser launch or event loop creation
+- Slots are recycled after N renders, after a render failure, or when the periodic
+  health check finds the browser disconnected
+- Offline mode (default): every network request from the page is aborted via
+  Playwright request routing and rendering waits on document.fonts.ready instead
+  of networkidle, so an offline LAN never stalls on font downloads
+
+Every process has its own pool. Under gunicorn (serve.py sets
+SLIP_SERVER_WORKERS) pool_size is the total for the server and is split across
+the workers, at least one browser each, so more workers do not multiply the
+Chromium processes (and their memory).
+
+CONFIGURATION (config.json "pdf" block, all optional):
+- pool_size: number of browser slots rendering in parallel (per server; divided
+  among gunicorn workers)
+- recycle_after: renders per browser before it is relaunched
+- health_check_interval: seconds between idle-slot health checks
+- render_timeout: seconds a single render may take
+- launch_timeout: seconds to wait for the pool to come up
+- offline: block all outbound requests (HTML must embed its fonts/images)
+"""
+import logging
+import asyncio
+import atexit
+import concurrent.futures
+import math
+import os
+import threading
+import time
+
+from config_loader import get_config_section
+from metrics import PhaseTimer
+
+logger = logging.getLogger(__name__)
+
+PDF_ENGINE_DEFAULTS = {
+    'pool_size': 2,
+    'recycle_after': 200,
+    'health_check_interval': 60,
+    'render_timeout': 30,
+    'launch_timeout': 60,
+    'offline': True,
+}
+
+# Number of gunicorn worker processes sharing the machine (set by serve.py)
+SERVER_WORKERS_ENV = 'SLIP_SERVER_WORKERS'
+
+# JS run after load in offline mode - resolves once every @font-face is loaded
+FONTS_READY_SCRIPT = '() => document.fonts.ready.then(() => document.fonts.status)'
+
+CHROMIUM_LAUNCH_ARGS = ['--disable-dev-shm-usage', '--no-sandbox']
+
+PDF_OPTIONS = {
+    'format': 'A4',
+    'print_background': True,
+    'margin': {
+        'top': '10mm',
+        'right': '10mm',
+        'bottom': '10mm',
+        'left': '10mm'
+    },
+    'prefer_css_page_size': True
+}
+
+
+class _BrowserSlot:
+    """One pre-launched browser with a reusable page"""
+
+    def __init__(self, index):
+        self.index = index
+        self.browser = None
+        self.page = None
+        self.render_count = 0
+        self.launched_at = None
+
+    def is_healthy(self):
+        return (
+            self.browser is not None
+            and self.browser.is_connected()
+            and self.page is not None
+            and not self.page.is_closed()
+        )
+
+
+class PDFEngine:
+    """
+    Long-lived HTML-to-PDF renderer backed by a pool of warm Chromium browsers
+    All Playwright objects live on the engine's own event loop thread.
+    """
+
+    def __init__(self, pool_size=2, recycle_after=200, health_check_interval=60,
+                 render_timeout=30, launch_timeout=60, offline=True):
+        self.pool_size = max(1, int(pool_size))
+        self.recycle_after = max(1, int(recycle_after))
+        self.health_check_interval = max(1, float(health_check_interval))
+        self.render_timeout = float(render_timeout)
+        self.launch_timeout = float(launch_timeout)
+        self.offline = bool(offline)
+
+        self._loop = None
+        self._thread = None
+        self._playwright = None
+        self._slots = []
+        self._idle_slots = None
+        self._health_task = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._start_error = None
+        self._stopping = False
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'renders': 0,
+            'failures': 0,
+            'recycles': 0,
+            'health_checks': 0,
+            'blocked_requests': 0,
+            'render_seconds_total': 0.0,
+        }
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self, wait=True):
+        """
+        Start the engine thread and launch the browser pool (idempotent)
+
+        Args:
+            wait (bool): Block until the pool is ready or launch_timeout expires
+
+        Raises:
+            RuntimeError: If the pool failed to launch (only when wait=True)
+        """
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                self._start_error = None
+                self._stopping = False
+                self._thread = threading.Thread(
+                    target=self._run_loop, name='pdf-engine', daemon=True
+                )
+                self._thread.start()
+
+        if wait:
+            self._wait_until_ready()
+
+    def _wait_until_ready(self):
+        if not self._ready.wait(self.launch_timeout):
+            raise RuntimeError(f'PDF engine did not start within {self.launch_timeout}s')
+        if self._start_error is not None:
+            raise RuntimeError(f'PDF engine failed to start: {self._start_error}')
+
+    def stop(self, timeout=10):
+        """Close all browsers and stop the engine thread"""
+        with self._start_lock:
+            if self._loop is None or self._loop.is_closed() or not self._loop.is_running():
+                return
+            self._stopping = True
+            future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            try:
+                future.result(timeout)
+            except Exception as e:
+                logger.warning(f"PDF engine shutdown error: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+            logger.info("PDF engine stopped")
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._startup())
+        except Exception as e:
+            self._start_error = e
+            logger.error(f"PDF engine failed to start: {e}")
+            self._ready.set()
+            self._loop.close()
+            return
+
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _startup(self):
+        from playwright.async_api import async_playwright
+
+        started = time.perf_counter()
+        self._playwright = await async_playwright().start()
+        self._idle_slots = asyncio.Queue()
+        self._slots = []
+
+        try:
+            for index in range(self.pool_size):
+                slot = _BrowserSlot(index)
+                self._slots.append(slot)
+                await self._launch_slot(slot)
+                self._idle_slots.put_nowait(slot)
+        except Exception:
+            await self._shutdown()
+            raise
+
+        self._health_task = asyncio.ensure_future(self._health_check_loop())
+        logger.info(f"PDF engine ready: {self.pool_size} warm browser(s) in {time.perf_counter() - started:.2f}s")
+
+    async def _shutdown(self):
+        if self._health_task:
+            self._health_task.cancel()
+        for slot in self._slots:
+            await self._close_slot(slot)
+        self._slots = []
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # ==================== SLOT MANAGEMENT ====================
+
+    async def _launch_slot(self, slot):
+        slot.browser = await self._playwright.chromium.launch(
+            headless=True,
+            args=CHROMIUM_LAUNCH_ARGS
+        )
+        slot.page = await slot.browser.new_page()
+        if self.offline:
+            await slot.page.route('**/*', self._block_request)
+        slot.render_count = 0
+        slot.launched_at = time.time()
+
+    async def _block_request(self, route):
+        """Abort any network request made by the page (data: URIs never reach here)"""
+        with self._stats_lock:
+            self._stats['blocked_requests'] += 1
+        await route.abort()
+
+    async def _close_slot(self, slot):
+        try:
+            if slot.browser is not None:
+                await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser slot {slot.index}: {e}")
+        finally:
+            slot.browser = None
+            slot.page = None
+
+    async def _recycle_slot(self, slot, reason):
+        logger.info(f"Recycling PDF browser slot {slot.index} ({reason})")
+        await self._close_slot(slot)
+        await self._launch_slot(slot)
+        with self._stats_lock:
+            self._stats['recycles'] += 1
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            # Only idle slots are inspected; busy ones are checked when released
+            for _ in range(self._idle_slots.qsize()):
+                slot = self._idle_slots.get_nowait()
+                try:
+                    if not slot.is_healthy():
+                        await self._recycle_slot(slot, 'health check failed')
+                except Exception as e:
+                    logger.error(f"PDF slot {slot.index} relaunch failed: {e}")
+                finally:
+                    self._idle_slots.put_nowait(slot)
+            with self._stats_lock:
+                self._stats['health_checks'] += 1
+
+    # ==================== RENDERING ====================
+
+    async def _render(self, html_content, pdf_options=None):
+        slot = await self._idle_slots.get()
+        started = time.perf_counter()
+        try:
+            if not slot.is_healthy():
+                await self._recycle_slot(slot, 'unhealthy at checkout')
+
+            if self.offline:
+                await slot.page.set_content(html_content, wait_until='load')
+                await slot.page.evaluate(FONTS_READY_SCRIPT)
+            else:
+                await slot.page.set_content(html_content, wait_until='networkidle')
+            pdf_bytes = await slot.page.pdf(**(pdf_options or PDF_OPTIONS))
+            slot.render_count += 1
+
+            with self._stats_lock:
+                self._stats['renders'] += 1
+                self._stats['render_seconds_total'] += time.perf_counter() - started
+            return pdf_bytes
+
+        except (Exception, asyncio.CancelledError) as e:
+            with self._stats_lock:
+                self._stats['failures'] += 1
+            # A failed or timed-out (cancelled) render may leave the page mid
+            # set_content()/pdf() - start fresh before the slot is reused
+            reason = 'render cancelled' if isinstance(e, asyncio.CancelledError) else 'render failed'
+            try:
+                await self._recycle_slot(slot, reason)
+            except Exception as relaunch_error:
+                logger.error(f"PDF slot {slot.index} relaunch failed: {relaunch_error}")
+            raise
+
+        finally:
+            if slot.render_count >= self.recycle_after and not self._stopping:
+                try:
+                    await self._recycle_slot(slot, f'{slot.render_count} renders')
+                except Exception as e:
+                    logger.error(f"PDF slot {slot.index} relaunch failed: {e}")
+            self._idle_slots.put_nowait(slot)
+
+    def submit(self, html_content, pdf_options=None):
+        """
+        Queue an HTML document for rendering
+
+        Args:
+            html_content (str): Fully rendered HTML
+            pdf_options (dict): Overrides for page.pdf() (defaults to PDF_OPTIONS)
+
+        Returns:
+            concurrent.futures.Future: Resolves to the PDF bytes
+        """
+        self.start(wait=True)
+        return asyncio.run_coroutine_threadsafe(
+            self._render(html_content, pdf_options), self._loop
+        )
+
+    def render(self, html_content, timeout=None, pdf_options=None):
+        """Render HTML to PDF bytes, blocking the calling thread until done"""
+        with PhaseTimer('render'):
+            future = self.submit(html_content, pdf_options)
+            try:
+                return future.result(timeout or self.render_timeout)
+            except concurrent.futures.TimeoutError:
+                future.cancel()
+                raise
+
+    def stats(self):
+        """Snapshot of pool state and counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats.update({
+            'running': self._ready.is_set() and self._start_error is None
+                       and self._thread is not None and self._thread.is_alive(),
+            'pool_size': self.pool_size,
+            'offline': self.offline,
+            'idle_slots': self._idle_slots.qsize() if self._idle_slots else 0,
+            'slot_render_counts': [slot.render_count for slot in self._slots],
+        })
+        return stats
+
+
+# Global engine instance (created lazily)
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def worker_pool_size(pool_size):
+    """This process's share of the server-wide browser pool"""
+    try:
+        workers = max(1, int(os.environ.get(SERVER_WORKERS_ENV, '1')))
+    except ValueError:
+        workers = 1
+    return max(1, math.ceil(int(pool_size) / workers))
+
+
+def get_pdf_engine():
+    """Return the process-wide PDF engine configured from config.json"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            settings = get_config_section('pdf', PDF_ENGINE_DEFAULTS)
+            _engine = PDFEngine(
+                pool_size=worker_pool_size(settings['pool_size']),
+                recycle_after=settings['recycle_after'],
+                health_check_interval=settings['health_check_interval'],
+                render_timeout=settings['render_timeout'],
+                launch_timeout=settings['launch_timeout'],
+                offline=settings['offline'],
+            )
+            atexit.register(_engine.stop)
+        return _engine
+
+
+def start_pdf_engine():
+    """Pre-launch the browser pool in the background so the first slip is fast"""
+    get_pdf_engine().start(wait=False)
+
+
+def stop_pdf_engine():
+    """Close the browser pool if it was started (also runs at exit)"""
+    engine = _engine
+    if engine is not None:
+        engine.stop()
@@ -0,0 +1,405 @@
+"""
+Background PDF job queue
+
+- Jobs are persisted in a local SQLite file, so queued work survives a restart
+- A claimed job holds a lease for lease_seconds; a running job whose lease has
+  run out (its process died) is claimed again by any worker. Processes sharing
+  the file (gunicorn workers) never take over jobs another live one is running
+- A fixed number of worker threads bounds concurrency; renders go through the
+  warm browser pool (pdf_engine) and land in the PDF cache (pdf_cache), which is
+  where downloads are served from
+- Failed renders are retried with exponential backoff up to max_attempts
+- add_slip / update_slip enqueue a pre-render so the PDF is ready before anyone asks
+- Any process can queue jobs; the worker threads run only where
+  start_pdf_job_queue() was called (one gunicorn worker, see app.py), which
+  picks up jobs queued by other processes within POLL_INTERVAL
+
+CONFIGURATION (config.json "pdf_jobs" block, all optional):
+- enabled: set false to disable the queue and pre-rendering
+- database: SQLite file path (default ~/Documents/smart_purchase_slip_pdf_jobs.db)
+- workers: number of concurrent jobs
+- max_attempts: tries per job before it is marked failed
+- retry_backoff: seconds before the first retry (doubles every attempt)
+- keep_finished_hours: finished jobs older than this are purged
+- lease_seconds: how long a running job is left to its worker before it is
+  considered interrupted (must exceed the slowest render)
+- prerender_on_save: enqueue a render whenever a slip is added or updated
+"""
+import logging
+import os
+import time
+import uuid
+import sqlite3
+import threading
+
+from config_loader import get_config_section
+from pdf_cache import get_pdf_cache
+from pdf_service import render_slip_pdf
+from repository import fetch_slip
+
+logger = logging.getLogger(__name__)
+
+PDF_JOBS_DEFAULTS = {
+    'enabled': True,
+    'database': os.path.join(
+        os.path.expanduser("~"),
+        "Documents",
+        "smart_purchase_slip_pdf_jobs.db"
+    ),
+    'workers': 2,
+    'max_attempts': 3,
+    'retry_backoff': 5,
+    'keep_finished_hours': 24,
+    'lease_seconds': 300,
+    'prerender_on_save': True,
+}
+
+# How often idle workers re-check for due retries / purge old jobs (seconds)
+POLL_INTERVAL = 2.0
+PURGE_INTERVAL = 3600.0
+
+JOB_COLUMNS = (
+    'id', 'slip_id', 'status', 'source', 'attempts', 'last_error', 'cache_key',
+    'created_at', 'updated_at', 'run_after', 'finished_at'
+)
+
+
+class SlipNotFound(Exception):
+    """Slip was deleted before its job ran - not worth retrying"""
+
+
+class PDFJobQueue:
+    """SQLite-backed job queue with a pool of worker threads"""
+
+    def __init__(self, database, workers=2, max_attempts=3, retry_backoff=5, keep_finished_hours=24,
+                 lease_seconds=300):
+        self.database = database
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_backoff = max(0.0, float(retry_backoff))
+        self.keep_finished_seconds = max(0.0, float(keep_finished_hours)) * 3600
+        self.lease_seconds = max(1.0, float(lease_seconds))
+
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(os.path.abspath(self.database))
+        os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    # ==================== STORAGE ====================
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS pdf_jobs (
+                    id TEXT PRIMARY KEY,
+                    slip_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    cache_key TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    run_after REAL NOT NULL,
+                    finished_at REAL,
+                    lease_until REAL
+                )
+            ''')
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(pdf_jobs)')}
+            if 'lease_until' not in columns:
+                # Files created before leases: their running jobs count as expired
+                conn.execute('ALTER TABLE pdf_jobs ADD COLUMN lease_until REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pdf_jobs_status ON pdf_jobs (status, run_after)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_pdf_jobs_slip ON pdf_jobs (slip_id, status)')
+        finally:
+            conn.close()
+
+    def _row_to_dict(self, row):
+        return {column: row[column] for column in JOB_COLUMNS} if row else None
+
+    def get_job(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM pdf_jobs WHERE id = ?', (job_id,)).fetchone()
+            return self._row_to_dict(row)
+        finally:
+            conn.close()
+
+    def enqueue(self, slip_id, source='manual'):
+        """
+        Queue a render for a slip
+        An already-queued job for the same slip is reused instead of adding another
+
+        Returns:
+            dict: The queued job
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                "SELECT * FROM pdf_jobs WHERE slip_id = ? AND status = 'queued' ORDER BY created_at LIMIT 1",
+                (slip_id,)
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    '''INSERT INTO pdf_jobs (id, slip_id, status, source, attempts, created_at, updated_at, run_after)
+                       VALUES (?, ?, 'queued', ?, 0, ?, ?, ?)''',
+                    (job_id, slip_id, source, now, now, now)
+                )
+                row = conn.execute('SELECT * FROM pdf_jobs WHERE id = ?', (job_id,)).fetchone()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return self._row_to_dict(row)
+
+    def _claim_next(self):
+        """
+        Atomically take the oldest due job (queued, or running with an expired
+        lease) and lease it to this worker for lease_seconds
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                '''SELECT * FROM pdf_jobs
+                   WHERE (status = 'queued' AND run_after <= ?)
+                      OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))
+                   ORDER BY created_at LIMIT 1''',
+                (now, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    '''UPDATE pdf_jobs SET status = 'running', attempts = attempts + 1, updated_at = ?,
+                          lease_until = ? WHERE id = ?''',
+                    (now, now + self.lease_seconds, row['id'])
+                )
+            conn.execute('COMMIT')
+            if row is not None and row['status'] == 'running':
+                logger.warning(f"PDF job {row['id']} was interrupted (lease expired) - running it again")
+            return self._row_to_dict(row)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job, status, cache_key=None, error=None, run_after=None):
+        # Only the attempt that holds the job may finish it (not one whose lease
+        # expired and was taken over by another worker)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                '''UPDATE pdf_jobs
+                   SET status = ?, cache_key = COALESCE(?, cache_key), last_error = ?,
+                       updated_at = ?, run_after = COALESCE(?, run_after), lease_until = NULL,
+                       finished_at = CASE WHEN ? IN ('done', 'failed') THEN ? ELSE NULL END
+                   WHERE id = ? AND status = 'running' AND attempts = ?''',
+                (status, cache_key, error, now, run_after, status, now, job['id'], job['attempts'] + 1)
+            )
+        finally:
+            conn.close()
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.keep_finished_seconds
+        conn = self._connect()
+        try:
+            removed = conn.execute(
+                "DELETE FROM pdf_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (cutoff,)
+            ).rowcount
+            if removed:
+                logger.info(f"Purged {removed} finished PDF job(s)")
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) AS count FROM pdf_jobs GROUP BY status').fetchall()
+            counts = {row['status']: row['count'] for row in rows}
+        finally:
+            conn.close()
+        return {'workers': self.workers, 'running': self._running, 'jobs': counts}
+
+    # ==================== WORKERS ====================
+
+    def start(self):
+        """Start worker threads (idempotent)"""
+        with self._wakeup:
+            if self._running:
+                return
+            self._running = True
+            self._threads = []
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'pdf-job-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"PDF job queue started ({self.workers} worker(s), {self.database})")
+
+    def stop(self, timeout=10):
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker_loop(self):
+        while self._running:
+            try:
+                if time.time() - self._last_purge > PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    self._purge_finished()
+
+                job = self._claim_next()
+                if job is None:
+                    with self._wakeup:
+                        if self._running:
+                            self._wakeup.wait(POLL_INTERVAL)
+                    continue
+
+                self._run_job(job)
+
+            except Exception as e:
+                logger.error(f"PDF job worker error: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def _run_job(self, job):
+        attempt = job['attempts'] + 1
+        if attempt > self.max_attempts:
+            # Every attempt so far was interrupted (e.g. the render kills the process)
+            self._finish(job, 'failed', error=f'Interrupted {job["attempts"]} time(s)')
+            logger.error(f"PDF job {job['id']} failed: interrupted {job['attempts']} time(s)")
+            return
+        try:
+            slip = fetch_slip(job['slip_id'])
+            if slip is None:
+                raise SlipNotFound(f"Slip with ID {job['slip_id']} not found")
+
+            _, cache_key, _ = render_slip_pdf(slip)
+            self._finish(job, 'done', cache_key=cache_key)
+            logger.debug(f"PDF job {job['id']} done (slip {job['slip_id']}, attempt {attempt})")
+
+        except SlipNotFound as e:
+            self._finish(job, 'failed', error=str(e))
+            logger.warning(f"PDF job {job['id']} failed: {e}")
+
+        except Exception as e:
+            if attempt < self.max_attempts:
+                delay = self.retry_backoff * (2 ** (attempt - 1))
+                self._finish(job, 'queued', error=str(e), run_after=time.time() + delay)
+                logger.warning(f"PDF job {job['id']} attempt {attempt} failed, retrying in {delay:.0f}s: {e}")
+            else:
+                self._finish(job, 'failed', error=str(e))
+                logger.error(f"PDF job {job['id']} failed after {attempt} attempt(s): {e}")
+
+
+def job_to_response(job):
+    """Public JSON shape for a job"""
+    response = {
+        'job_id': job['id'],
+        'slip_id': job['slip_id'],
+        'status': job['status'],
+        'source': job['source'],
+        'attempts': job['attempts'],
+        'error': job['last_error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+        'status_url': f"/api/pdf-jobs/{job['id']}",
+    }
+    if job['status'] == 'done':
+        response['download_url'] = f"/api/pdf-jobs/{job['id']}/download"
+    return response
+
+
+def get_job_pdf(job):
+    """
+    Load the finished artifact for a job from the PDF cache
+
+    Returns:
+        tuple: (pdf_bytes, rendered_at) or None if the artifact was evicted
+    """
+    cache = get_pdf_cache()
+    if cache is None or not job.get('cache_key'):
+        return None
+    return cache.get(job['cache_key'], job.get('slip_id'))
+
+
+# Global queue instance (created lazily)
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_pdf_job_queue():
+    """
+    Return the process-wide job queue, or None when the queue is disabled or the
+    PDF cache it stores artifacts in is disabled
+
+    Jobs can be queued and looked up through it; they are run by the process
+    that called start_pdf_job_queue()
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            settings = get_config_section('pdf_jobs', PDF_JOBS_DEFAULTS)
+            if not settings['enabled'] or get_pdf_cache() is None:
+                return None
+            try:
+                _queue = PDFJobQueue(
+                    settings['database'],
+                    workers=settings['workers'],
+                    max_attempts=settings['max_attempts'],
+                    retry_backoff=settings['retry_backoff'],
+                    keep_finished_hours=settings['keep_finished_hours'],
+                    lease_seconds=settings['lease_seconds'],
+                )
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"PDF job queue disabled - cannot use {settings['database']}: {e}")
+                return None
+        return _queue
+
+
+def start_pdf_job_queue():
+    """Start this process's workers, which also resume jobs persisted before a restart"""
+    queue = get_pdf_job_queue()
+    if queue is not None:
+        queue.start()
+
+
+def stop_pdf_job_queue(timeout=10):
+    """Let running jobs finish (up to `timeout` seconds per worker) and stop the workers"""
+    queue = _queue
+    if queue is not None:
+        queue.stop(timeout)
+
+
+def enqueue_prerender(slip_id):
+    """Queue a pre-render after a slip is saved (no-op if disabled)"""
+    settings = get_config_section('pdf_jobs', PDF_JOBS_DEFAULTS)
+    if not settings['prerender_on_save']:
+        return None
+    queue = get_pdf_job_queue()
+    if queue is None:
+        return None
+    return queue.enqueue(slip_id, source='save')
@@ -5,33 +5,52 @@ Zero dependencies on xhtml2pdf or ReportLab - uses browser engine for rendering
 
 ARCHITECTURE:
 - Playwright (Chromium) handles PDF generation via headless browser
-- Async Playwright API wrapped in sync functions for Flask compatibility
-- No temporary files - PDF generated in-memory and streamed to browser
-- Fonts loaded via CSS @font-face in HTML template
+- Browsers stay warm in a shared pool owned by pdf_engine (background event loop thread)
+- Flask routes submit rendered HTML to the pool and block on the returned future
+- Rendered PDFs are kept in a content-addressed disk cache (pdf_cache) keyed by
+  slip row + template version; unchanged slips are served without re-rendering
+- Fonts loaded via CSS @font-face in HTML template; in offline mode (default) the
+  bundled Noto Sans Devanagari is embedded as a data: URI (pdf_assets)
 - Chromium's HarfBuzz engine handles complex text shaping (Devanagari)
 
 REQUIREMENTS:
 - pip install playwright
 - playwright install chromium
 """
+import logging
 import os
-import asyncio
+import hashlib
+import concurrent.futures
+import threading
+import time
 from io import BytesIO
 from datetime import datetime
 from pytz import timezone
-from jinja2 import Template
 
-from backend.database import get_db_connection
+from database import db_session
+from repository import SlipRepository, fetch_slip
+from calculations import calculate_payment_totals
+from pdf_engine import get_pdf_engine, PDF_OPTIONS
+from pdf_cache import get_pdf_cache, compute_cache_key
+from pdf_assets import get_embedded_font_face
+from templating import PRINT_TEMPLATE, get_templates_dir, render_template_file, is_dev_mode
 
+logger = logging.getLogger(__name__)
 
-def safe_float(value, default=0.0):
-    """Safely convert value to float, return default if conversion fails"""
-    try:
-        if value is None or value == '':
-            return default
-        return float(value)
-    except (ValueError, TypeError):
-        return default
+TEMPLATE_PATH = os.path.join(get_templates_dir(), PRINT_TEMPLATE)
+
+DATETIME_FIELDS = [
+    'date', 'payment_date', 'payment_due_date',
+    'instalment_1_date', 'instalment_2_date', 'instalment_3_date',
+    'instalment_4_date', 'instalment_5_date'
+]
+
+# Bump when rendering logic changes in a way the template hash cannot see
+PDF_RENDER_VERSION = '2'
+
+_template_version = None
+_template_mtime = None
+_template_version_lock = threading.Lock()
 
 
 def format_ist_datetime(dt):
@@ -63,85 +82,215 @@ def format_ist_datetime(dt):
     return str(dt)
 
 
-def calculate_payment_totals(data):
+def get_pdf_filename(slip_data):
     """
-    Calculate Total Paid Amount and Balance Amount
-    Total Paid = Sum of all 5 instalment amounts
-    Balance = Payable Amount - Total Paid
+    Generate standardized PDF filename from slip data
+    Format: Purchase_Slip_PartyName_BillNo.pdf
+    """
+    party_name = slip_data.get('party_name', 'Unknown')
+    bill_no = slip_data.get('bill_no', 'XXXX')
 
-    Args:
-        data (dict): Slip data dictionary
+    party_name_safe = "".join(c for c in party_name if c.isalnum() or c in (' ', '_', '-')).strip()
+    party_name_safe = party_name_safe.replace(' ', '_')
+
+    return f"Purchase_Slip_{party_name_safe}_{bill_no}.pdf"
+
+
+def fetch_slips(slip_ids=None, date_from=None, date_to=None, party_name=None, limit=None):
+    """
+    Fetch many slip rows with a single query (for batch export)
+    See SlipRepository.find_many for the filters
 
     Returns:
-        tuple: (total_paid, balance_amount)
+        list: Slip rows ordered by bill number
     """
-    payable_amount = safe_float(data.get('payable_amount', 0), 0)
+    with db_session() as session:
+        return SlipRepository(session).find_many(slip_ids, date_from, date_to, party_name, limit)
 
-    total_paid = 0.0
-    for i in range(1, 6):
-        instalment_amount = safe_float(data.get(f'instalment_{i}_amount', 0), 0)
-        total_paid += instalment_amount
 
-    total_paid = round(total_paid, 2)
-    balance_amount = round(payable_amount - total_paid, 2)
+def get_template_version():
+    """
+    Identify the current print template + render settings
+    Re-hashes the template file only when its mtime changes
+    """
+    global _template_version, _template_mtime
 
-    return total_paid, balance_amount
+    with _template_version_lock:
+        # Outside dev the environment never reloads the template, so neither do we
+        if _template_version is not None and not is_dev_mode():
+            return _template_version
 
+        mtime = os.path.getmtime(TEMPLATE_PATH)
+        if _template_version is None or mtime != _template_mtime:
+            digest = hashlib.sha256()
+            with open(TEMPLATE_PATH, 'rb') as f:
+                digest.update(f.read())
+            digest.update(repr(sorted(PDF_OPTIONS.items())).encode('utf-8'))
+            mode = 'offline' if get_pdf_engine().offline else 'online'
+            _template_version = f"{PDF_RENDER_VERSION}:{mode}:{digest.hexdigest()[:16]}"
+            _template_mtime = mtime
+        return _template_version
 
-def get_pdf_filename(slip_data):
+
+def get_slip_pdf_key(slip):
+    """Content hash for a raw slip row - used as cache key and HTTP ETag"""
+    return compute_cache_key(slip, get_template_version())
+
+
+def render_slip_html(slip, **context):
     """
-    Generate standardized PDF filename from slip data
-    Format: Purchase_Slip_PartyName_BillNo.pdf
+    Add payment totals / formatted dates to a slip row and render the print template
+    Shared by the PDF pipeline and the /print view so both produce the same HTML
+
+    Args:
+        slip (dict): Raw purchase_slips row (not modified)
+        **context: Extra template variables (overrides the embedded offline font)
+
+    Returns:
+        str: Rendered HTML
     """
-    party_name = slip_data.get('party_name', 'Unknown')
-    bill_no = slip_data.get('bill_no', 'XXXX')
+    slip = dict(slip)
+    total_paid, balance_amount = calculate_payment_totals(slip)
+    slip['total_paid_amount'] = total_paid
+    slip['balance_amount'] = balance_amount
 
-    party_name_safe = "".join(c for c in party_name if c.isalnum() or c in (' ', '_', '-')).strip()
-    party_name_safe = party_name_safe.replace(' ', '_')
+    for field in DATETIME_FIELDS:
+        if slip.get(field):
+            slip[f'{field}_formatted'] = format_ist_datetime(slip[field])
+    if not slip.get('date_formatted'):
+        slip['date_formatted'] = '-'
 
-    return f"Purchase_Slip_{party_name_safe}_{bill_no}.pdf"
+    # Offline renders embed the bundled font so Chromium makes no network requests
+    template_context = {}
+    if 'font_src' not in context and get_pdf_engine().offline:
+        template_context.update(get_embedded_font_face())
+    template_context.update(context)
 
+    return render_template_file(PRINT_TEMPLATE, slip=slip, **template_context)
 
-async def _generate_pdf_async(html_content):
+
+def render_slip_pdf(slip, force_regenerate=False):
     """
-    Internal async function to generate PDF using Playwright
-    Launches Chromium browser, renders HTML, generates PDF in-memory
+    Get the PDF for an already-fetched slip row, from cache when possible
 
     Args:
-        html_content (str): Rendered HTML content
+        slip (dict): Raw purchase_slips row
+        force_regenerate (bool): Skip the cache lookup and re-render
 
     Returns:
-        bytes: PDF content as bytes
+        tuple: (pdf_bytes, cache_key, rendered_at timestamp)
     """
-    from playwright.async_api import async_playwright
+    cache_key = get_slip_pdf_key(slip)
+    cache = get_pdf_cache()
+
+    if cache is not None and not force_regenerate:
+        cached = cache.get(cache_key, slip.get('id'))
+        if cached is not None:
+            pdf_bytes, rendered_at = cached
+            logger.debug(f"PDF cache hit for slip {slip.get('id')} ({len(pdf_bytes)} bytes)")
+            return pdf_bytes, cache_key, rendered_at
+
+    html_content = render_slip_html(slip)
+    logger.debug("HTML template rendered successfully")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--disable-dev-shm-usage', '--no-sandbox']
-        )
+    pdf_bytes = get_pdf_engine().render(html_content)
+    logger.debug(f"PDF generated successfully ({len(pdf_bytes)} bytes)")
 
+    rendered_at = None
+    if cache is not None:
         try:
-            page = await browser.new_page()
-
-            await page.set_content(html_content, wait_until='networkidle')
-
-            pdf_bytes = await page.pdf(
-                format='A4',
-                print_background=True,
-                margin={
-                    'top': '10mm',
-                    'right': '10mm',
-                    'bottom': '10mm',
-                    'left': '10mm'
-                },
-                prefer_css_page_size=True
+            rendered_at = cache.put(slip['id'], cache_key, pdf_bytes)
+        except OSError as e:
+            logger.warning(f"Could not store PDF in cache: {e}")
+    if rendered_at is None:
+        rendered_at = time.time()
+
+    return pdf_bytes, cache_key, rendered_at
+
+
+def _store_rendered(cache, slip, cache_key, pdf_bytes):
+    if cache is None:
+        return
+    try:
+        cache.put(slip['id'], cache_key, pdf_bytes)
+    except OSError as e:
+        logger.warning(f"Could not store PDF in cache: {e}")
+
+
+def iter_slip_pdfs(slips, max_in_flight=None):
+    """
+    Render many slips concurrently across the browser pool
+
+    Cached PDFs are yielded immediately; the rest are submitted to pdf_engine
+    with at most max_in_flight renders outstanding, and yielded in completion
+    order. Closing the generator cancels renders that have not started.
+
+    Args:
+        slips (list): Raw purchase_slips rows
+        max_in_flight (int): Outstanding render limit (default: 2 x pool size)
+
+    Yields:
+        tuple: (slip, pdf_bytes, error) - exactly one of pdf_bytes / error is set
+    """
+    engine = get_pdf_engine()
+    cache = get_pdf_cache()
+    template_version = get_template_version()
+    max_in_flight = max(1, int(max_in_flight or engine.pool_size * 2))
+    pending = {}
+
+    def drain(wait_for_all):
+        while pending:
+            done, _ = concurrent.futures.wait(
+                list(pending),
+                timeout=engine.render_timeout,
+                return_when=concurrent.futures.FIRST_COMPLETED
             )
+            if not done:
+                # Nothing finished within a full render timeout - give up on the rest
+                for future, (slip, _) in list(pending.items()):
+                    future.cancel()
+                    del pending[future]
+                    yield slip, None, TimeoutError('PDF render timed out')
+                return
+
+            for future in done:
+                slip, cache_key = pending.pop(future)
+                try:
+                    pdf_bytes = future.result()
+                except Exception as e:
+                    yield slip, None, e
+                    continue
+                _store_rendered(cache, slip, cache_key, pdf_bytes)
+                yield slip, pdf_bytes, None
+
+            if not wait_for_all:
+                return
+
+    try:
+        for slip in slips:
+            cache_key = compute_cache_key(slip, template_version)
 
-            return pdf_bytes
+            if cache is not None:
+                cached = cache.get(cache_key, slip.get('id'))
+                if cached is not None:
+                    yield slip, cached[0], None
+                    continue
 
-        finally:
-            await browser.close()
+            while len(pending) >= max_in_flight:
+                yield from drain(wait_for_all=False)
+
+            try:
+                future = engine.submit(render_slip_html(slip))
+            except Exception as e:
+                yield slip, None, e
+                continue
+            pending[future] = (slip, cache_key)
+
+        yield from drain(wait_for_all=True)
+
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 def generate_purchase_slip_pdf(slip_id, force_regenerate=False):
@@ -151,15 +300,15 @@ def generate_purchase_slip_pdf(slip_id, force_regenerate=False):
 
     WORKFLOW:
     1. Fetch slip data from database
-    2. Calculate payment totals and format dates
-    3. Render HTML template with slip data
-    4. Launch Chromium via Playwright
-    5. Generate PDF from HTML (in-memory)
+    2. Return the cached PDF if the slip and template are unchanged
+    3. Otherwise render HTML template with slip data (totals, IST dates)
+    4. Submit HTML to the warm Chromium pool (pdf_engine)
+    5. Store the PDF in the cache
     6. Return PDF as BytesIO stream
 
     Args:
         slip_id (int): ID of the slip to generate PDF for
-        force_regenerate (bool): Ignored (kept for API compatibility)
+        force_regenerate (bool): Bypass the PDF cache
 
     Returns:
         BytesIO: PDF content as bytes stream
@@ -168,53 +317,15 @@ def generate_purchase_slip_pdf(slip_id, force_regenerate=False):
         ValueError: If slip not found
         Exception: If PDF generation fails
     """
-    conn = None
-    cursor = None
-
     try:
-        print(f"[INFO] Generating PDF for slip ID: {slip_id}")
+        logger.debug(f"Generating PDF for slip ID: {slip_id}")
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM purchase_slips WHERE id = %s', (slip_id,))
-        slip = cursor.fetchone()
+        slip = fetch_slip(slip_id)
 
         if not slip:
             raise ValueError(f'Slip with ID {slip_id} not found')
 
-        total_paid, balance_amount = calculate_payment_totals(slip)
-        slip['total_paid_amount'] = total_paid
-        slip['balance_amount'] = balance_amount
-
-        slip['date_formatted'] = format_ist_datetime(slip.get('date')) if slip.get('date') else '-'
-
-        for i in range(1, 6):
-            date_key = f'instalment_{i}_date'
-            if slip.get(date_key):
-                slip[f'instalment_{i}_date_formatted'] = format_ist_datetime(slip[date_key])
-
-        template_path = os.path.join(
-            os.path.dirname(__file__),
-            'templates',
-            'print_template_new.html'
-        )
-
-        with open(template_path, 'r', encoding='utf-8') as f:
-            template_content = f.read()
-
-        template = Template(template_content)
-        html_content = template.render(slip=slip)
-
-        print(f"[OK] HTML template rendered successfully")
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            pdf_bytes = loop.run_until_complete(_generate_pdf_async(html_content))
-        finally:
-            loop.close()
-
-        print(f"[OK] PDF generated successfully ({len(pdf_bytes)} bytes)")
+        pdf_bytes, _, _ = render_slip_pdf(slip, force_regenerate)
 
         pdf_buffer = BytesIO(pdf_bytes)
         pdf_buffer.seek(0)
@@ -222,22 +333,18 @@ def generate_purchase_slip_pdf(slip_id, force_regenerate=False):
         return pdf_buffer
 
     except Exception as e:
-        print(f"[ERROR] Error generating PDF for slip {slip_id}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error generating PDF for slip {slip_id}: {e}")
         raise
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
 
 def invalidate_cache(slip_id):
     """
-    Cache invalidation stub - kept for API compatibility
-    Playwright generates PDFs on-demand, no caching needed
+    Drop all cached PDFs for a slip
+    Called after a slip is updated or deleted so stale files do not take up cache space
+    (content-addressed keys already guarantee a changed slip is never served stale)
     """
-    print(f"[INFO] Cache invalidation called for slip {slip_id} (no-op with Playwright)")
-    pass
+    cache = get_pdf_cache()
+    if cache is None:
+        return
+    removed = cache.invalidate(slip_id)
+    logger.debug(f"PDF cache invalidated for slip {slip_id} ({removed} file(s) removed)")
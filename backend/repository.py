@@ -0,0 +1,682 @@
+"""
+Data access for purchase_slips, slip_payments, users and unloading_godowns
+
+Repositories wrap a DBSession (database.db_session / database.transaction), so
+the caller decides the unit of work and connection handling lives in one place:
+
+    with transaction() as session:
+        slip_id = SlipRepository(session).insert(values, bill_no, fiscal_year)
+
+SQL text is built once at import time, and every statement carries a name
+(e.g. 'slips.get') under which database.get_query_stats() reports its timing.
+"""
+import logging
+import threading
+import time
+
+from calculations import INSTALMENT_COUNT
+from database import db_session
+
+logger = logging.getLogger(__name__)
+
+# slip_payments column -> suffix of the legacy instalment_N_* slip column it mirrors
+PAYMENT_INSTALMENT_FIELDS = [
+    ('paid_on', 'date'),
+    ('amount', 'amount'),
+    ('method', 'payment_method'),
+    ('bank_account', 'payment_bank_account'),
+    ('comment', 'comment'),
+]
+
+# Writable purchase_slips columns in INSERT order, with their value kind
+# ('text' -> str, 'number' -> float, 'datetime' -> naive IST datetime or None)
+SLIP_WRITE_COLUMNS = [
+    ('company_name', 'text'),
+    ('company_address', 'text'),
+    ('company_gst_no', 'text'),
+    ('company_mobile_no', 'text'),
+    ('document_type', 'text'),
+    ('vehicle_no', 'text'),
+    ('date', 'datetime'),
+    ('party_name', 'text'),
+    ('mobile_number', 'text'),
+    ('material_name', 'text'),
+    ('ticket_no', 'text'),
+    ('broker', 'text'),
+    ('terms_of_delivery', 'text'),
+    ('sup_inv_no', 'text'),
+    ('gst_no', 'text'),
+    ('bags', 'number'),
+    ('avg_bag_weight', 'number'),
+    ('net_weight_kg', 'number'),
+    ('gunny_weight_kg', 'number'),
+    ('final_weight_kg', 'number'),
+    ('weight_quintal', 'number'),
+    ('weight_khandi', 'number'),
+    ('rate_basis', 'text'),
+    ('rate_value', 'number'),
+    ('total_purchase_amount', 'number'),
+    ('bank_commission', 'number'),
+    ('postage', 'number'),
+    ('batav_percent', 'number'),
+    ('batav', 'number'),
+    ('shortage_percent', 'number'),
+    ('shortage', 'number'),
+    ('dalali_rate', 'number'),
+    ('dalali', 'number'),
+    ('hammali_rate', 'number'),
+    ('hammali', 'number'),
+    ('freight', 'number'),
+    ('rate_diff', 'number'),
+    ('quality_diff', 'number'),
+    ('quality_diff_comment', 'text'),
+    ('moisture_ded', 'number'),
+    ('moisture_ded_comment', 'text'),
+    ('moisture_percent', 'number'),
+    ('moisture_kg', 'number'),
+    ('tds', 'number'),
+    ('total_deduction', 'number'),
+    ('payable_amount', 'number'),
+    ('total_paid', 'number'),
+]
+for _i in range(1, INSTALMENT_COUNT + 1):
+    SLIP_WRITE_COLUMNS += [
+        (f'instalment_{_i}_date', 'datetime'),
+        (f'instalment_{_i}_amount', 'number'),
+        (f'instalment_{_i}_payment_method', 'text'),
+        (f'instalment_{_i}_payment_bank_account', 'text'),
+        (f'instalment_{_i}_comment', 'text'),
+    ]
+SLIP_WRITE_COLUMNS += [
+    ('prepared_by', 'text'),
+    ('authorised_sign', 'text'),
+    ('paddy_unloading_godown', 'text'),
+]
+
+# Defaults for text columns that are not simply ''
+SLIP_TEXT_DEFAULTS = {
+    'document_type': 'Purchase Slip',
+    'rate_basis': 'Quintal',
+}
+
+SLIP_LIST_COLUMNS = (
+    'id, bill_no, date, party_name, mobile_number, final_weight_kg, rate_basis, '
+    'payable_amount, total_paid, balance, instalment_1_amount, instalment_2_amount, '
+    'instalment_3_amount, instalment_4_amount, instalment_5_amount'
+)
+
+SLIP_SEARCH_COLUMNS = SLIP_LIST_COLUMNS + ', vehicle_no, broker, material_name, paddy_unloading_godown'
+
+# Outstanding = stored balance (payable - total_paid, rounded to paise) still due;
+# a range on the leading column of idx_balance_party, so only unpaid slips are read
+OUTSTANDING_CONDITION = 'balance > 0.005'
+
+# Outstanding slips by age in days (same buckets as the dashboard ageing widget)
+AGEING_BUCKETS = [('0_7', 0, 7), ('8_30', 8, 30), ('31_60', 31, 60), ('60_plus', 61, None)]
+
+# InnoDB FULLTEXT ignores words shorter than innodb_ft_min_token_size (default 3)
+FULLTEXT_MIN_TOKEN = 3
+
+_SLIP_COLUMN_NAMES = [name for name, _ in SLIP_WRITE_COLUMNS]
+
+# bill_no / fiscal_year are set once on insert and never rewritten by update()
+_SLIP_INSERT_SQL = 'INSERT INTO purchase_slips ({}, bill_no, fiscal_year) VALUES ({}, %s, %s)'.format(
+    ', '.join(_SLIP_COLUMN_NAMES),
+    ', '.join(['%s'] * len(_SLIP_COLUMN_NAMES))
+)
+
+_SLIP_UPDATE_SQL = 'UPDATE purchase_slips SET {} WHERE id = %s'.format(
+    ', '.join(f'{name} = %s' for name in _SLIP_COLUMN_NAMES)
+)
+
+
+def normalize_name(value):
+    """Python twin of the *_norm generated columns for names (trim + lowercase)"""
+    return (value or '').strip().lower()[:191]
+
+
+def normalize_vehicle_no(value):
+    """Python twin of vehicle_no_norm (uppercase, spaces and dashes removed)"""
+    return (value or '').upper().replace(' ', '').replace('-', '')[:64]
+
+
+def _like_prefix(value):
+    """LIKE pattern matching values that start with `value` (wildcards escaped)"""
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def _fulltext_terms(value):
+    """Boolean-mode query requiring every word as a prefix: 'ram la' -> '+ram* +la*'"""
+    words = [''.join(ch for ch in word if ch.isalnum()) for word in value.split()]
+    words = [word for word in words if len(word) >= FULLTEXT_MIN_TOKEN]
+    return ' '.join(f'+{word}*' for word in words)
+
+
+class SlipRepository:
+    """
+    purchase_slips table
+
+    Args:
+        session (DBSession): Unit of work to run statements in
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def get(self, slip_id):
+        """Full slip row, or None"""
+        return self.session.fetchone(
+            'SELECT * FROM purchase_slips WHERE id = %s', (slip_id,),
+            name='slips.get'
+        )
+
+    def list_page(self, limit, offset):
+        """List-view columns, newest first"""
+        return self.session.fetchall(
+            f'SELECT {SLIP_LIST_COLUMNS} FROM purchase_slips ORDER BY id DESC LIMIT %s OFFSET %s',
+            (limit, offset), name='slips.list_page'
+        )
+
+    def list_after(self, after_id, limit):
+        """
+        Keyset page: list-view columns for slips with id < after_id, newest first
+        (after_id=None starts from the newest slip). Uses the primary key index
+        directly, so deep pages cost the same as the first one.
+        """
+        if after_id is None:
+            return self.session.fetchall(
+                f'SELECT {SLIP_LIST_COLUMNS} FROM purchase_slips ORDER BY id DESC LIMIT %s',
+                (limit,), name='slips.list_first'
+            )
+        return self.session.fetchall(
+            f'SELECT {SLIP_LIST_COLUMNS} FROM purchase_slips WHERE id < %s ORDER BY id DESC LIMIT %s',
+            (after_id, limit), name='slips.list_after'
+        )
+
+    def count(self):
+        row = self.session.fetchone('SELECT COUNT(*) as total FROM purchase_slips', name='slips.count')
+        return row['total']
+
+    def find_many(self, slip_ids=None, date_from=None, date_to=None, party_name=None, limit=None):
+        """
+        Fetch many slip rows with a single query
+
+        Args:
+            slip_ids (list): Explicit slip IDs; other filters are ignored when given
+            date_from (datetime): Inclusive lower bound on slip date
+            date_to (datetime): Exclusive upper bound on slip date
+            party_name (str): Exact party name
+            limit (int): Maximum number of rows
+
+        Returns:
+            list: Slip rows ordered by bill number
+        """
+        conditions = []
+        params = []
+
+        if slip_ids:
+            placeholders = ', '.join(['%s'] * len(slip_ids))
+            conditions.append(f'id IN ({placeholders})')
+            params.extend(slip_ids)
+        else:
+            if date_from is not None:
+                conditions.append('date >= %s')
+                params.append(date_from)
+            if date_to is not None:
+                conditions.append('date < %s')
+                params.append(date_to)
+            if party_name:
+                conditions.append('party_name = %s')
+                params.append(party_name)
+
+        query = 'SELECT * FROM purchase_slips'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY bill_no, id'
+        if limit:
+            query += ' LIMIT %s'
+            params.append(int(limit))
+
+        return self.session.fetchall(query, tuple(params), name='slips.find_many')
+
+    def iter_export(self, columns, date_from=None, date_to=None, party=None):
+        """
+        Stream slip rows for an export, oldest first (unbuffered - see DBSession.iterate)
+
+        Args:
+            columns (list): Column names (validated by the caller)
+            date_from (datetime): Inclusive lower bound on slip date
+            date_to (datetime): Exclusive upper bound on slip date
+            party (str): Party name, case/space-insensitive (idx_party_norm_date)
+
+        Returns:
+            generator: Row dicts
+        """
+        conditions = []
+        params = []
+
+        party = normalize_name(party)
+        if party:
+            conditions.append('party_name_norm = %s')
+            params.append(party)
+        if date_from is not None:
+            conditions.append('date >= %s')
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append('date < %s')
+            params.append(date_to)
+
+        sql = f"SELECT {', '.join(columns)} FROM purchase_slips"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY date, id'
+        return self.session.iterate(sql, tuple(params), name='slips.export')
+
+    def build_search(self, filters, after_id=None, limit=50):
+        """
+        Build the search query for GET /api/slips/search
+
+        Index used per filter (leading column of the index the filter constrains):
+            party (prefix)    idx_party_norm_date   party_name_norm LIKE 'ram%' [+ date range]
+            party (fuzzy)     ft_party_name         MATCH(party_name) AGAINST('+ram* +lal*')
+            vehicle_no        idx_vehicle_no_norm   vehicle_no_norm LIKE 'MH12%'
+            broker            idx_broker_norm_date  broker_norm = 'x' [+ date range]
+            godown            idx_godown_norm_date  godown_norm = 'x' [+ date range]
+            bill_from/to      idx_bill_no           bill_no BETWEEN
+            date_from/to      idx_date              date range
+            outstanding       idx_balance_party     balance > 0.005
+        With no selective filter the query walks the primary key (id DESC) and stops
+        after `limit` rows, same as the list view.
+
+        Args:
+            filters (dict): party, match ('prefix' or 'fuzzy'), vehicle_no, broker,
+                godown, bill_from, bill_to, date_from (inclusive), date_to (exclusive),
+                outstanding (bool)
+            after_id (int): Keyset cursor - only slips with id < after_id
+            limit (int): Maximum number of rows
+
+        Returns:
+            tuple: (sql, params)
+        """
+        conditions = []
+        params = []
+
+        party = (filters.get('party') or '').strip()
+        if party:
+            terms = _fulltext_terms(party) if filters.get('match') == 'fuzzy' else ''
+            if terms:
+                conditions.append('MATCH(party_name) AGAINST (%s IN BOOLEAN MODE)')
+                params.append(terms)
+            else:
+                conditions.append('party_name_norm LIKE %s')
+                params.append(_like_prefix(normalize_name(party)))
+
+        vehicle_no = normalize_vehicle_no(filters.get('vehicle_no'))
+        if vehicle_no:
+            conditions.append('vehicle_no_norm LIKE %s')
+            params.append(_like_prefix(vehicle_no))
+
+        broker = normalize_name(filters.get('broker'))
+        if broker:
+            conditions.append('broker_norm = %s')
+            params.append(broker)
+
+        godown = normalize_name(filters.get('godown'))
+        if godown:
+            conditions.append('godown_norm = %s')
+            params.append(godown)
+
+        if filters.get('bill_from') is not None:
+            conditions.append('bill_no >= %s')
+            params.append(int(filters['bill_from']))
+        if filters.get('bill_to') is not None:
+            conditions.append('bill_no <= %s')
+            params.append(int(filters['bill_to']))
+
+        if filters.get('date_from') is not None:
+            conditions.append('date >= %s')
+            params.append(filters['date_from'])
+        if filters.get('date_to') is not None:
+            conditions.append('date < %s')
+            params.append(filters['date_to'])
+
+        if filters.get('outstanding'):
+            conditions.append(OUTSTANDING_CONDITION)
+
+        if after_id is not None:
+            conditions.append('id < %s')
+            params.append(int(after_id))
+
+        sql = f'SELECT {SLIP_SEARCH_COLUMNS} FROM purchase_slips'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id DESC LIMIT %s'
+        params.append(int(limit))
+        return sql, tuple(params)
+
+    def search(self, filters, after_id=None, limit=50):
+        """Run build_search(); returns list-view rows newest first"""
+        sql, params = self.build_search(filters, after_id, limit)
+        return self.session.fetchall(sql, params, name='slips.search')
+
+    def explain_search(self, filters, after_id=None, limit=50):
+        """EXPLAIN rows for the search query (which index MySQL picks per table access)"""
+        sql, params = self.build_search(filters, after_id, limit)
+        return self.session.fetchall('EXPLAIN ' + sql, params, name='slips.search_explain')
+
+    def outstanding_by_party(self, limit=50, party=None):
+        """
+        Parties we still owe, largest balance first, with an ageing breakdown
+
+        Reads only slips with balance > 0 through idx_balance_party.
+
+        Args:
+            limit (int): Maximum number of parties
+            party (str): Optional party name prefix
+
+        Returns:
+            list: Rows with party_name, bills, outstanding, oldest_date and age_<bucket> amounts
+        """
+        age = 'DATEDIFF(CURDATE(), DATE(date))'
+        buckets = []
+        for key, low, high in AGEING_BUCKETS:
+            condition = f'{age} >= {low}' if high is None else f'{age} BETWEEN {low} AND {high}'
+            buckets.append(f'SUM(CASE WHEN {condition} THEN balance ELSE 0 END) as age_{key}')
+
+        conditions = [OUTSTANDING_CONDITION]
+        params = []
+        party = normalize_name(party)
+        if party:
+            conditions.append('party_name_norm LIKE %s')
+            params.append(_like_prefix(party))
+        params.append(int(limit))
+
+        return self.session.fetchall(f'''
+            SELECT party_name_norm as party_key, MAX(party_name) as party_name,
+                   COUNT(*) as bills, SUM(balance) as outstanding, MIN(date) as oldest_date,
+                   {', '.join(buckets)}
+            FROM purchase_slips
+            WHERE {' AND '.join(conditions)}
+            GROUP BY party_name_norm
+            ORDER BY outstanding DESC
+            LIMIT %s
+        ''', tuple(params), name='slips.outstanding_by_party')
+
+    def insert(self, values, bill_no, fiscal_year):
+        """
+        Insert a slip
+
+        Args:
+            values (dict): Column values for every SLIP_WRITE_COLUMNS entry
+            bill_no (int): Bill number for the new slip (see bill_numbers.py)
+            fiscal_year (int): Financial year the bill number belongs to
+
+        Returns:
+            int: New slip ID
+        """
+        params = [values[name] for name in _SLIP_COLUMN_NAMES]
+        params.append(bill_no)
+        params.append(fiscal_year)
+        cursor = self.session.execute(_SLIP_INSERT_SQL, params, name='slips.insert')
+        return cursor.lastrowid
+
+    def insert_many(self, rows):
+        """
+        Insert many slips with one multi-row INSERT (executemany)
+
+        Args:
+            rows (list): (values, bill_no, fiscal_year) tuples as for insert()
+
+        Returns:
+            int: Number of rows inserted
+        """
+        params = [
+            [values[name] for name in _SLIP_COLUMN_NAMES] + [bill_no, fiscal_year]
+            for values, bill_no, fiscal_year in rows
+        ]
+        cursor = self.session.executemany(_SLIP_INSERT_SQL, params, name='slips.insert_many')
+        return cursor.rowcount
+
+    def ids_for_bill_range(self, fiscal_year, first_bill_no, last_bill_no):
+        """
+        IDs of the slips holding a range of bill numbers (uq_fiscal_year_bill_no range scan)
+
+        Returns:
+            dict: bill_no -> slip ID
+        """
+        rows = self.session.fetchall('''
+            SELECT id, bill_no FROM purchase_slips
+            WHERE fiscal_year = %s AND bill_no BETWEEN %s AND %s
+        ''', (fiscal_year, first_bill_no, last_bill_no), name='slips.ids_for_bill_range')
+        return {row['bill_no']: row['id'] for row in rows}
+
+    def update(self, slip_id, values):
+        """Overwrite every writable column of a slip; returns the affected row count"""
+        params = [values[name] for name in _SLIP_COLUMN_NAMES]
+        params.append(slip_id)
+        cursor = self.session.execute(_SLIP_UPDATE_SQL, params, name='slips.update')
+        return cursor.rowcount
+
+    def delete(self, slip_id):
+        cursor = self.session.execute(
+            'DELETE FROM purchase_slips WHERE id = %s', (slip_id,), name='slips.delete'
+        )
+        return cursor.rowcount
+
+
+_PAYMENT_COLUMNS = ['slip_id', 'seq'] + [column for column, _ in PAYMENT_INSTALMENT_FIELDS]
+
+_PAYMENT_INSERT_SQL = 'INSERT INTO slip_payments ({}) VALUES ({})'.format(
+    ', '.join(_PAYMENT_COLUMNS), ', '.join(['%s'] * len(_PAYMENT_COLUMNS))
+)
+
+
+class PaymentRepository:
+    """slip_payments table (one row per payment; seq is its instalment slot)"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def replace(self, slip_id, payments):
+        """
+        Make `payments` the complete payment list of a slip
+
+        Args:
+            slip_id (int): Slip ID
+            payments (list): Dicts with seq and every PAYMENT_INSTALMENT_FIELDS column
+        """
+        self.session.execute('DELETE FROM slip_payments WHERE slip_id = %s', (slip_id,), name='payments.clear')
+        if payments:
+            self.session.executemany(
+                _PAYMENT_INSERT_SQL,
+                [[slip_id] + [payment[column] for column in _PAYMENT_COLUMNS[1:]] for payment in payments],
+                name='payments.insert'
+            )
+
+    def insert_many(self, payments_by_slip):
+        """
+        Insert the payments of new slips (nothing to clear first)
+
+        Args:
+            payments_by_slip (list): (slip_id, payments) pairs as for replace()
+        """
+        params = [
+            [slip_id] + [payment[column] for column in _PAYMENT_COLUMNS[1:]]
+            for slip_id, payments in payments_by_slip
+            for payment in payments
+        ]
+        if params:
+            self.session.executemany(_PAYMENT_INSERT_SQL, params, name='payments.insert_many')
+
+    def list_for_slip(self, slip_id):
+        return self.session.fetchall(
+            'SELECT {} FROM slip_payments WHERE slip_id = %s ORDER BY seq'.format(', '.join(_PAYMENT_COLUMNS[1:])),
+            (slip_id,), name='payments.by_slip'
+        )
+
+
+class UserRepository:
+    """users table"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def authenticate(self, username, password):
+        """Active user matching the credentials, or None"""
+        return self.session.fetchone('''
+            SELECT id, username, full_name, role, is_active
+            FROM users
+            WHERE username = %s AND password = %s AND is_active = TRUE
+        ''', (username, password), name='users.authenticate')
+
+    def touch_last_login(self, user_id, when):
+        self.session.execute(
+            'UPDATE users SET last_login = %s WHERE id = %s', (when, user_id), name='users.touch_last_login'
+        )
+
+    def list_all(self):
+        return self.session.fetchall('''
+            SELECT
+                id,
+                username,
+                COALESCE(full_name, '') as full_name,
+                role,
+                is_active,
+                last_login
+            FROM users
+            ORDER BY id DESC
+        ''', name='users.list')
+
+    def username_exists(self, username):
+        row = self.session.fetchone('SELECT id FROM users WHERE username = %s', (username,), name='users.by_username')
+        return row is not None
+
+    def create(self, username, password, full_name, role):
+        cursor = self.session.execute('''
+            INSERT INTO users (username, password, full_name, role)
+            VALUES (%s, %s, %s, %s)
+        ''', (username, password, full_name, role), name='users.create')
+        return cursor.lastrowid
+
+    def update(self, user_id, full_name, role, is_active, password=None):
+        if password:
+            self.session.execute('''
+                UPDATE users
+                SET full_name = %s, role = %s, is_active = %s, password = %s
+                WHERE id = %s
+            ''', (full_name, role, is_active, password, user_id), name='users.update_with_password')
+        else:
+            self.session.execute('''
+                UPDATE users
+                SET full_name = %s, role = %s, is_active = %s
+                WHERE id = %s
+            ''', (full_name, role, is_active, user_id), name='users.update')
+
+    def count_active_admins(self):
+        row = self.session.fetchone('''
+            SELECT COUNT(*) as admin_count
+            FROM users
+            WHERE role = 'admin' AND is_active = TRUE
+        ''', name='users.count_admins')
+        return row['admin_count']
+
+    def get_role(self, user_id):
+        row = self.session.fetchone('SELECT role FROM users WHERE id = %s', (user_id,), name='users.get_role')
+        return row['role'] if row else None
+
+    def deactivate(self, user_id):
+        self.session.execute('UPDATE users SET is_active = FALSE WHERE id = %s', (user_id,), name='users.deactivate')
+
+
+class GodownRepository:
+    """unloading_godowns table"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def list_all(self):
+        return self.session.fetchall(
+            'SELECT id, name FROM unloading_godowns ORDER BY name ASC', name='godowns.list'
+        )
+
+    def find_by_name(self, name):
+        return self.session.fetchone(
+            'SELECT id, name FROM unloading_godowns WHERE name = %s', (name,), name='godowns.by_name'
+        )
+
+    def create(self, name):
+        cursor = self.session.execute(
+            'INSERT INTO unloading_godowns (name) VALUES (%s)', (name,), name='godowns.create'
+        )
+        return cursor.lastrowid
+
+
+class SlipCountCache:
+    """
+    Total number of slips without a COUNT(*) per request
+
+    The first call counts synchronously. After that the cached value is served
+    immediately; once it is older than `ttl` seconds a single background thread
+    recounts. Inserts/deletes adjust the value in between so it stays close.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._total = None
+        self._counted_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with db_session() as session:
+            return SlipRepository(session).count()
+
+    def _store(self, total):
+        with self._lock:
+            self._total = total
+            self._counted_at = time.monotonic()
+            self._refreshing = False
+
+    def _refresh_in_background(self):
+        try:
+            self._store(self._count())
+        except Exception as e:
+            with self._lock:
+                self._refreshing = False
+            logger.warning(f"Slip count refresh failed: {e}")
+
+    def get(self):
+        with self._lock:
+            total = self._total
+            stale = time.monotonic() - self._counted_at > self.ttl
+            start_refresh = total is not None and stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+
+        if total is None:
+            total = self._count()
+            self._store(total)
+        elif start_refresh:
+            threading.Thread(target=self._refresh_in_background, name='slip-count', daemon=True).start()
+        return total
+
+    def adjust(self, delta):
+        """Apply a known change (e.g. +1 after insert) until the next recount"""
+        with self._lock:
+            if self._total is not None:
+                self._total = max(0, self._total + delta)
+
+
+slip_count_cache = SlipCountCache()
+
+
+def fetch_slip(slip_id):
+    """
+    Fetch one slip row in its own short session (connection released before returning)
+
+    Returns:
+        dict or None: Slip row
+    """
+    with db_session() as session:
+        return SlipRepository(session).get(slip_id)
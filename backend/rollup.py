@@ -0,0 +1,236 @@
+"""
+Materialized daily rollup of purchase_slips
+
+purchase_daily_rollup holds one row per (day, party, godown, material) cell with
+the sums the dashboard and reports need, so they never scan the fact table.
+Paid amounts come from purchase_slips.total_paid and slip_payments.
+
+Maintenance happens in the same transaction as the slip write: the changed
+slips' own contributions are read (by primary key) before and after the change,
+and each cell they touch gets one INSERT ... ON DUPLICATE KEY UPDATE adding the
+net difference. Nothing else in purchase_slips is read or locked, and there is
+no DELETE-then-INSERT on a missing cell key, whose gap locks deadlock two
+counters saving the first slip of a new party / godown / material on one day.
+Cells whose last slip went away are deleted (by primary key, row locked only).
+
+Deltas cannot see a payment date that is no longer the latest, so after a
+payment or slip is removed a cell's last_payment_date can stay too recent until
+the next rebuild; every sum and count stays exact.
+
+Cell keys use the normalized *_norm columns; blank and NULL names share the ''
+key (and are left out of per-party / per-godown widgets).
+
+Rebuild / backfill from the command line:
+    python backend/rollup.py --rebuild
+"""
+import sys
+import time
+
+ROLLUP_TABLE = 'purchase_daily_rollup'
+
+# Summed slip columns stored as-is
+SUM_COLUMNS = [
+    'weight_quintal', 'total_purchase_amount', 'total_deduction', 'payable_amount',
+    'bank_commission', 'postage', 'batav', 'shortage', 'dalali', 'hammali',
+    'freight', 'rate_diff', 'quality_diff', 'moisture_ded', 'tds',
+]
+
+PAYMENT_MODES = [('cash', 'Cash'), ('online', 'Online Transfer'), ('cheque', 'Cheque')]
+
+CREATE_ROLLUP_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        day DATE NOT NULL,
+        party_key VARCHAR(191) NOT NULL DEFAULT '',
+        godown_key VARCHAR(191) NOT NULL DEFAULT '',
+        material_key VARCHAR(191) NOT NULL DEFAULT '',
+        party_name VARCHAR(191),
+        godown VARCHAR(191),
+        material_name VARCHAR(191),
+        bills INT NOT NULL DEFAULT 0,
+        {', '.join(f'{column} DOUBLE NOT NULL DEFAULT 0' for column in SUM_COLUMNS)},
+        paid_amount DOUBLE NOT NULL DEFAULT 0,
+        {', '.join(f'paid_{key} DOUBLE NOT NULL DEFAULT 0' for key, _ in PAYMENT_MODES)},
+        paid_other DOUBLE NOT NULL DEFAULT 0,
+        rate_sum DOUBLE NOT NULL DEFAULT 0,
+        rate_rows INT NOT NULL DEFAULT 0,
+        last_payment_date DATETIME NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (day, party_key, godown_key, material_key),
+        INDEX idx_rollup_party_day (party_key, day),
+        INDEX idx_rollup_godown_day (godown_key, day)
+    )
+'''
+
+
+def _payments_expr(aggregate, condition=''):
+    # Per-slip correlated lookup through uq_slip_payments_slip_seq (slip_id prefix)
+    return f'(SELECT {aggregate} FROM slip_payments p WHERE p.slip_id = purchase_slips.id{condition})'
+
+
+def _paid_by_method_expr(method):
+    return _payments_expr('COALESCE(SUM(p.amount), 0)', f" AND p.method = '{method}'")
+
+
+_KNOWN_METHODS = ', '.join(f"'{method}'" for _, method in PAYMENT_MODES)
+_PAID_OTHER_EXPR = _payments_expr('COALESCE(SUM(p.amount), 0)', f" AND COALESCE(p.method, '') NOT IN ({_KNOWN_METHODS})")
+_LAST_PAYMENT_EXPR = _payments_expr('MAX(p.paid_on)')
+
+_KEY_EXPRS = [
+    'DATE(date)',
+    "COALESCE(party_name_norm, '')",
+    "COALESCE(godown_norm, '')",
+    "COALESCE(material_norm, '')",
+]
+
+_ROLLUP_COLUMNS = (
+    ['day', 'party_key', 'godown_key', 'material_key', 'party_name', 'godown', 'material_name', 'bills']
+    + SUM_COLUMNS
+    + ['paid_amount'] + [f'paid_{key}' for key, _ in PAYMENT_MODES] + ['paid_other']
+    + ['rate_sum', 'rate_rows', 'last_payment_date']
+)
+
+_ROLLUP_SELECT_EXPRS = (
+    _KEY_EXPRS
+    + ['MAX(LEFT(party_name, 191))', 'MAX(LEFT(paddy_unloading_godown, 191))', 'MAX(LEFT(material_name, 191))',
+       'COUNT(*)']
+    + [f'COALESCE(SUM({column}), 0)' for column in SUM_COLUMNS]
+    + ['COALESCE(SUM(total_paid), 0)']
+    + [f'SUM({_paid_by_method_expr(method)})' for _, method in PAYMENT_MODES]
+    + [f'SUM({_PAID_OTHER_EXPR})']
+    + ['COALESCE(SUM(CASE WHEN weight_quintal > 0 THEN payable_amount / weight_quintal END), 0)',
+       'COUNT(CASE WHEN weight_quintal > 0 THEN 1 END)',
+       f'MAX({_LAST_PAYMENT_EXPR})']
+)
+
+_ROLLUP_INSERT_SELECT = 'INSERT INTO {table} ({columns}) SELECT {exprs} FROM purchase_slips {{where}} GROUP BY 1, 2, 3, 4'.format(
+    table=ROLLUP_TABLE,
+    columns=', '.join(_ROLLUP_COLUMNS),
+    exprs=', '.join(_ROLLUP_SELECT_EXPRS),
+)
+
+_KEY_COLUMNS = ['day', 'party_key', 'godown_key', 'material_key']
+
+# Columns a slip adds to its cell (subtracted again when it leaves the cell)
+_ADDITIVE_COLUMNS = (
+    ['bills'] + SUM_COLUMNS
+    + ['paid_amount'] + [f'paid_{key}' for key, _ in PAYMENT_MODES] + ['paid_other']
+    + ['rate_sum', 'rate_rows']
+)
+_NAME_COLUMNS = ['party_name', 'godown', 'material_name']
+
+_CELL_DELTAS_SELECT = 'SELECT {exprs} FROM purchase_slips WHERE id IN ({{placeholders}}) GROUP BY 1, 2, 3, 4'.format(
+    exprs=', '.join(f'{expr} AS {column}' for expr, column in zip(_ROLLUP_SELECT_EXPRS, _ROLLUP_COLUMNS)),
+)
+
+_CELL_UPSERT = 'INSERT INTO {table} ({columns}) VALUES ({values}) ON DUPLICATE KEY UPDATE {updates}'.format(
+    table=ROLLUP_TABLE,
+    columns=', '.join(_ROLLUP_COLUMNS),
+    values=', '.join(['%s'] * len(_ROLLUP_COLUMNS)),
+    updates=', '.join(
+        [f'{column} = {column} + VALUES({column})' for column in _ADDITIVE_COLUMNS]
+        + [f'{column} = COALESCE(VALUES({column}), {column})' for column in _NAME_COLUMNS]
+        + ['last_payment_date = GREATEST(COALESCE(last_payment_date, VALUES(last_payment_date)), '
+           'COALESCE(VALUES(last_payment_date), last_payment_date))']
+    ),
+)
+
+_CELL_KEY_WHERE = 'WHERE day = %s AND party_key = %s AND godown_key = %s AND material_key = %s'
+
+
+def _number(row, column):
+    if row is None or row[column] is None:
+        return 0
+    value = row[column]
+    return value if isinstance(value, int) else float(value)
+
+
+def cell_deltas(session, slip_ids, lock=False):
+    """
+    What the given slips currently contribute to each rollup cell
+
+    Call before an update/delete (what leaves the cells) and after an
+    insert/update (what enters them), then pass both to update_cells().
+
+    Args:
+        lock (bool): First lock the slip rows (by primary key) so a concurrent
+            edit of the same slip cannot change them under us. Make this the
+            first statement of the transaction: the consistent-read snapshot is
+            taken at the first plain SELECT, which must come after the lock.
+
+    Returns:
+        dict: {(day, party_key, godown_key, material_key): {column: value}}
+    """
+    if not slip_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(slip_ids))
+    params = tuple(sorted(slip_ids))
+    if lock:
+        session.fetchall(
+            f'SELECT id FROM purchase_slips WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE',
+            params, name='rollup.lock_slips'
+        )
+    rows = session.fetchall(_CELL_DELTAS_SELECT.format(placeholders=placeholders), params, name='rollup.cell_deltas')
+    return {(row['day'], row['party_key'], row['godown_key'], row['material_key']): row for row in rows}
+
+
+def update_cells(session, removed=None, added=None):
+    """
+    Apply the net change of slips leaving (removed) and entering (added) rollup cells
+
+    One upsert per touched cell, in a fixed cell order so concurrent writers lock
+    cells alike; runs inside the caller's transaction.
+
+    Args:
+        removed (dict): cell_deltas() taken before the change
+        added (dict): cell_deltas() taken after the change
+    """
+    removed = removed or {}
+    added = added or {}
+    for cell in sorted(set(removed) | set(added), key=lambda cell: tuple(str(part) for part in cell)):
+        before = removed.get(cell)
+        after = added.get(cell)
+        values = []
+        for column in _ROLLUP_COLUMNS:
+            if column in _ADDITIVE_COLUMNS:
+                values.append(_number(after, column) - _number(before, column))
+            elif column in _KEY_COLUMNS:
+                values.append((after or before)[column])
+            else:
+                # Names and payment date only come from slips entering the cell
+                values.append(after[column] if after else None)
+        session.execute(_CELL_UPSERT, tuple(values), name='rollup.upsert_cell')
+        if before is not None:
+            session.execute(
+                f'DELETE FROM {ROLLUP_TABLE} {_CELL_KEY_WHERE} AND bills <= 0', cell, name='rollup.delete_empty_cell'
+            )
+
+
+def rebuild_rollup(session):
+    """
+    Recompute the whole rollup from purchase_slips (caller commits)
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    session.execute(f'DELETE FROM {ROLLUP_TABLE}', name='rollup.clear')
+    cursor = session.execute(_ROLLUP_INSERT_SELECT.format(where=''), name='rollup.rebuild')
+    return cursor.rowcount
+
+
+def main(argv):
+    if '--rebuild' not in argv:
+        print("Usage: python backend/rollup.py --rebuild")
+        return 2
+
+    from database import transaction
+
+    started = time.time()
+    with transaction() as session:
+        session.execute(CREATE_ROLLUP_TABLE, name='rollup.create')
+        rows = rebuild_rollup(session)
+    print(f"[OK] Rebuilt {ROLLUP_TABLE}: {rows} row(s) in {time.time() - started:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
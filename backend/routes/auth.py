@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+import logging
 import sys
 import os
 from datetime import datetime
@@ -6,15 +7,16 @@ import mysql.connector
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db_connection
+from database import db_session, transaction
+from repository import UserRepository
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/api/login', methods=['POST'])
 def login():
     """User login endpoint with proper connection management"""
-    conn = None
-    cursor = None
     try:
         data = request.json
         username = data.get('username', '').strip()
@@ -26,23 +28,13 @@ def login():
                 'message': 'Username and password are required'
             }), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute('''
-            SELECT id, username, full_name, role, is_active
-            FROM users
-            WHERE username = %s AND password = %s AND is_active = TRUE
-        ''', (username, password))
-
-        user = cursor.fetchone()
+        with transaction() as session:
+            users = UserRepository(session)
+            user = users.authenticate(username, password)
+            if user:
+                users.touch_last_login(user['id'], datetime.now())
 
         if user:
-            cursor.execute('''
-                UPDATE users SET last_login = %s WHERE id = %s
-            ''', (datetime.now(), user['id']))
-            conn.commit()
-
             return jsonify({
                 'success': True,
                 'user': {
@@ -63,38 +55,14 @@ def login():
             'success': False,
             'message': str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 @auth_bp.route('/api/users', methods=['GET'])
 def get_users():
     """Get all users - MySQL version with dictionary cursor"""
-    conn = None
-    cursor = None
     try:
-        # Get MySQL connection
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Execute query with explicit column selection
-        cursor.execute('''
-            SELECT
-                id,
-                username,
-                COALESCE(full_name, '') as full_name,
-                role,
-                is_active,
-                last_login
-            FROM users
-            ORDER BY id DESC
-        ''')
-
-        # Fetch all rows - already dictionaries due to dictionary=True
-        users = cursor.fetchall()
+        with db_session() as session:
+            users = UserRepository(session).list_all()
 
         # Format datetime fields for JSON
         for user in users:
@@ -103,7 +71,7 @@ def get_users():
             user['is_active'] = bool(user.get('is_active', True))
 
         # Log for debugging
-        print(f"[OK] Fetched {len(users)} users from database")
+        logger.debug(f"Fetched {len(users)} users from database")
 
         return jsonify({
             'success': True,
@@ -112,9 +80,7 @@ def get_users():
 
     except mysql.connector.Error as db_error:
         error_msg = f"Database error: {str(db_error)}"
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(error_msg)
         return jsonify({
             'success': False,
             'message': error_msg,
@@ -123,29 +89,13 @@ def get_users():
 
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(error_msg)
         return jsonify({
             'success': False,
             'message': error_msg,
             'error_type': 'server'
         }), 500
 
-    finally:
-        # Always clean up resources
-        try:
-            if cursor:
-                cursor.close()
-        except Exception as e:
-            print(f"Warning: Error closing cursor: {e}")
-
-        try:
-            if conn:
-                conn.close()
-        except Exception as e:
-            print(f"Warning: Error closing connection: {e}")
-
 
 @auth_bp.route('/api/users', methods=['POST'])
 def add_user():
@@ -153,8 +103,6 @@ def add_user():
     Add new user
     Admin-only operation (should be checked on frontend)
     """
-    conn = None
-    cursor = None
     try:
         data = request.json
         username = data.get('username', '').strip()
@@ -176,24 +124,17 @@ def add_user():
                 'message': 'Username and password are required'
             }), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Check if username already exists
-        cursor.execute('SELECT id FROM users WHERE username = %s', (username,))
-        if cursor.fetchone():
-            return jsonify({
-                'success': False,
-                'message': 'Username already exists'
-            }), 400
+        with transaction() as session:
+            users = UserRepository(session)
 
-        cursor.execute('''
-            INSERT INTO users (username, password, full_name, role)
-            VALUES (%s, %s, %s, %s)
-        ''', (username, password, full_name, role))
+            # Check if username already exists
+            if users.username_exists(username):
+                return jsonify({
+                    'success': False,
+                    'message': 'Username already exists'
+                }), 400
 
-        user_id = cursor.lastrowid
-        conn.commit()
+            user_id = users.create(username, password, full_name, role)
 
         return jsonify({
             'success': True,
@@ -202,16 +143,11 @@ def add_user():
         }), 201
 
     except Exception as e:
-        print(f"Error adding user: {e}")
+        logger.error(f"Error adding user: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 @auth_bp.route('/api/users/<int:user_id>', methods=['PUT'])
@@ -220,8 +156,6 @@ def update_user(user_id):
     Update user
     Admin-only operation
     """
-    conn = None
-    cursor = None
     try:
         data = request.json
         full_name = data.get('full_name', '').strip()
@@ -237,23 +171,8 @@ def update_user(user_id):
                 'message': 'Only administrators can update users'
             }), 403
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        if password:
-            cursor.execute('''
-                UPDATE users
-                SET full_name = %s, role = %s, is_active = %s, password = %s
-                WHERE id = %s
-            ''', (full_name, role, is_active, password, user_id))
-        else:
-            cursor.execute('''
-                UPDATE users
-                SET full_name = %s, role = %s, is_active = %s
-                WHERE id = %s
-            ''', (full_name, role, is_active, user_id))
-
-        conn.commit()
+        with transaction() as session:
+            UserRepository(session).update(user_id, full_name, role, is_active, password or None)
 
         return jsonify({
             'success': True,
@@ -261,16 +180,11 @@ def update_user(user_id):
         }), 200
 
     except Exception as e:
-        print(f"Error updating user: {e}")
+        logger.error(f"Error updating user: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 @auth_bp.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -279,8 +193,6 @@ def delete_user(user_id):
     Delete user (soft delete by setting is_active to FALSE)
     Admin-only operation
     """
-    conn = None
-    cursor = None
     try:
         data = request.json or {}
         requesting_user_role = data.get('requesting_user_role', 'user')
@@ -292,32 +204,19 @@ def delete_user(user_id):
                 'message': 'Only administrators can delete users'
             }), 403
 
-        # Prevent deleting the last admin
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Check if this is the last admin
-        cursor.execute('''
-            SELECT COUNT(*) as admin_count
-            FROM users
-            WHERE role = 'admin' AND is_active = TRUE
-        ''')
-        admin_count = cursor.fetchone()['admin_count']
+        with transaction() as session:
+            users = UserRepository(session)
 
-        cursor.execute('SELECT role FROM users WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
-
-        if user and user['role'] == 'admin' and admin_count <= 1:
-            return jsonify({
-                'success': False,
-                'message': 'Cannot delete the last administrator'
-            }), 400
+            # Prevent deleting the last admin
+            admin_count = users.count_active_admins()
 
-        cursor.execute('''
-            UPDATE users SET is_active = FALSE WHERE id = %s
-        ''', (user_id,))
+            if users.get_role(user_id) == 'admin' and admin_count <= 1:
+                return jsonify({
+                    'success': False,
+                    'message': 'Cannot delete the last administrator'
+                }), 400
 
-        conn.commit()
+            users.deactivate(user_id)
 
         return jsonify({
             'success': True,
@@ -325,13 +224,8 @@ def delete_user(user_id):
         }), 200
 
     except Exception as e:
-        print(f"Error deleting user: {e}")
+        logger.error(f"Error deleting user: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
@@ -1,41 +1,106 @@
-from flask import Blueprint, request, jsonify, render_template, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app, Response
+import logging
 import sys
 import os
+import json
+import math
+import base64
 import tempfile
+import threading
+from io import BytesIO
+from datetime import timedelta
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db_connection, get_next_bill_no
+from database import db_session, transaction
+from repository import (
+    SlipRepository, GodownRepository, PaymentRepository, SLIP_WRITE_COLUMNS, SLIP_TEXT_DEFAULTS,
+    INSTALMENT_COUNT, PAYMENT_INSTALMENT_FIELDS, AGEING_BUCKETS, fetch_slip, slip_count_cache
+)
+from config_loader import get_config_section
+from calculations import (
+    safe_float, calculate_fields, calculate_payment_totals, calculate_batch, RATE_BASES, NUMPY_AVAILABLE
+)
+from dashboard import build_dashboard, PERIOD_CONDITIONS
+from dashboard_cache import get_dashboard_cache, invalidate_dashboard_cache
+from rollup import cell_deltas, update_cells
+from bill_numbers import get_bill_number_allocator, fiscal_year_of
+from idempotency import (
+    IdempotencyRepository, IdempotencyKeyMismatch, IDEMPOTENCY_HEADER,
+    validate_key, request_fingerprint, get_idempotency_settings
+)
+from slip_import import SlipImporter, IMPORT_DEFAULTS, detect_format, read_records
+from slip_export import EXPORT_FORMATS, parse_columns, export_filename, iter_csv, iter_xlsx
 from datetime import datetime
 from pytz import timezone
 
-# Import centralized PDF and WhatsApp services
-try:
-    from pdf_service import generate_purchase_slip_pdf, get_pdf_filename, invalidate_cache
-    PDF_SERVICE_AVAILABLE = True
-    print("[OK] Centralized PDF service loaded successfully")
-except ImportError as e:
-    PDF_SERVICE_AVAILABLE = False
-    print(f"[WARNING] Centralized PDF service not available: {e}")
-
-try:
-    from whatsapp_service import send_pdf_via_whatsapp, is_whatsapp_configured, get_configuration_instructions
-    WHATSAPP_SERVICE_AVAILABLE = True
-    print("[OK] WhatsApp service loaded successfully")
-except ImportError as e:
-    WHATSAPP_SERVICE_AVAILABLE = False
-    print(f"[WARNING] WhatsApp service not available: {e}")
+logger = logging.getLogger(__name__)
+
+# Centralized PDF and WhatsApp services, imported on first use: pdf_service pulls
+# in the template/cache/browser stack and whatsapp_service pulls in requests,
+# neither of which should delay startup
+PDF_SERVICE_AVAILABLE = None
+WHATSAPP_SERVICE_AVAILABLE = None
+_services_lock = threading.Lock()
+
+def load_pdf_service():
+    """
+    Import the PDF service modules into this module's namespace (once)
+
+    Returns:
+        bool: True if the PDF service is available
+    """
+    global PDF_SERVICE_AVAILABLE
+    global get_pdf_filename, invalidate_cache, fetch_slips, get_slip_pdf_key
+    global render_slip_pdf, render_slip_html, create_batch, get_batch, stream_zip, build_merged_pdf, failed_slip_ids
+    global is_merge_available, get_pdf_job_queue, enqueue_prerender, job_to_response, get_job_pdf
+    if PDF_SERVICE_AVAILABLE is not None:
+        return PDF_SERVICE_AVAILABLE
+    with _services_lock:
+        if PDF_SERVICE_AVAILABLE is None:
+            try:
+                from pdf_service import (
+                    get_pdf_filename, invalidate_cache,
+                    fetch_slips, get_slip_pdf_key, render_slip_pdf, render_slip_html
+                )
+                from pdf_batch import create_batch, get_batch, stream_zip, build_merged_pdf, failed_slip_ids, is_merge_available
+                from pdf_jobs import get_pdf_job_queue, enqueue_prerender, job_to_response, get_job_pdf
+                PDF_SERVICE_AVAILABLE = True
+                logger.info("Centralized PDF service loaded successfully")
+            except ImportError as e:
+                PDF_SERVICE_AVAILABLE = False
+                logger.warning(f"Centralized PDF service not available: {e}")
+    return PDF_SERVICE_AVAILABLE
+
+def load_whatsapp_service():
+    """
+    Import the WhatsApp service into this module's namespace (once)
+
+    Returns:
+        bool: True if the WhatsApp service is available
+    """
+    global WHATSAPP_SERVICE_AVAILABLE
+    global send_pdf_via_whatsapp, is_whatsapp_configured, get_configuration_instructions
+    if WHATSAPP_SERVICE_AVAILABLE is not None:
+        return WHATSAPP_SERVICE_AVAILABLE
+    with _services_lock:
+        if WHATSAPP_SERVICE_AVAILABLE is None:
+            try:
+                from whatsapp_service import send_pdf_via_whatsapp, is_whatsapp_configured, get_configuration_instructions
+                WHATSAPP_SERVICE_AVAILABLE = True
+                logger.info("WhatsApp service loaded successfully")
+            except ImportError as e:
+                WHATSAPP_SERVICE_AVAILABLE = False
+                logger.warning(f"WhatsApp service not available: {e}")
+    return WHATSAPP_SERVICE_AVAILABLE
 
 slips_bp = Blueprint('slips', __name__)
 
-def safe_float(value, default=0.0):
-    """Safely convert value to float, handling empty strings and None"""
-    try:
-        if value in (None, '', ' '):
-            return default
-        return float(value)
-    except (TypeError, ValueError):
-        return default
+# Seconds MySQL waits for an export stream to be read before dropping it
+EXPORT_NET_WRITE_TIMEOUT = 600
+
+# Slips per POST /api/calculate/batch request
+CALCULATE_BATCH_MAX_ROWS = 5000
 
 def get_ist_datetime():
     """Get current datetime in IST timezone"""
@@ -100,291 +165,512 @@ def format_ist_datetime(dt):
     return None
 
 
-def calculate_payment_totals(data):
+def build_slip_values(data):
+    """Typed column values for SlipRepository.insert/update from (calculated) slip data"""
+    values = {}
+    for name, kind in SLIP_WRITE_COLUMNS:
+        if kind == 'number':
+            values[name] = safe_float(data.get(name, 0), 0)
+        elif kind == 'datetime':
+            values[name] = parse_datetime_to_ist(data.get(name))
+        else:
+            values[name] = data.get(name, SLIP_TEXT_DEFAULTS.get(name, ''))
+    return values
+
+def resolve_payments(data):
     """
-    Calculate Total Paid Amount and Balance Amount dynamically
-    Total Paid = Sum of all instalment amounts
-    Balance = Payable Amount - Total Paid
+    Payments of a slip write, from a 'payments' array or the legacy instalment_N_* fields
+
+    A 'payments' array ([{paid_on, amount, method, bank_account, comment}, ...])
+    replaces all payments and is mirrored into the instalment_N_* fields; without
+    one the instalment fields are used as sent. Sets data['total_paid'] either way.
+
+    Returns:
+        list: Payment dicts for PaymentRepository.replace (non-zero amounts only)
     """
-    payable_amount = safe_float(data.get('payable_amount', 0), 0)
-
-    # Sum all instalment amounts
-    total_paid = 0.0
-    for i in range(1, 6):
-        instalment_amount = safe_float(data.get(f'instalment_{i}_amount', 0), 0)
-        total_paid += instalment_amount
-
-    total_paid = round(total_paid, 2)
-    balance_amount = round(payable_amount - total_paid, 2)
-
-    return total_paid, balance_amount
-
-
-def calculate_fields(data):
-    """Calculate all computed fields with NEW weight & rate system"""
-    net_weight_kg = safe_float(data.get('net_weight_kg', 0), 0)
-    gunny_weight_kg = safe_float(data.get('gunny_weight_kg', 0), 0)
-    bags = safe_float(data.get('bags', 0), 0)
-    rate_basis = data.get('rate_basis', 'Quintal')
-    rate_value = safe_float(data.get('rate_value', 0), 0)
-
-    bank_commission = safe_float(data.get('bank_commission', 0), 0)
-    postage = safe_float(data.get('postage', 0), 0)
-    freight = safe_float(data.get('freight', 0), 0)
-    rate_diff = safe_float(data.get('rate_diff', 0), 0)
-    quality_diff = safe_float(data.get('quality_diff', 0), 0)
-    moisture_ded = safe_float(data.get('moisture_ded', 0), 0)
-    tds = safe_float(data.get('tds', 0), 0)
-    batav_percent = safe_float(data.get('batav_percent', 0), 0)
-    shortage_percent = safe_float(data.get('shortage_percent', 0), 0)
-    dalali_rate = safe_float(data.get('dalali_rate', 0), 0)
-    hammali_rate = safe_float(data.get('hammali_rate', 0), 0)
-
-    final_weight_kg = round(max(0, net_weight_kg - gunny_weight_kg), 2)
-    weight_quintal = round(final_weight_kg / 100, 3)
-    weight_khandi = round(final_weight_kg / 150, 3)
-    avg_bag_weight = round(final_weight_kg / bags, 2) if bags > 0 else 0
-
-    if rate_basis == 'Quintal':
-        total_purchase_amount = round(weight_quintal * rate_value, 2)
-    elif rate_basis == 'Khandi':
-        total_purchase_amount = round(weight_khandi * rate_value, 2)
-    else:
-        total_purchase_amount = 0
-
-    batav = round(total_purchase_amount * (batav_percent / 100), 2) if batav_percent > 0 else 0
-    shortage = round(total_purchase_amount * (shortage_percent / 100), 2) if shortage_percent > 0 else 0
-
-    # NEW CALCULATION: Dalali & Hamali based on Net Weight KG / 100
-    dalali = round((net_weight_kg / 100) * dalali_rate, 2) if dalali_rate > 0 else 0
-    hammali = round((net_weight_kg / 100) * hammali_rate, 2) if hammali_rate > 0 else 0
-
-    total_deduction = round(bank_commission + postage + batav + shortage + dalali + hammali + freight + rate_diff + quality_diff + moisture_ded + tds, 2)
-    payable_amount = round(total_purchase_amount - total_deduction, 2)
-
-    data.update({
-        'net_weight_kg': net_weight_kg,
-        'gunny_weight_kg': gunny_weight_kg,
-        'final_weight_kg': final_weight_kg,
-        'weight_quintal': weight_quintal,
-        'weight_khandi': weight_khandi,
-        'avg_bag_weight': avg_bag_weight,
-        'rate_basis': rate_basis,
-        'rate_value': rate_value,
-        'total_purchase_amount': total_purchase_amount,
-        'batav': batav,
-        'shortage': shortage,
-        'dalali': dalali,
-        'hammali': hammali,
-        'freight': freight,
-        'rate_diff': rate_diff,
-        'quality_diff': quality_diff,
-        'moisture_ded': moisture_ded,
-        'tds': tds,
-        'postage': postage,
-        'total_deduction': total_deduction,
-        'payable_amount': payable_amount
-    })
-    return data
+    items = data.get('payments')
+    if items is not None:
+        if not isinstance(items, list):
+            raise ValueError('payments must be a list')
+        if len(items) > INSTALMENT_COUNT:
+            raise ValueError(f'A slip can have at most {INSTALMENT_COUNT} payments')
+        for i in range(1, INSTALMENT_COUNT + 1):
+            item = items[i - 1] if i <= len(items) else {}
+            if not isinstance(item, dict):
+                raise ValueError('Each payment must be an object')
+            for column, suffix in PAYMENT_INSTALMENT_FIELDS:
+                data[f'instalment_{i}_{suffix}'] = item.get(column, 0 if column == 'amount' else '')
+
+    payments = []
+    for i in range(1, INSTALMENT_COUNT + 1):
+        amount = safe_float(data.get(f'instalment_{i}_amount', 0), 0)
+        if amount == 0:
+            continue
+        payments.append({
+            'seq': i,
+            'paid_on': parse_datetime_to_ist(data.get(f'instalment_{i}_date')),
+            'amount': amount,
+            'method': data.get(f'instalment_{i}_payment_method') or None,
+            'bank_account': data.get(f'instalment_{i}_payment_bank_account') or None,
+            'comment': data.get(f'instalment_{i}_comment') or None,
+        })
+
+    data['total_paid'] = round(sum(payment['amount'] for payment in payments), 2)
+    return payments
+
+
+def encode_list_cursor(after_id):
+    """Opaque cursor for the next keyset page of GET /api/slips"""
+    payload = json.dumps({'after_id': after_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+def decode_list_cursor(cursor):
+    """
+    Returns:
+        int: after_id stored in the cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))['after_id']
+        return int(after_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def queue_pdf_prerender(slip_id):
+    """Queue a background PDF render after a save so the PDF is ready when opened"""
+    if not load_pdf_service():
+        return
+    try:
+        enqueue_prerender(slip_id)
+    except Exception as e:
+        logger.warning(f"Could not queue PDF pre-render for slip {slip_id}: {e}")
 
 @slips_bp.route('/api/add-slip', methods=['POST'])
 def add_slip():
-    """Add a new purchase slip with structured instalments"""
-    conn = None
-    cursor = None
+    """
+    Add a new purchase slip with structured instalments
+
+    With an Idempotency-Key header a retried submit returns the original 201
+    response instead of saving the slip twice (see idempotency.py).
+    """
     try:
         data = request.json
-        print("[DEBUG] Incoming slip data:", {k: v for k, v in data.items() if k in ['party_name', 'date', 'bags', 'net_weight_kg']})
-        data = calculate_fields(data)
+        logger.debug("Incoming slip data: %s", {k: v for k, v in data.items() if k in ['party_name', 'date', 'bags', 'net_weight_kg']})
 
-        bill_no = get_next_bill_no()
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key is not None:
+            idempotency_key = validate_key(idempotency_key)
+            request_hash = request_fingerprint('add-slip', data)
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        data = calculate_fields(data)
+        payments = resolve_payments(data)
 
         slip_date = parse_datetime_to_ist(data.get('date')) or get_ist_datetime()
+        fiscal_year = fiscal_year_of(slip_date)
+
+        with transaction() as session:
+            slips = SlipRepository(session)
+
+            # DUPLICATE SUBMISSION PREVENTION: replay the stored response of a retried submit
+            if idempotency_key is not None:
+                keys = IdempotencyRepository(session)
+                stored = keys.claim(
+                    idempotency_key, 'add-slip', request_hash, get_idempotency_settings()['ttl_hours']
+                )
+                if stored is not None:
+                    logger.info(f"Replayed saved response for {IDEMPOTENCY_HEADER} {idempotency_key}")
+                    response = jsonify(stored['response_body'])
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return response, stored['response_code']
+
+            logger.debug(f"Calculated fields: payable={data.get('payable_amount')}, total_purchase={data.get('total_purchase_amount')}")
+
+            values = build_slip_values(data)
+            values['date'] = slip_date
+            bill_no = get_bill_number_allocator().allocate(session, fiscal_year)
+            slip_id = slips.insert(values, bill_no, fiscal_year)
+            PaymentRepository(session).replace(slip_id, payments)
+            update_cells(session, added=cell_deltas(session, [slip_id]))
+
+            body = {
+                'success': True,
+                'message': 'Purchase slip saved successfully',
+                'slip_id': slip_id,
+                'bill_no': bill_no
+            }
+            if idempotency_key is not None:
+                keys.store_response(idempotency_key, 201, body)
 
-        # DUPLICATE SUBMISSION PREVENTION
-        # Check if an identical slip was submitted in the last 5 seconds
-        cursor.execute('''
-            SELECT COUNT(*) FROM purchase_slips
-            WHERE party_name = %s
-            AND date = %s
-            AND net_weight_kg = %s
-            AND total_purchase_amount = %s
-            AND created_at >= DATE_SUB(NOW(), INTERVAL 5 SECOND)
-        ''', (
-            data.get('party_name', ''),
-            slip_date,
-            safe_float(data.get('net_weight_kg')),
-            safe_float(data.get('total_purchase_amount'))
-        ))
-
-        duplicate_count = cursor.fetchone()[0]
-        if duplicate_count > 0:
-            conn.close()
-            print(f"[WARNING] Duplicate submission prevented: {data.get('party_name')}, {slip_date}")
-            return jsonify({
-                'success': False,
-                'message': 'Duplicate submission detected. This slip was already saved.'
-            }), 409  # 409 Conflict
-
-        print(f"[OK] Calculated fields: payable={data.get('payable_amount')}, total_purchase={data.get('total_purchase_amount')}")
-
-        cursor.execute('''
-            INSERT INTO purchase_slips (
-                company_name, company_address, company_gst_no, company_mobile_no, document_type, vehicle_no, date,
-                bill_no, party_name, mobile_number, material_name, ticket_no, broker,
-                terms_of_delivery, sup_inv_no, gst_no,
-                bags, avg_bag_weight,
-                net_weight_kg, gunny_weight_kg, final_weight_kg,
-                weight_quintal, weight_khandi,
-                rate_basis, rate_value, total_purchase_amount,
-                bank_commission, postage, batav_percent, batav,
-                shortage_percent, shortage, dalali_rate, dalali, hammali_rate,
-                hammali, freight, rate_diff, quality_diff, quality_diff_comment,
-                moisture_ded, moisture_ded_comment, moisture_percent, moisture_kg, tds, total_deduction, payable_amount,
-                instalment_1_date, instalment_1_amount, instalment_1_payment_method, instalment_1_payment_bank_account, instalment_1_comment,
-                instalment_2_date, instalment_2_amount, instalment_2_payment_method, instalment_2_payment_bank_account, instalment_2_comment,
-                instalment_3_date, instalment_3_amount, instalment_3_payment_method, instalment_3_payment_bank_account, instalment_3_comment,
-                instalment_4_date, instalment_4_amount, instalment_4_payment_method, instalment_4_payment_bank_account, instalment_4_comment,
-                instalment_5_date, instalment_5_amount, instalment_5_payment_method, instalment_5_payment_bank_account, instalment_5_comment,
-                prepared_by, authorised_sign, paddy_unloading_godown
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            data.get('company_name', ''),
-            data.get('company_address', ''),
-            data.get('company_gst_no', ''),
-            data.get('company_mobile_no', ''),
-            data.get('document_type', 'Purchase Slip'),
-            data.get('vehicle_no', ''),
-            slip_date,
-            bill_no,
-            data.get('party_name', ''),
-            data.get('mobile_number', ''),
-            data.get('material_name', ''),
-            data.get('ticket_no', ''),
-            data.get('broker', ''),
-            data.get('terms_of_delivery', ''),
-            data.get('sup_inv_no', ''),
-            data.get('gst_no', ''),
-            safe_float(data.get('bags', 0), 0),
-            safe_float(data.get('avg_bag_weight', 0), 0),
-            safe_float(data.get('net_weight_kg', 0), 0),
-            safe_float(data.get('gunny_weight_kg', 0), 0),
-            safe_float(data.get('final_weight_kg', 0), 0),
-            safe_float(data.get('weight_quintal', 0), 0),
-            safe_float(data.get('weight_khandi', 0), 0),
-            data.get('rate_basis', 'Quintal'),
-            safe_float(data.get('rate_value', 0), 0),
-            safe_float(data.get('total_purchase_amount', 0), 0),
-            safe_float(data.get('bank_commission', 0), 0),
-            safe_float(data.get('postage', 0), 0),
-            safe_float(data.get('batav_percent', 0), 0),
-            safe_float(data.get('batav', 0), 0),
-            safe_float(data.get('shortage_percent', 0), 0),
-            safe_float(data.get('shortage', 0), 0),
-            safe_float(data.get('dalali_rate', 0), 0),
-            safe_float(data.get('dalali', 0), 0),
-            safe_float(data.get('hammali_rate', 0), 0),
-            safe_float(data.get('hammali', 0), 0),
-            safe_float(data.get('freight', 0), 0),
-            safe_float(data.get('rate_diff', 0), 0),
-            safe_float(data.get('quality_diff', 0), 0),
-            data.get('quality_diff_comment', ''),
-            safe_float(data.get('moisture_ded', 0), 0),
-            data.get('moisture_ded_comment', ''),
-            safe_float(data.get('moisture_percent', 0), 0),
-            safe_float(data.get('moisture_kg', 0), 0),
-            safe_float(data.get('tds', 0), 0),
-            safe_float(data.get('total_deduction', 0), 0),
-            safe_float(data.get('payable_amount', 0), 0),
-            # Instalment 1
-            parse_datetime_to_ist(data.get('instalment_1_date')),
-            safe_float(data.get('instalment_1_amount', 0), 0),
-            data.get('instalment_1_payment_method', ''),
-            data.get('instalment_1_payment_bank_account', ''),
-            data.get('instalment_1_comment', ''),
-            # Instalment 2
-            parse_datetime_to_ist(data.get('instalment_2_date')),
-            safe_float(data.get('instalment_2_amount', 0), 0),
-            data.get('instalment_2_payment_method', ''),
-            data.get('instalment_2_payment_bank_account', ''),
-            data.get('instalment_2_comment', ''),
-            # Instalment 3
-            parse_datetime_to_ist(data.get('instalment_3_date')),
-            safe_float(data.get('instalment_3_amount', 0), 0),
-            data.get('instalment_3_payment_method', ''),
-            data.get('instalment_3_payment_bank_account', ''),
-            data.get('instalment_3_comment', ''),
-            # Instalment 4
-            parse_datetime_to_ist(data.get('instalment_4_date')),
-            safe_float(data.get('instalment_4_amount', 0), 0),
-            data.get('instalment_4_payment_method', ''),
-            data.get('instalment_4_payment_bank_account', ''),
-            data.get('instalment_4_comment', ''),
-            # Instalment 5
-            parse_datetime_to_ist(data.get('instalment_5_date')),
-            safe_float(data.get('instalment_5_amount', 0), 0),
-            data.get('instalment_5_payment_method', ''),
-            data.get('instalment_5_payment_bank_account', ''),
-            data.get('instalment_5_comment', ''),
-            data.get('prepared_by', ''),
-            data.get('authorised_sign', ''),
-            data.get('paddy_unloading_godown', '')
-        ))
-
-        slip_id = cursor.lastrowid
-        conn.commit()
-
-        print(f"[OK] Slip saved successfully: ID={slip_id}, Bill No={bill_no}")
+        slip_count_cache.adjust(1)
+        invalidate_dashboard_cache()
+        logger.info(f"Slip saved successfully: ID={slip_id}, Bill No={bill_no}")
+
+        queue_pdf_prerender(slip_id)
+
+        return jsonify(body), 201
+
+    except IdempotencyKeyMismatch as e:
+        logger.warning(f"{e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 422
+
+    except Exception as e:
+        logger.exception(f"Error adding slip: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+def prepare_import_record(record):
+    """
+    One uploaded row -> (values, payments, fiscal_year) for SlipImporter
+
+    Blank cells count as absent. date and party_name are required; bill_no is
+    ignored (numbers are allocated on import).
 
+    Raises:
+        ValueError: If the row is invalid
+    """
+    data = {key: value for key, value in record.items() if value not in (None, '')}
+
+    if not str(data.get('party_name', '')).strip():
+        raise ValueError('party_name is required')
+
+    for name, kind in SLIP_WRITE_COLUMNS:
+        if name not in data:
+            continue
+        if kind == 'number':
+            number = safe_float(data[name], None)
+            if number is None or not math.isfinite(number):
+                raise ValueError(f'{name} is not a number: {data[name]!r}')
+        elif kind == 'datetime' and parse_datetime_to_ist(data[name]) is None:
+            raise ValueError(f'{name} is not a valid date: {data[name]!r}')
+
+    slip_date = parse_datetime_to_ist(data.get('date'))
+    if slip_date is None:
+        raise ValueError('date is required')
+    if data.get('rate_basis', 'Quintal') not in RATE_BASES:
+        raise ValueError("rate_basis must be 'Quintal' or 'Khandi'")
+
+    data = calculate_fields(data)
+    payments = resolve_payments(data)
+    values = build_slip_values(data)
+    values['date'] = slip_date
+    return values, payments, fiscal_year_of(slip_date)
+
+@slips_bp.route('/api/slips/import', methods=['POST'])
+def import_slips():
+    """
+    Bulk import slips from a CSV (with header row) or NDJSON upload
+
+    Send the file as multipart field 'file' or as the raw request body. The format
+    comes from ?format=csv|ndjson, else from the file name / Content-Type. Columns
+    are the add-slip fields; invalid rows are skipped and listed in 'errors'
+    with their line number. See slip_import.py.
+    """
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'No file uploaded (multipart field "file")'
+                }), 400
+            stream, filename, mimetype = upload.stream, upload.filename, upload.mimetype
+        else:
+            stream, filename, mimetype = request.stream, None, request.mimetype
+
+        import_format = detect_format(request.args.get('format'), filename, mimetype)
+        settings = get_config_section('slip_import', IMPORT_DEFAULTS)
+        importer = SlipImporter(
+            prepare_import_record, batch_size=settings['batch_size'], max_errors=settings['max_errors']
+        )
+        result = importer.run(read_records(stream, import_format))
+
+        logger.info(f"Imported {result['imported']} of {result['rows']} row(s) "
+                    f"({result['failed']} failed) in {result['elapsed_seconds']}s")
         return jsonify({
             'success': True,
-            'message': 'Purchase slip saved successfully',
-            'slip_id': slip_id,
-            'bill_no': bill_no
-        }), 201
+            'message': f"Imported {result['imported']} of {result['rows']} row(s)",
+            'format': import_format,
+            **result
+        }), 200
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        logger.exception(f"Error importing slips: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@slips_bp.route('/api/calculate/batch', methods=['POST'])
+def calculate_slips_batch():
+    """
+    Preview the calculated fields of many slips without saving anything
+
+    Body: {"slips": [{...add-slip fields...}, ...]} (or just the list). Each
+    result holds the calculate_fields outputs plus total_paid_amount and
+    balance_amount, in request order.
+    """
+    try:
+        data = request.get_json(silent=True)
+        rows = data.get('slips') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('Send {"slips": [...]} with one object per slip')
+        if len(rows) > CALCULATE_BATCH_MAX_ROWS:
+            raise ValueError(f'At most {CALCULATE_BATCH_MAX_ROWS} slips per request')
+
+        results = calculate_batch(rows)
+        for row, result in zip(rows, results):
+            total_paid, balance_amount = calculate_payment_totals({**row, **result})
+            result['total_paid_amount'] = total_paid
+            result['balance_amount'] = balance_amount
+
+        return jsonify({
+            'success': True,
+            'engine': 'numpy' if NUMPY_AVAILABLE else 'python',
+            'count': len(results),
+            'results': results
+        }), 200
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
 
     except Exception as e:
-        print(f"[ERROR] Error adding slip: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Error calculating slips: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@slips_bp.route('/api/slips/export', methods=['GET'])
+def export_slips():
+    """
+    Download slips as CSV or XLSX, oldest first, streamed row by row
+
+    Query parameters (all optional):
+        format   csv (default) or xlsx
+        from     Date range (inclusive, YYYY-MM-DD)
+        to
+        party    Party name (exact, case-insensitive) - the party's ledger
+        columns  Comma-separated column names (default: see slip_export.py)
+    """
+    try:
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        columns = parse_columns(request.args.get('columns'))
+
+        bounds = {}
+        for arg in ('from', 'to'):
+            value = request.args.get(arg)
+            bounds[arg] = parse_datetime_to_ist(value)
+            if value and bounds[arg] is None:
+                raise ValueError(f'{arg} is not a valid date: {value}')
+        date_from = bounds['from']
+        date_to = bounds['to'] + timedelta(days=1) if bounds['to'] is not None else None
+        party = (request.args.get('party') or '').strip()
+
+    except ValueError as e:
         return jsonify({
             'success': False,
             'message': str(e)
         }), 400
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+    writer = iter_xlsx if export_format == 'xlsx' else iter_csv
+
+    def generate():
+        try:
+            with db_session() as session:
+                # The server waits on us while the client downloads; don't let it give up
+                session.execute(
+                    'SET SESSION net_write_timeout = %s', (EXPORT_NET_WRITE_TIMEOUT,), name='slips.export_timeout'
+                )
+                rows = SlipRepository(session).iter_export(columns, date_from, date_to, party)
+                try:
+                    yield from writer(rows, columns, format_ist_datetime)
+                finally:
+                    # Finish with the cursor before the connection goes back to the pool
+                    rows.close()
+        except GeneratorExit:
+            logger.info("Slip export cancelled by the client")
+            raise
+        except Exception as e:
+            logger.error(f"Slip export failed: {e}")
+            raise
+
+    response = Response(generate(), mimetype=EXPORT_FORMATS[export_format])
+    filename = export_filename(export_format, bounds['from'], bounds['to'], party)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @slips_bp.route('/api/slips', methods=['GET'])
 def get_slips():
-    """Get all purchase slips with calculated Total Paid and Balance - optimized for list view"""
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+    """
+    Get purchase slips with calculated Total Paid and Balance - optimized for list view
+
+    Two pagination modes (newest first):
+    - Keyset: ?mode=keyset&limit=50 for the first page, then ?cursor=<next_cursor>
+      (or ?after_id=<id>) for the next. Cost does not grow with depth.
+      Response has next_cursor / has_more.
+    - Page (legacy): ?page=N&limit=50 using OFFSET.
 
-        page = int(request.args.get('page', 1))
+    The total is a cached count refreshed in the background, not a COUNT(*) per call.
+    """
+    try:
         limit = int(request.args.get('limit', 50))
-        offset = (page - 1) * limit
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+
+        cursor = request.args.get('cursor')
+        after_id = request.args.get('after_id')
+        keyset = cursor is not None or after_id is not None or request.args.get('mode') == 'keyset'
+
+        if cursor is not None:
+            after_id = decode_list_cursor(cursor)
+        elif after_id is not None:
+            after_id = int(after_id)
+
+        with db_session() as session:
+            repo = SlipRepository(session)
+            if keyset:
+                # One extra row tells us whether another page exists
+                slips = repo.list_after(after_id, limit + 1)
+            else:
+                page = int(request.args.get('page', 1))
+                slips = repo.list_page(limit, (page - 1) * limit)
+
+        total_count = slip_count_cache.get()
+
+        has_more = False
+        if keyset and len(slips) > limit:
+            slips = slips[:limit]
+            has_more = True
+
+        for slip in slips:
+            total_paid, balance_amount = calculate_payment_totals(slip)
+            slip['total_paid_amount'] = total_paid
+            slip['balance_amount'] = balance_amount
+
+            if slip.get('date'):
+                slip['date'] = format_ist_datetime(slip['date'])
+
+        if keyset:
+            pagination = {
+                'mode': 'keyset',
+                'limit': limit,
+                'total': total_count,
+                'has_more': has_more,
+                'next_cursor': encode_list_cursor(slips[-1]['id']) if has_more else None
+            }
+        else:
+            pagination = {
+                'page': page,
+                'limit': limit,
+                'total': total_count,
+                'pages': (total_count + limit - 1) // limit
+            }
+
+        return jsonify({
+            'success': True,
+            'slips': slips,
+            'pagination': pagination
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error fetching slips: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+@slips_bp.route('/api/slips/search', methods=['GET'])
+def search_slips():
+    """
+    Server-side search over purchase slips (newest first, keyset paginated)
+
+    Query parameters (all optional, combined with AND):
+        party        Party name - prefix match ("ram" finds "Ram Lal")
+        match        "prefix" (default) or "fuzzy" (every word, any order, word prefixes)
+        vehicle_no   Vehicle number prefix, spaces/dashes ignored
+        broker       Broker name (exact, case-insensitive)
+        godown       Unloading godown (exact, case-insensitive)
+        bill_from    Bill number range (inclusive)
+        bill_to
+        from         Date range (inclusive, YYYY-MM-DD)
+        to
+        outstanding  1 = only slips with a balance still due
+        limit        Page size (default 50, max 500)
+        cursor       next_cursor from the previous page
+        explain      1 = return the MySQL query plan instead of rows (debug mode only)
+    """
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+
+        date_to = parse_datetime_to_ist(request.args.get('to'))
+        if date_to is not None:
+            date_to = date_to + timedelta(days=1)
+
+        bill_from = request.args.get('bill_from')
+        bill_to = request.args.get('bill_to')
+        match = request.args.get('match', 'prefix')
+        if match not in ('prefix', 'fuzzy'):
+            raise ValueError('match must be "prefix" or "fuzzy"')
+
+        filters = {
+            'party': request.args.get('party'),
+            'match': match,
+            'vehicle_no': request.args.get('vehicle_no'),
+            'broker': request.args.get('broker'),
+            'godown': request.args.get('godown'),
+            'bill_from': int(bill_from) if bill_from not in (None, '') else None,
+            'bill_to': int(bill_to) if bill_to not in (None, '') else None,
+            'date_from': parse_datetime_to_ist(request.args.get('from')),
+            'date_to': date_to,
+            'outstanding': request.args.get('outstanding') in ('1', 'true'),
+        }
 
-        cursor.execute('''
-            SELECT id, bill_no, date, party_name, mobile_number, final_weight_kg, rate_basis,
-                   payable_amount, instalment_1_amount, instalment_2_amount,
-                   instalment_3_amount, instalment_4_amount, instalment_5_amount
-            FROM purchase_slips
-            ORDER BY id DESC
-            LIMIT %s OFFSET %s
-        ''', (limit, offset))
-        slips = cursor.fetchall()
+        cursor = request.args.get('cursor')
+        after_id = decode_list_cursor(cursor) if cursor else None
 
-        cursor.execute('SELECT COUNT(*) as total FROM purchase_slips')
-        total_count = cursor.fetchone()['total']
+        with db_session() as session:
+            repo = SlipRepository(session)
+
+            if request.args.get('explain') in ('1', 'true'):
+                if not current_app.debug:
+                    return jsonify({
+                        'success': False,
+                        'message': 'explain is only available in debug mode'
+                    }), 403
+                sql, params = repo.build_search(filters, after_id, limit + 1)
+                return jsonify({
+                    'success': True,
+                    'sql': sql,
+                    'params': [str(param) for param in params],
+                    'plan': repo.explain_search(filters, after_id, limit + 1)
+                }), 200
+
+            # One extra row tells us whether another page exists
+            slips = repo.search(filters, after_id, limit + 1)
+
+        has_more = len(slips) > limit
+        slips = slips[:limit]
 
         for slip in slips:
             total_paid, balance_amount = calculate_payment_totals(slip)
@@ -398,36 +684,77 @@ def get_slips():
             'success': True,
             'slips': slips,
             'pagination': {
-                'page': page,
+                'mode': 'keyset',
                 'limit': limit,
-                'total': total_count,
-                'pages': (total_count + limit - 1) // limit
+                'has_more': has_more,
+                'next_cursor': encode_list_cursor(slips[-1]['id']) if has_more else None
             }
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        logger.error(f"Error searching slips: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@slips_bp.route('/api/outstanding', methods=['GET'])
+def get_outstanding():
+    """
+    Who do we still owe: parties with an unpaid balance, largest first
+
+    Query parameters:
+        party   optional party name prefix
+        limit   maximum number of parties (default 50, max 500)
+
+    Only slips with a stored balance > 0 are read (idx_balance_party).
+    """
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+
+        with db_session() as session:
+            rows = SlipRepository(session).outstanding_by_party(limit, request.args.get('party'))
+
+        parties = []
+        for row in rows:
+            parties.append({
+                'party_name': row['party_name'],
+                'bills': int(row['bills']),
+                'outstanding': round(float(row['outstanding'] or 0), 2),
+                'oldest_date': format_ist_datetime(row['oldest_date']) if row['oldest_date'] else None,
+                'ageing': {key: round(float(row[f'age_{key}'] or 0), 2) for key, _, _ in AGEING_BUCKETS},
+            })
+
+        return jsonify({
+            'success': True,
+            'parties': parties,
+            'total_outstanding': round(sum(party['outstanding'] for party in parties), 2)
+        }), 200
+
     except Exception as e:
-        print(f"Error fetching slips: {e}")
+        logger.error(f"Error fetching outstanding balances: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 400
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
 
 @slips_bp.route('/api/slip/<int:slip_id>', methods=['GET'])
 def get_slip(slip_id):
     """Get a single purchase slip by ID with calculated amounts"""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute('SELECT * FROM purchase_slips WHERE id = %s', (slip_id,))
-        slip = cursor.fetchone()
+        with db_session() as session:
+            slip = SlipRepository(session).get(slip_id)
+            if slip is not None:
+                slip['payments'] = PaymentRepository(session).list_for_slip(slip_id)
 
         if slip is None:
             return jsonify({
@@ -451,160 +778,61 @@ def get_slip(slip_id):
                 if isinstance(slip[field], datetime):
                     slip[field] = slip[field].strftime('%Y-%m-%d %H:%M:%S')
 
+        for payment in slip['payments']:
+            if isinstance(payment['paid_on'], datetime):
+                payment['paid_on'] = payment['paid_on'].strftime('%Y-%m-%d %H:%M:%S')
+
         return jsonify({
             'success': True,
             'slip': slip
         }), 200
 
     except Exception as e:
-        print(f"Error fetching slip: {e}")
+        logger.error(f"Error fetching slip: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 400
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @slips_bp.route('/api/slip/<int:slip_id>', methods=['PUT'])
 def update_slip(slip_id):
     """Update a purchase slip with structured instalments"""
-    conn = None
-    cursor = None
     try:
         data = request.json
 
-        # Get existing slip and merge with new data
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM purchase_slips WHERE id = %s', (slip_id,))
-        existing_slip = cursor.fetchone()
-        cursor.close()
+        with transaction() as session:
+            slips = SlipRepository(session)
+
+            # Lock the slip first, then read what it contributes to the rollup now
+            old_cells = cell_deltas(session, [slip_id], lock=True)
+
+            # Get existing slip and merge with new data
+            existing_slip = slips.get(slip_id)
+            if existing_slip is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Slip not found'
+                }), 404
 
-        if existing_slip:
             merged_data = dict(existing_slip)
             merged_data.update(data)
             merged_data = calculate_fields(merged_data)
-        else:
-            merged_data = calculate_fields(data)
-
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            UPDATE purchase_slips SET
-                company_name = %s, company_address = %s, company_gst_no = %s, company_mobile_no = %s, document_type = %s,
-                vehicle_no = %s, date = %s,
-                party_name = %s, mobile_number = %s, material_name = %s, ticket_no = %s, broker = %s,
-                terms_of_delivery = %s, sup_inv_no = %s, gst_no = %s,
-                bags = %s, avg_bag_weight = %s,
-                net_weight_kg = %s, gunny_weight_kg = %s, final_weight_kg = %s,
-                weight_quintal = %s, weight_khandi = %s,
-                rate_basis = %s, rate_value = %s, total_purchase_amount = %s,
-                bank_commission = %s, postage = %s, batav_percent = %s, batav = %s,
-                shortage_percent = %s, shortage = %s, dalali_rate = %s, dalali = %s,
-                hammali_rate = %s, hammali = %s, freight = %s, rate_diff = %s,
-                quality_diff = %s, quality_diff_comment = %s, moisture_ded = %s, moisture_ded_comment = %s,
-                moisture_percent = %s, moisture_kg = %s, tds = %s, total_deduction = %s, payable_amount = %s,
-                instalment_1_date = %s, instalment_1_amount = %s, instalment_1_payment_method = %s, instalment_1_payment_bank_account = %s, instalment_1_comment = %s,
-                instalment_2_date = %s, instalment_2_amount = %s, instalment_2_payment_method = %s, instalment_2_payment_bank_account = %s, instalment_2_comment = %s,
-                instalment_3_date = %s, instalment_3_amount = %s, instalment_3_payment_method = %s, instalment_3_payment_bank_account = %s, instalment_3_comment = %s,
-                instalment_4_date = %s, instalment_4_amount = %s, instalment_4_payment_method = %s, instalment_4_payment_bank_account = %s, instalment_4_comment = %s,
-                instalment_5_date = %s, instalment_5_amount = %s, instalment_5_payment_method = %s, instalment_5_payment_bank_account = %s, instalment_5_comment = %s,
-                prepared_by = %s, authorised_sign = %s, paddy_unloading_godown = %s
-            WHERE id = %s
-        ''', (
-            merged_data.get('company_name', ''),
-            merged_data.get('company_address', ''),
-            merged_data.get('company_gst_no', ''),
-            merged_data.get('company_mobile_no', ''),
-            merged_data.get('document_type', 'Purchase Slip'),
-            merged_data.get('vehicle_no', ''),
-            parse_datetime_to_ist(merged_data.get('date')),
-            merged_data.get('party_name', ''),
-            merged_data.get('mobile_number', ''),
-            merged_data.get('material_name', ''),
-            merged_data.get('ticket_no', ''),
-            merged_data.get('broker', ''),
-            merged_data.get('terms_of_delivery', ''),
-            merged_data.get('sup_inv_no', ''),
-            merged_data.get('gst_no', ''),
-            safe_float(merged_data.get('bags', 0), 0),
-            safe_float(merged_data.get('avg_bag_weight', 0), 0),
-            safe_float(merged_data.get('net_weight_kg', 0), 0),
-            safe_float(merged_data.get('gunny_weight_kg', 0), 0),
-            safe_float(merged_data.get('final_weight_kg', 0), 0),
-            safe_float(merged_data.get('weight_quintal', 0), 0),
-            safe_float(merged_data.get('weight_khandi', 0), 0),
-            merged_data.get('rate_basis', 'Quintal'),
-            safe_float(merged_data.get('rate_value', 0), 0),
-            safe_float(merged_data.get('total_purchase_amount', 0), 0),
-            safe_float(merged_data.get('bank_commission', 0), 0),
-            safe_float(merged_data.get('postage', 0), 0),
-            safe_float(merged_data.get('batav_percent', 0), 0),
-            safe_float(merged_data.get('batav', 0), 0),
-            safe_float(merged_data.get('shortage_percent', 0), 0),
-            safe_float(merged_data.get('shortage', 0), 0),
-            safe_float(merged_data.get('dalali_rate', 0), 0),
-            safe_float(merged_data.get('dalali', 0), 0),
-            safe_float(merged_data.get('hammali_rate', 0), 0),
-            safe_float(merged_data.get('hammali', 0), 0),
-            safe_float(merged_data.get('freight', 0), 0),
-            safe_float(merged_data.get('rate_diff', 0), 0),
-            safe_float(merged_data.get('quality_diff', 0), 0),
-            merged_data.get('quality_diff_comment', ''),
-            safe_float(merged_data.get('moisture_ded', 0), 0),
-            merged_data.get('moisture_ded_comment', ''),
-            safe_float(merged_data.get('moisture_percent', 0), 0),
-            safe_float(merged_data.get('moisture_kg', 0), 0),
-            safe_float(merged_data.get('tds', 0), 0),
-            safe_float(merged_data.get('total_deduction', 0), 0),
-            safe_float(merged_data.get('payable_amount', 0), 0),
-            # Instalment 1
-            parse_datetime_to_ist(merged_data.get('instalment_1_date')),
-            safe_float(merged_data.get('instalment_1_amount', 0), 0),
-            merged_data.get('instalment_1_payment_method', ''),
-            merged_data.get('instalment_1_payment_bank_account', ''),
-            merged_data.get('instalment_1_comment', ''),
-            # Instalment 2
-            parse_datetime_to_ist(merged_data.get('instalment_2_date')),
-            safe_float(merged_data.get('instalment_2_amount', 0), 0),
-            merged_data.get('instalment_2_payment_method', ''),
-            merged_data.get('instalment_2_payment_bank_account', ''),
-            merged_data.get('instalment_2_comment', ''),
-            # Instalment 3
-            parse_datetime_to_ist(merged_data.get('instalment_3_date')),
-            safe_float(merged_data.get('instalment_3_amount', 0), 0),
-            merged_data.get('instalment_3_payment_method', ''),
-            merged_data.get('instalment_3_payment_bank_account', ''),
-            merged_data.get('instalment_3_comment', ''),
-            # Instalment 4
-            parse_datetime_to_ist(merged_data.get('instalment_4_date')),
-            safe_float(merged_data.get('instalment_4_amount', 0), 0),
-            merged_data.get('instalment_4_payment_method', ''),
-            merged_data.get('instalment_4_payment_bank_account', ''),
-            merged_data.get('instalment_4_comment', ''),
-            # Instalment 5
-            parse_datetime_to_ist(merged_data.get('instalment_5_date')),
-            safe_float(merged_data.get('instalment_5_amount', 0), 0),
-            merged_data.get('instalment_5_payment_method', ''),
-            merged_data.get('instalment_5_payment_bank_account', ''),
-            merged_data.get('instalment_5_comment', ''),
-            merged_data.get('prepared_by', ''),
-            merged_data.get('authorised_sign', ''),
-            merged_data.get('paddy_unloading_godown', ''),
-            slip_id
-        ))
-
-        conn.commit()
+            payments = resolve_payments(merged_data)
+
+            slips.update(slip_id, build_slip_values(merged_data))
+            PaymentRepository(session).replace(slip_id, payments)
+            update_cells(session, old_cells, cell_deltas(session, [slip_id]))
+
+        invalidate_dashboard_cache()
 
         # Invalidate PDF cache after update
-        if PDF_SERVICE_AVAILABLE:
+        if load_pdf_service():
             try:
                 invalidate_cache(slip_id)
             except Exception as e:
-                print(f"[WARNING] Could not invalidate cache: {e}")
+                logger.warning(f"Could not invalidate cache: {e}")
+
+        queue_pdf_prerender(slip_id)
 
         return jsonify({
             'success': True,
@@ -613,28 +841,30 @@ def update_slip(slip_id):
         }), 200
 
     except Exception as e:
-        print(f"Error updating slip: {e}")
+        logger.error(f"Error updating slip: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 400
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @slips_bp.route('/api/slip/<int:slip_id>', methods=['DELETE'])
 def delete_slip(slip_id):
     """Delete a purchase slip"""
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with transaction() as session:
+            old_cells = cell_deltas(session, [slip_id], lock=True)
+            deleted = SlipRepository(session).delete(slip_id)
+            update_cells(session, removed=old_cells)
+
+        slip_count_cache.adjust(-deleted)
+        invalidate_dashboard_cache()
 
-        cursor.execute('DELETE FROM purchase_slips WHERE id = %s', (slip_id,))
-        conn.commit()
+        # Drop cached PDFs for the deleted slip
+        if load_pdf_service():
+            try:
+                invalidate_cache(slip_id)
+            except Exception as e:
+                logger.warning(f"Could not invalidate cache: {e}")
 
         return jsonify({
             'success': True,
@@ -642,16 +872,11 @@ def delete_slip(slip_id):
         }), 200
 
     except Exception as e:
-        print(f"Error deleting slip: {e}")
+        logger.error(f"Error deleting slip: {e}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 400
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 @slips_bp.route('/api/slip/<int:slip_id>/pdf', methods=['GET'])
 def generate_slip_pdf(slip_id):
@@ -659,101 +884,344 @@ def generate_slip_pdf(slip_id):
     Generate PDF for a purchase slip using centralized PDF service
     Returns PDF file for download or browser display
     """
-    if not PDF_SERVICE_AVAILABLE:
+    if not load_pdf_service():
         return jsonify({
             'success': False,
             'message': 'PDF generation service is not available. Please install Playwright: pip install playwright && playwright install chromium'
         }), 500
 
     try:
-        print(f"[INFO] Generating PDF for slip ID: {slip_id}")
-
-        # Generate PDF using centralized service
-        pdf_bytes = generate_purchase_slip_pdf(slip_id)
+        logger.debug(f"Generating PDF for slip ID: {slip_id}")
 
-        # Get slip data for filename
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT party_name, bill_no FROM purchase_slips WHERE id = %s', (slip_id,))
-        slip = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if slip:
-            filename = get_pdf_filename(slip)
-        else:
-            filename = f'purchase_slip_{slip_id}.pdf'
-
-        # Return PDF file
-        return send_file(
-            pdf_bytes,
+        slip = fetch_slip(slip_id)
+        if not slip:
+            raise ValueError(f'Slip with ID {slip_id} not found')
+
+        # ETag is the content hash of slip row + template version, so a browser
+        # holding the current version can revalidate without any rendering
+        etag = get_slip_pdf_key(slip)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        force_regenerate = request.args.get('regenerate') in ('1', 'true')
+        pdf_bytes, etag, rendered_at = render_slip_pdf(slip, force_regenerate)
+
+        filename = get_pdf_filename(slip)
+
+        # Return PDF file (conditional: honours If-None-Match / If-Modified-Since)
+        response = send_file(
+            BytesIO(pdf_bytes),
             mimetype='application/pdf',
             as_attachment=False,  # Display in browser, not download
-            download_name=filename
+            download_name=filename,
+            etag=etag,
+            last_modified=rendered_at,
+            conditional=True
         )
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
 
     except ValueError as e:
-        print(f"[ERROR] Slip not found: {e}")
+        logger.error(f"Slip not found: {e}")
         return jsonify({
             'success': False,
             'message': 'Slip not found'
         }), 404
 
     except Exception as e:
-        print(f"[ERROR] Error generating PDF: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error generating PDF: {e}")
         return jsonify({
             'success': False,
             'message': f'Failed to generate PDF: {str(e)}'
         }), 500
 
+@slips_bp.route('/api/slip/<int:slip_id>/pdf/jobs', methods=['POST'])
+def create_pdf_job(slip_id):
+    """
+    Queue a background PDF render for a slip
+    Returns 202 with the job; poll status_url, then fetch download_url when done
+    """
+    if not load_pdf_service():
+        return jsonify({
+            'success': False,
+            'message': 'PDF generation service is not available. Please install Playwright: pip install playwright && playwright install chromium'
+        }), 500
+
+    try:
+        queue = get_pdf_job_queue()
+        if queue is None:
+            return jsonify({
+                'success': False,
+                'message': 'PDF job queue is disabled (enable pdf_jobs and pdf_cache in config.json)'
+            }), 503
+
+        job = queue.enqueue(slip_id)
+        return jsonify({
+            'success': True,
+            'job': job_to_response(job)
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Error queueing PDF job: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to queue PDF job: {str(e)}'
+        }), 500
+
+
+@slips_bp.route('/api/pdf-jobs/<job_id>', methods=['GET'])
+def get_pdf_job(job_id):
+    """Status of a background PDF job (queued / running / done / failed)"""
+    queue = get_pdf_job_queue() if load_pdf_service() else None
+    if queue is None:
+        return jsonify({
+            'success': False,
+            'message': 'PDF job queue is not available'
+        }), 503
+
+    job = queue.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job': job_to_response(job)
+    }), 200
+
+
+@slips_bp.route('/api/pdf-jobs/<job_id>/download', methods=['GET'])
+def download_pdf_job(job_id):
+    """Serve the PDF produced by a finished job"""
+    queue = get_pdf_job_queue() if load_pdf_service() else None
+    if queue is None:
+        return jsonify({
+            'success': False,
+            'message': 'PDF job queue is not available'
+        }), 503
+
+    job = queue.get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+
+    if job['status'] != 'done':
+        return jsonify({
+            'success': False,
+            'message': f"Job is {job['status']}",
+            'job': job_to_response(job)
+        }), 409
+
+    artifact = get_job_pdf(job)
+    if artifact is None:
+        return jsonify({
+            'success': False,
+            'message': 'PDF for this job is no longer cached - queue a new job',
+            'job': job_to_response(job)
+        }), 410
+
+    pdf_bytes, rendered_at = artifact
+    slip = fetch_slip(job['slip_id'])
+    filename = get_pdf_filename(slip) if slip else f"purchase_slip_{job['slip_id']}.pdf"
+
+    response = send_file(
+        BytesIO(pdf_bytes),
+        mimetype='application/pdf',
+        as_attachment=False,
+        download_name=filename,
+        etag=job['cache_key'],
+        last_modified=rendered_at,
+        conditional=True
+    )
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@slips_bp.route('/api/slips/pdf-batch', methods=['POST'])
+def export_pdf_batch():
+    """
+    Render many slips at once and return a ZIP (streamed) or one merged PDF
+
+    Request body:
+    {
+        "ids": [1, 2, 3],                 (optional - takes precedence over filters)
+        "from": "2024-04-01",             (optional, inclusive)
+        "to": "2024-04-30",               (optional, inclusive)
+        "party_name": "Ram Lal",          (optional, exact match)
+        "format": "zip" or "pdf",         (default "zip")
+        "batch_id": "month-end-april"     (optional, lets the client poll progress)
+    }
+
+    Progress: GET /api/slips/pdf-batch/<batch_id> (ID also returned in X-Batch-Id)
+
+    Failed slips: listed in errors.txt inside the ZIP; for the merged PDF they
+    are left out and their IDs returned in X-Failed-Slips (comma-separated),
+    and the request fails with 500 if no slip could be rendered
+    """
+    if not load_pdf_service():
+        return jsonify({
+            'success': False,
+            'message': 'PDF generation service is not available. Please install Playwright: pip install playwright && playwright install chromium'
+        }), 500
+
+    try:
+        data = request.get_json(silent=True) or {}
+        output_format = data.get('format', 'zip')
+        max_slips = int(get_config_section('pdf', {'batch_max_slips': 1000})['batch_max_slips'])
+
+        if output_format not in ('zip', 'pdf'):
+            return jsonify({
+                'success': False,
+                'message': 'format must be "zip" or "pdf"'
+            }), 400
+
+        if output_format == 'pdf' and not is_merge_available():
+            return jsonify({
+                'success': False,
+                'message': 'Merged PDF export requires pypdf: pip install pypdf (use format "zip" instead)'
+            }), 400
+
+        slip_ids = data.get('ids') or []
+        if not isinstance(slip_ids, list):
+            return jsonify({
+                'success': False,
+                'message': 'ids must be a list of slip IDs'
+            }), 400
+        try:
+            slip_ids = sorted({int(slip_id) for slip_id in slip_ids})
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'ids must be a list of slip IDs'
+            }), 400
+
+        date_from = parse_datetime_to_ist(data.get('from'))
+        date_to = parse_datetime_to_ist(data.get('to'))
+        if date_to is not None:
+            date_to = date_to + timedelta(days=1)
+        party_name = (data.get('party_name') or '').strip()
+
+        if not slip_ids and date_from is None and date_to is None and not party_name:
+            return jsonify({
+                'success': False,
+                'message': 'Provide ids or at least one of from / to / party_name'
+            }), 400
+
+        if len(slip_ids) > max_slips:
+            return jsonify({
+                'success': False,
+                'message': f'Too many slips requested (max {max_slips} per batch)'
+            }), 400
+
+        # One query for the whole batch; one extra row tells us the filter is too wide
+        slips = fetch_slips(slip_ids or None, date_from, date_to, party_name, limit=max_slips + 1)
+        if len(slips) > max_slips:
+            return jsonify({
+                'success': False,
+                'message': f'Filter matches more than {max_slips} slips - narrow the date range'
+            }), 400
+        if not slips:
+            return jsonify({
+                'success': False,
+                'message': 'No slips match the request'
+            }), 404
+
+        progress = create_batch(len(slips), output_format, data.get('batch_id'))
+        logger.info(f"Batch PDF export {progress.batch_id}: {len(slips)} slip(s) as {output_format}")
+
+        if output_format == 'zip':
+            response = Response(stream_zip(slips, progress), mimetype='application/zip')
+            response.headers['Content-Disposition'] = f'attachment; filename="purchase_slips_{progress.batch_id}.zip"'
+        else:
+            response = send_file(
+                BytesIO(build_merged_pdf(slips, progress)),
+                mimetype='application/pdf',
+                as_attachment=True,
+                download_name=f'purchase_slips_{progress.batch_id}.pdf'
+            )
+            if progress.failed:
+                response.headers['X-Failed-Slips'] = failed_slip_ids(progress)
+        response.headers['X-Batch-Id'] = progress.batch_id
+        return response
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        logger.exception(f"Error exporting PDF batch: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'Failed to export PDFs: {str(e)}'
+        }), 500
+
+
+@slips_bp.route('/api/slips/pdf-batch/<batch_id>', methods=['GET'])
+def get_pdf_batch_progress(batch_id):
+    """Progress of a batch PDF export (rendered / failed / total)"""
+    if not load_pdf_service():
+        return jsonify({
+            'success': False,
+            'message': 'PDF generation service is not available'
+        }), 500
+
+    progress = get_batch(batch_id)
+    if progress is None:
+        return jsonify({
+            'success': False,
+            'message': 'Batch not found'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'batch': progress.to_dict()
+    }), 200
+
 @slips_bp.route('/print/<int:slip_id>')
 def print_slip(slip_id):
     """
     Render print template for a slip with calculated amounts
     NOTE: This route is kept for backward compatibility but should not be used
     New workflow: Use /api/slip/<id>/pdf to generate PDF directly
+
+    Renders through the same shared Jinja environment and slip preparation as the
+    PDF pipeline (pdf_service.render_slip_html), so both outputs stay identical
     """
-    conn = None
-    cursor = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+    if not load_pdf_service():
+        return "Print rendering service is not available", 500
 
-        cursor.execute('SELECT * FROM purchase_slips WHERE id = %s', (slip_id,))
-        slip = cursor.fetchone()
+    try:
+        slip = fetch_slip(slip_id)
 
         if slip is None:
             return "Slip not found", 404
 
-        # Calculate Total Paid and Balance for print
-        total_paid, balance_amount = calculate_payment_totals(slip)
-        slip['total_paid_amount'] = total_paid
-        slip['balance_amount'] = balance_amount
-
-        # Format all datetime fields to IST for printing
-        datetime_fields = ['date', 'payment_date', 'payment_due_date',
-                          'instalment_1_date', 'instalment_2_date', 'instalment_3_date',
-                          'instalment_4_date', 'instalment_5_date']
-
-        for field in datetime_fields:
-            if slip.get(field):
-                slip[f'{field}_formatted'] = format_ist_datetime(slip[field])
-
         # Get logo path for the print template
         logo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'desktop', 'assets', 'spslogo.png'))
 
-        return render_template('print_template_new.html', slip=slip, logo_path=logo_path)
+        # Use the locally served font instead of fonts.gstatic.com (works offline)
+        return render_slip_html(
+            slip,
+            logo_path=logo_path,
+            font_src='/fonts/NotoSansDevanagari-Regular.ttf',
+            font_format='truetype'
+        )
 
     except Exception as e:
-        print(f"Error rendering print: {e}")
+        logger.error(f"Error rendering print: {e}")
         return str(e), 400
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 
 # ==================== WHATSAPP SHARING ====================
@@ -761,7 +1229,7 @@ def print_slip(slip_id):
 @slips_bp.route('/api/whatsapp/config', methods=['GET'])
 def get_whatsapp_config():
     """Get WhatsApp Business API configuration status and instructions"""
-    if not WHATSAPP_SERVICE_AVAILABLE:
+    if not load_whatsapp_service():
         return jsonify({
             'success': False,
             'message': 'WhatsApp service is not available'
@@ -793,7 +1261,7 @@ def share_slip_via_whatsapp(slip_id):
         "recipient_number": "919876543210" (optional, overrides party/broker number)
     }
     """
-    if not WHATSAPP_SERVICE_AVAILABLE:
+    if not load_whatsapp_service():
         return jsonify({
             'success': False,
             'message': 'WhatsApp service is not available. Please install requests library.'
@@ -806,19 +1274,13 @@ def share_slip_via_whatsapp(slip_id):
             'instructions': get_configuration_instructions()
         }), 400
 
-    conn = None
-    cursor = None
-
     try:
         data = request.json or {}
         recipient_type = data.get('recipient_type', 'party')  # 'party' or 'broker'
         recipient_number_override = data.get('recipient_number')
 
         # Fetch slip data
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute('SELECT * FROM purchase_slips WHERE id = %s', (slip_id,))
-        slip = cursor.fetchone()
+        slip = fetch_slip(slip_id)
 
         if not slip:
             return jsonify({
@@ -875,47 +1337,25 @@ def share_slip_via_whatsapp(slip_id):
         # return jsonify(result), 200
 
     except Exception as e:
-        print(f"[ERROR] Error sharing via WhatsApp: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Error sharing via WhatsApp: {e}")
         return jsonify({
             'success': False,
             'message': f'Failed to share via WhatsApp: {str(e)}'
         }), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
 
 # UNLOADING GODOWN DYNAMIC DROPDOWN APIs
 
 @slips_bp.route('/api/unloading-godowns', methods=['GET'])
 def get_unloading_godowns():
     """Get all unloading godown names for dropdown"""
-    print("\n" + "="*60)
-    print("[INFO] GET /api/unloading-godowns - Request received")
-    print("="*60)
-
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute('''
-            SELECT id, name
-            FROM unloading_godowns
-            ORDER BY name ASC
-        ''')
+        with db_session() as session:
+            godowns = GodownRepository(session).list_all()
 
-        godowns = cursor.fetchall()
-
-        print(f"[OK] Fetched {len(godowns)} unloading godowns")
+        logger.debug(f"Fetched {len(godowns)} unloading godowns")
         if godowns:
-            print(f"[INFO] Godown list: {[g['name'] for g in godowns]}")
+            logger.debug(f"Godown list: {[g['name'] for g in godowns]}")
 
         return jsonify({
             'success': True,
@@ -924,36 +1364,22 @@ def get_unloading_godowns():
 
     except Exception as e:
         error_msg = f"Error fetching unloading godowns: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(error_msg)
         return jsonify({
             'success': False,
             'message': error_msg
         }), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
 
 @slips_bp.route('/api/unloading-godowns', methods=['POST'])
 def add_unloading_godown():
     """Add a new unloading godown (or return existing if duplicate)"""
-    print("\n" + "="*60)
-    print("[INFO] POST /api/unloading-godowns - Request received")
-    print("="*60)
-
-    conn = None
-    cursor = None
     try:
         data = request.get_json()
-        print(f"[DEBUG] Request data: {data}")
+        logger.debug("Request data: %s", data)
 
         godown_name = data.get('name', '').strip()
-        print(f"[DEBUG] Godown name: '{godown_name}'")
+        logger.debug("Godown name: %r", godown_name)
 
         if not godown_name:
             return jsonify({
@@ -961,31 +1387,24 @@ def add_unloading_godown():
                 'message': 'Godown name is required'
             }), 400
 
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        with transaction() as session:
+            godowns = GodownRepository(session)
 
-        # Check if it already exists (MySQL uses %s placeholder)
-        cursor.execute('SELECT id, name FROM unloading_godowns WHERE name = %s', (godown_name,))
-        existing = cursor.fetchone()
-
-        if existing:
-            print(f"[OK] Godown '{godown_name}' already exists")
-            return jsonify({
-                'success': True,
-                'godown': {'id': existing['id'], 'name': existing['name']},
-                'message': 'Godown already exists'
-            }), 200
+            existing = godowns.find_by_name(godown_name)
 
-        # Insert new godown (MySQL uses %s placeholder)
-        cursor.execute('INSERT INTO unloading_godowns (name) VALUES (%s)', (godown_name,))
-        conn.commit()
+            if existing:
+                logger.debug(f"Godown '{godown_name}' already exists")
+                return jsonify({
+                    'success': True,
+                    'godown': {'id': existing['id'], 'name': existing['name']},
+                    'message': 'Godown already exists'
+                }), 200
 
-        new_id = cursor.lastrowid
-        print(f"[OK] Added new godown: {godown_name} (ID: {new_id})")
+            new_id = godowns.create(godown_name)
+            logger.info(f"Added new godown: {godown_name} (ID: {new_id})")
 
-        # Fetch all godowns to return updated list
-        cursor.execute('SELECT id, name FROM unloading_godowns ORDER BY name ASC')
-        all_godowns = cursor.fetchall()
+            # Return the updated list (read inside the same transaction)
+            all_godowns = godowns.list_all()
 
         return jsonify({
             'success': True,
@@ -996,316 +1415,68 @@ def add_unloading_godown():
 
     except Exception as e:
         error_msg = f"Error adding unloading godown: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(error_msg)
         return jsonify({
             'success': False,
             'message': error_msg
         }), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
 
 # ==================== DASHBOARD API ====================
 
 @slips_bp.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
-    """Get comprehensive dashboard data with analytics"""
-    print("\n" + "="*60)
-    print("[INFO] GET /api/dashboard - Dashboard data request")
-    print("="*60)
-
-    conn = None
-    cursor = None
+    """
+    Get comprehensive dashboard data with analytics
+    All widgets come from the daily rollup (see dashboard.py) and are cached per
+    period until the TTL expires or a slip is written (see dashboard_cache.py);
+    in debug mode the response also carries a per-widget timing breakdown
+    """
     try:
         period = request.args.get('period', 'month')
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Date filter based on period
-        date_filter = ""
-        if period == 'today':
-            date_filter = "AND DATE(date) = CURDATE()"
-        elif period == 'week':
-            date_filter = "AND date >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
-        elif period == 'month':
-            date_filter = "AND date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)"
-        elif period == 'year':
-            date_filter = "AND date >= DATE_SUB(CURDATE(), INTERVAL 365 DAY)"
-
-        # ===== METRICS =====
-        cursor.execute(f'''
-            SELECT
-                COALESCE(SUM(weight_quintal), 0) as totalPaddyQntl,
-                COALESCE(SUM(total_purchase_amount), 0) as totalPurchaseAmount,
-                COALESCE(SUM(total_deduction), 0) as totalDeductions,
-                COALESCE(SUM(payable_amount), 0) as netPayable,
-                COUNT(*) as totalBills
-            FROM purchase_slips
-            WHERE 1=1 {date_filter}
-        ''')
-        metrics = cursor.fetchone()
-
-        # Convert metrics to float
-        metrics['totalPaddyQntl'] = float(metrics['totalPaddyQntl']) if metrics['totalPaddyQntl'] else 0.0
-        metrics['totalPurchaseAmount'] = float(metrics['totalPurchaseAmount']) if metrics['totalPurchaseAmount'] else 0.0
-        metrics['totalDeductions'] = float(metrics['totalDeductions']) if metrics['totalDeductions'] else 0.0
-        metrics['netPayable'] = float(metrics['netPayable']) if metrics['netPayable'] else 0.0
-        metrics['totalBills'] = int(metrics['totalBills']) if metrics['totalBills'] else 0
-
-        # Calculate total paid from instalments
-        cursor.execute(f'''
-            SELECT COALESCE(SUM(
-                COALESCE(instalment_1_amount, 0) +
-                COALESCE(instalment_2_amount, 0) +
-                COALESCE(instalment_3_amount, 0) +
-                COALESCE(instalment_4_amount, 0) +
-                COALESCE(instalment_5_amount, 0)
-            ), 0) as totalPaid
-            FROM purchase_slips
-            WHERE 1=1 {date_filter}
-        ''')
-        paid_result = cursor.fetchone()
-        metrics['totalPaid'] = float(paid_result['totalPaid']) if paid_result['totalPaid'] else 0.0
-        metrics['totalOutstanding'] = float(metrics['netPayable'] - metrics['totalPaid'])
-
-        # Average effective rate
-        if metrics['totalPaddyQntl'] > 0:
-            metrics['avgEffectiveRate'] = float(metrics['netPayable'] / metrics['totalPaddyQntl'])
-        else:
-            metrics['avgEffectiveRate'] = 0.0
-
-        # ===== DAILY PURCHASE TREND =====
-        cursor.execute(f'''
-            SELECT DATE(date) as purchase_date, SUM(weight_quintal) as total_qntl
-            FROM purchase_slips
-            WHERE 1=1 {date_filter}
-            GROUP BY DATE(date)
-            ORDER BY purchase_date
-            LIMIT 30
-        ''')
-        daily_data = cursor.fetchall()
-        daily_purchase = {
-            'dates': [row['purchase_date'].strftime('%Y-%m-%d') if row['purchase_date'] else '' for row in daily_data],
-            'quantities': [float(row['total_qntl']) if row['total_qntl'] else 0 for row in daily_data]
-        }
-
-        # ===== RATE TREND =====
-        cursor.execute(f'''
-            SELECT DATE(date) as purchase_date,
-                   AVG(payable_amount / NULLIF(weight_quintal, 0)) as avg_rate
-            FROM purchase_slips
-            WHERE weight_quintal > 0 {date_filter}
-            GROUP BY DATE(date)
-            ORDER BY purchase_date
-            LIMIT 30
-        ''')
-        rate_data = cursor.fetchall()
-        rate_trend = {
-            'dates': [row['purchase_date'].strftime('%Y-%m-%d') if row['purchase_date'] else '' for row in rate_data],
-            'rates': [float(row['avg_rate']) if row['avg_rate'] else 0 for row in rate_data]
-        }
-
-        # ===== DEDUCTION BREAKDOWN =====
-        cursor.execute(f'''
-            SELECT
-                SUM(moisture_ded) as moisture,
-                SUM(quality_diff) as quality,
-                SUM(dalali) as dalali,
-                SUM(hammali) as hammali,
-                SUM(bank_commission) as commission,
-                SUM(freight) as freight
-            FROM purchase_slips
-            WHERE 1=1 {date_filter}
-        ''')
-        deduction_data = cursor.fetchone()
-        deductions = {
-            'labels': ['Moisture', 'Quality', 'Dalali', 'Hammali', 'Commission', 'Freight'],
-            'amounts': [
-                float(deduction_data['moisture']) if deduction_data['moisture'] else 0,
-                float(deduction_data['quality']) if deduction_data['quality'] else 0,
-                float(deduction_data['dalali']) if deduction_data['dalali'] else 0,
-                float(deduction_data['hammali']) if deduction_data['hammali'] else 0,
-                float(deduction_data['commission']) if deduction_data['commission'] else 0,
-                float(deduction_data['freight']) if deduction_data['freight'] else 0
-            ]
-        }
-
-        # ===== TOP SUPPLIERS =====
-        cursor.execute(f'''
-            SELECT party_name, SUM(weight_quintal) as total_qntl
-            FROM purchase_slips
-            WHERE party_name IS NOT NULL {date_filter}
-            GROUP BY party_name
-            ORDER BY total_qntl DESC
-            LIMIT 10
-        ''')
-        supplier_data = cursor.fetchall()
-        top_suppliers = {
-            'names': [row['party_name'] for row in supplier_data],
-            'quantities': [float(row['total_qntl']) if row['total_qntl'] else 0 for row in supplier_data]
-        }
-
-        # ===== OUTSTANDING AGEING =====
-        cursor.execute(f'''
-            SELECT
-                SUM(CASE WHEN DATEDIFF(CURDATE(), date) <= 7 THEN (payable_amount -
-                    (COALESCE(instalment_1_amount, 0) + COALESCE(instalment_2_amount, 0) +
-                     COALESCE(instalment_3_amount, 0) + COALESCE(instalment_4_amount, 0) +
-                     COALESCE(instalment_5_amount, 0))) ELSE 0 END) as age_0_7,
-                SUM(CASE WHEN DATEDIFF(CURDATE(), date) > 7 AND DATEDIFF(CURDATE(), date) <= 30
-                    THEN (payable_amount - (COALESCE(instalment_1_amount, 0) + COALESCE(instalment_2_amount, 0) +
-                          COALESCE(instalment_3_amount, 0) + COALESCE(instalment_4_amount, 0) +
-                          COALESCE(instalment_5_amount, 0))) ELSE 0 END) as age_7_30,
-                SUM(CASE WHEN DATEDIFF(CURDATE(), date) > 30 AND DATEDIFF(CURDATE(), date) <= 60
-                    THEN (payable_amount - (COALESCE(instalment_1_amount, 0) + COALESCE(instalment_2_amount, 0) +
-                          COALESCE(instalment_3_amount, 0) + COALESCE(instalment_4_amount, 0) +
-                          COALESCE(instalment_5_amount, 0))) ELSE 0 END) as age_30_60,
-                SUM(CASE WHEN DATEDIFF(CURDATE(), date) > 60
-                    THEN (payable_amount - (COALESCE(instalment_1_amount, 0) + COALESCE(instalment_2_amount, 0) +
-                          COALESCE(instalment_3_amount, 0) + COALESCE(instalment_4_amount, 0) +
-                          COALESCE(instalment_5_amount, 0))) ELSE 0 END) as age_60_plus
-            FROM purchase_slips
-            WHERE 1=1 {date_filter}
-        ''')
-        ageing_data = cursor.fetchone()
-        ageing = {
-            'amounts': [
-                float(ageing_data['age_0_7']) if ageing_data['age_0_7'] else 0,
-                float(ageing_data['age_7_30']) if ageing_data['age_7_30'] else 0,
-                float(ageing_data['age_30_60']) if ageing_data['age_30_60'] else 0,
-                float(ageing_data['age_60_plus']) if ageing_data['age_60_plus'] else 0
-            ]
-        }
-
-        # ===== PAYMENT MODE SPLIT =====
-        cursor.execute(f'''
-            SELECT
-                SUM(CASE WHEN instalment_1_payment_method = 'Cash' THEN instalment_1_amount ELSE 0 END +
-                    CASE WHEN instalment_2_payment_method = 'Cash' THEN instalment_2_amount ELSE 0 END +
-                    CASE WHEN instalment_3_payment_method = 'Cash' THEN instalment_3_amount ELSE 0 END +
-                    CASE WHEN instalment_4_payment_method = 'Cash' THEN instalment_4_amount ELSE 0 END +
-                    CASE WHEN instalment_5_payment_method = 'Cash' THEN instalment_5_amount ELSE 0 END) as cash_total,
-                SUM(CASE WHEN instalment_1_payment_method = 'Online Transfer' THEN instalment_1_amount ELSE 0 END +
-                    CASE WHEN instalment_2_payment_method = 'Online Transfer' THEN instalment_2_amount ELSE 0 END +
-                    CASE WHEN instalment_3_payment_method = 'Online Transfer' THEN instalment_3_amount ELSE 0 END +
-                    CASE WHEN instalment_4_payment_method = 'Online Transfer' THEN instalment_4_amount ELSE 0 END +
-                    CASE WHEN instalment_5_payment_method = 'Online Transfer' THEN instalment_5_amount ELSE 0 END) as online_total,
-                SUM(CASE WHEN instalment_1_payment_method = 'Cheque' THEN instalment_1_amount ELSE 0 END +
-                    CASE WHEN instalment_2_payment_method = 'Cheque' THEN instalment_2_amount ELSE 0 END +
-                    CASE WHEN instalment_3_payment_method = 'Cheque' THEN instalment_3_amount ELSE 0 END +
-                    CASE WHEN instalment_4_payment_method = 'Cheque' THEN instalment_4_amount ELSE 0 END +
-                    CASE WHEN instalment_5_payment_method = 'Cheque' THEN instalment_5_amount ELSE 0 END) as cheque_total
-            FROM purchase_slips
-            WHERE 1=1 {date_filter}
-        ''')
-        payment_mode_data = cursor.fetchone()
-        payment_mode = {
-            'modes': ['Cash', 'Online Transfer', 'Cheque'],
-            'amounts': [
-                float(payment_mode_data['cash_total']) if payment_mode_data['cash_total'] else 0,
-                float(payment_mode_data['online_total']) if payment_mode_data['online_total'] else 0,
-                float(payment_mode_data['cheque_total']) if payment_mode_data['cheque_total'] else 0
-            ]
-        }
+        cache_key = period if period in PERIOD_CONDITIONS else 'all'
 
-        # ===== GODOWN STOCK =====
-        cursor.execute(f'''
-            SELECT
-                COALESCE(paddy_unloading_godown, 'Unknown') as godown,
-                SUM(weight_quintal) as total_stock
-            FROM purchase_slips
-            WHERE paddy_unloading_godown IS NOT NULL {date_filter}
-            GROUP BY paddy_unloading_godown
-            ORDER BY total_stock DESC
-        ''')
-        godown_data = cursor.fetchall()
-        godown_stock = {
-            'godowns': [row['godown'] for row in godown_data] if godown_data else ['No Data'],
-            'quantities': [float(row['total_stock']) if row['total_stock'] else 0 for row in godown_data] if godown_data else [0]
-        }
+        cache = get_dashboard_cache()
+        widgets, generation = cache.get(cache_key) if cache is not None else (None, None)
+        timings = None
+        cache_status = 'HIT' if widgets is not None else 'MISS'
 
-        # ===== OUTSTANDING BY FARMER =====
-        cursor.execute(f'''
-            SELECT
-                party_name as farmerName,
-                SUM(total_purchase_amount) as totalPurchase,
-                SUM(COALESCE(instalment_1_amount, 0) + COALESCE(instalment_2_amount, 0) +
-                    COALESCE(instalment_3_amount, 0) + COALESCE(instalment_4_amount, 0) +
-                    COALESCE(instalment_5_amount, 0)) as totalPaid,
-                SUM(payable_amount - (COALESCE(instalment_1_amount, 0) + COALESCE(instalment_2_amount, 0) +
-                    COALESCE(instalment_3_amount, 0) + COALESCE(instalment_4_amount, 0) +
-                    COALESCE(instalment_5_amount, 0))) as outstanding,
-                MAX(GREATEST(
-                    COALESCE(instalment_1_date, '1900-01-01'),
-                    COALESCE(instalment_2_date, '1900-01-01'),
-                    COALESCE(instalment_3_date, '1900-01-01'),
-                    COALESCE(instalment_4_date, '1900-01-01'),
-                    COALESCE(instalment_5_date, '1900-01-01')
-                )) as lastPaymentDate,
-                DATEDIFF(CURDATE(), MAX(date)) as daysOverdue
-            FROM purchase_slips
-            WHERE party_name IS NOT NULL {date_filter}
-            GROUP BY party_name
-            HAVING outstanding > 0
-            ORDER BY outstanding DESC
-            LIMIT 20
-        ''')
-        outstanding_farmers = cursor.fetchall()
-
-        for farmer in outstanding_farmers:
-            # Convert numeric values to float
-            farmer['totalPurchase'] = float(farmer['totalPurchase']) if farmer['totalPurchase'] else 0.0
-            farmer['totalPaid'] = float(farmer['totalPaid']) if farmer['totalPaid'] else 0.0
-            farmer['outstanding'] = float(farmer['outstanding']) if farmer['outstanding'] else 0.0
-
-            if farmer['lastPaymentDate']:
-                last_date = farmer['lastPaymentDate']
-                if isinstance(last_date, str):
-                    if last_date != '1900-01-01':
-                        farmer['lastPaymentDate'] = last_date
-                    else:
-                        farmer['lastPaymentDate'] = None
-                else:
-                    if str(last_date) != '1900-01-01':
-                        farmer['lastPaymentDate'] = last_date.strftime('%Y-%m-%d')
-                    else:
-                        farmer['lastPaymentDate'] = None
-            else:
-                farmer['lastPaymentDate'] = None
+        if widgets is None:
+            with db_session() as session:
+                widgets, timings = build_dashboard(session, period, collect_timings=current_app.debug)
+            if cache is not None:
+                cache.put(cache_key, generation, widgets)
 
-        print(f"[OK] Dashboard data retrieved successfully for period: {period}")
+        logger.debug(f"Dashboard data retrieved successfully for period: {period} (cache {cache_status.lower()})")
 
-        return jsonify({
-            'success': True,
-            'metrics': metrics,
-            'dailyPurchase': daily_purchase,
-            'rateTrend': rate_trend,
-            'deductions': deductions,
-            'topSuppliers': top_suppliers,
-            'ageing': ageing,
-            'paymentMode': payment_mode,
-            'godownStock': godown_stock,
-            'outstanding': outstanding_farmers
-        })
+        response = {'success': True}
+        response.update(widgets)
+        if timings is not None:
+            response['timings'] = timings
+        response = jsonify(response)
+        response.headers['X-Cache'] = cache_status
+        return response
 
     except Exception as e:
         error_msg = f"Error fetching dashboard data: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(error_msg)
         return jsonify({
             'success': False,
             'message': error_msg
         }), 500
 
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+
+@slips_bp.route('/api/dashboard/cache-stats', methods=['GET'])
+def get_dashboard_cache_stats():
+    """Hit/miss counters of the dashboard response cache"""
+    cache = get_dashboard_cache()
+    if cache is None:
+        return jsonify({
+            'success': False,
+            'message': 'Dashboard cache is disabled'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'cache': cache.stats()
+    }), 200
@@ -4,6 +4,7 @@ Runs as a background thread to automatically backup MySQL database
 and upload to Google Drive at scheduled intervals.
 """
 
+import logging
 import os
 import json
 import subprocess
@@ -12,6 +13,8 @@ import time
 from datetime import datetime
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 # Backup configuration
 BACKUP_INTERVAL_HOURS = 24  # Run backup every 24 hours
 BACKUP_DIR = os.path.join(
@@ -31,7 +34,7 @@ def load_config():
         with open(config_path, 'r') as f:
             return json.load(f)
     except Exception as e:
-        print(f"[BACKUP] Error loading config: {e}")
+        logger.error(f"Error loading config: {e}")
         return None
 
 
@@ -57,14 +60,14 @@ def create_mysql_backup(db_config):
             result = subprocess.run(command, stdout=f, stderr=subprocess.PIPE, text=True)
 
         if result.returncode == 0:
-            print(f"[BACKUP] Database backup created: {backup_filepath}")
+            logger.info(f"Database backup created: {backup_filepath}")
             return backup_filepath
         else:
-            print(f"[BACKUP] mysqldump failed: {result.stderr}")
+            logger.error(f"mysqldump failed: {result.stderr}")
             return None
 
     except Exception as e:
-        print(f"[BACKUP] Error creating backup: {e}")
+        logger.error(f"Error creating backup: {e}")
         return None
 
 
@@ -113,27 +116,27 @@ def upload_to_google_drive(filepath):
                 fields='id,name'
             ).execute()
 
-            print(f"[BACKUP] Uploaded to Google Drive: {file.get('name')} (ID: {file.get('id')})")
+            logger.info(f"Uploaded to Google Drive: {file.get('name')} (ID: {file.get('id')})")
             return True
         else:
-            print("[BACKUP] No valid Google Drive credentials found. Backup saved locally only.")
+            logger.warning("No valid Google Drive credentials found. Backup saved locally only.")
             return False
 
     except ImportError:
-        print("[BACKUP] Google Drive API libraries not installed. Backup saved locally only.")
+        logger.warning("Google Drive API libraries not installed. Backup saved locally only.")
         return False
     except Exception as e:
-        print(f"[BACKUP] Error uploading to Google Drive: {e}")
+        logger.error(f"Error uploading to Google Drive: {e}")
         return False
 
 
 def perform_backup():
     """Perform full backup workflow: create dump + upload to Drive"""
-    print(f"\n[BACKUP] Starting automated backup at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"Starting automated backup at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     config = load_config()
     if not config or 'database' not in config:
-        print("[BACKUP] Failed to load database configuration")
+        logger.error("Failed to load database configuration")
         return False
 
     db_config = config['database']
@@ -141,26 +144,26 @@ def perform_backup():
     # Create MySQL backup
     backup_file = create_mysql_backup(db_config)
     if not backup_file:
-        print("[BACKUP] Failed to create database backup")
+        logger.error("Failed to create database backup")
         return False
 
     # Upload to Google Drive (optional - fails gracefully if not configured)
     upload_to_google_drive(backup_file)
 
-    print("[BACKUP] Backup process completed")
+    logger.info("Backup process completed")
     return True
 
 
 def backup_scheduler():
     """Background thread that runs backup at scheduled intervals"""
-    print(f"[BACKUP] Scheduler started - backups will run every {BACKUP_INTERVAL_HOURS} hours")
-    print(f"[BACKUP] Backup directory: {BACKUP_DIR}")
+    logger.info(f"Scheduler started - backups will run every {BACKUP_INTERVAL_HOURS} hours")
+    logger.info(f"Backup directory: {BACKUP_DIR}")
 
     while True:
         try:
             perform_backup()
         except Exception as e:
-            print(f"[BACKUP] Unexpected error in backup scheduler: {e}")
+            logger.error(f"Unexpected error in backup scheduler: {e}")
 
         # Wait for next backup interval
         time.sleep(BACKUP_INTERVAL_HOURS * 3600)
@@ -170,7 +173,7 @@ def start_backup_service():
     """Start the backup service as a daemon thread"""
     backup_thread = threading.Thread(target=backup_scheduler, daemon=True)
     backup_thread.start()
-    print("[BACKUP] Background backup service started")
+    logger.info("Background backup service started")
 
 
 if __name__ == '__main__':
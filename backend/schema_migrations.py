@@ -0,0 +1,334 @@
+"""
+Versioned schema migrations
+
+Migrations live in backend/migrations as NNNN_description.sql or
+NNNN_description.py. Each one is applied once, in version order, and recorded in
+the schema_version table, so once the schema is current init_db() costs a single
+SELECT instead of re-checking (and re-ALTERing) every table at startup.
+
+- .sql: statements separated by a ";" at the end of a line; "--" comment lines
+  are ignored
+- .py: a module with upgrade(session) (a DBSession), for data migrations and
+  DDL that depends on what is already there (use add_columns / add_indexes)
+
+MySQL commits DDL implicitly, so a migration is not atomic: one that fails is
+not recorded and runs again at the next start. Write migrations so that re-run
+is safe (IF NOT EXISTS; add_columns / add_indexes skip what already exists).
+Never edit an applied migration - add a new one (a changed file is reported).
+The checksum only covers the migration file, so a .py migration keeps its own
+copy of the DDL and SQL it runs and imports nothing from the application but
+the helpers below.
+
+ALTERs ask for online DDL and fall back step by step when the server cannot do
+it for that change: ALGORITHM=INSTANT (metadata only), then ALGORITHM=INPLACE
+with LOCK=NONE (no table copy, writes not blocked), then the server's default.
+
+Processes starting together (gunicorn workers) serialize on a MySQL named lock;
+the later ones find nothing left to apply.
+
+Usage:
+    python backend/schema_migrations.py            apply pending migrations
+    python backend/schema_migrations.py --status   list applied / pending migrations
+"""
+import logging
+import os
+import re
+import sys
+import time
+import hashlib
+import importlib.util
+
+# database first: it selects the pure-Python connector before mysql.connector loads
+from database import db_session
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+
+CREATE_SCHEMA_VERSION_TABLE = f'''
+    CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        duration_ms INT NOT NULL DEFAULT 0,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# MySQL named lock held while migrating (GET_LOCK is per server, so it covers every process)
+MIGRATION_LOCK_NAME = 'schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 600
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+# Tried in order for each ALTER; None = no hint (the server picks, possibly a table copy)
+ADD_COLUMN_ALGORITHMS = ('ALGORITHM=INSTANT', 'ALGORITHM=INPLACE, LOCK=NONE', None)
+ADD_INDEX_ALGORITHMS = ('ALGORITHM=INPLACE, LOCK=NONE', None)
+
+# ER_PARSE_ERROR (no INSTANT before MySQL 8.0), ER_UNKNOWN_ALTER_ALGORITHM,
+# ER_ALTER_OPERATION_NOT_SUPPORTED(_REASON): retry with the next algorithm
+_ALGORITHM_NOT_SUPPORTED = {1064, 1800, 1845, 1846}
+
+
+def get_migrations_dir():
+    """Folder containing the migration files (dev tree or PyInstaller bundle)"""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(sys._MEIPASS, 'migrations')
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+class Migration:
+    """One migration file"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'rb') as f:
+            self.source = f.read()
+        self.checksum = hashlib.sha256(self.source).hexdigest()
+
+    @property
+    def filename(self):
+        return os.path.basename(self.path)
+
+    def statements(self):
+        """SQL migration -> list of statements"""
+        lines = [line for line in self.source.decode('utf-8').splitlines() if not line.strip().startswith('--')]
+        statements, current = [], []
+        for line in lines:
+            current.append(line)
+            if line.rstrip().endswith(';'):
+                statements.append('\n'.join(current).strip().rstrip(';'))
+                current = []
+        tail = '\n'.join(current).strip()
+        if tail:
+            statements.append(tail)
+        return [statement for statement in statements if statement]
+
+    def apply(self, session):
+        if self.path.endswith('.sql'):
+            for statement in self.statements():
+                session.execute(statement, name='migrations.sql')
+            return
+        spec = importlib.util.spec_from_file_location(f'migration_{self.version:04d}', self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(session)
+
+
+def discover_migrations(directory=None):
+    """
+    Migration files in version order
+
+    Raises:
+        ValueError: If two files share a version number
+    """
+    directory = directory or get_migrations_dir()
+    migrations = {}
+    for filename in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {migrations[version].filename}, {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def applied_migrations(session):
+    """
+    Returns:
+        dict: version -> schema_version row
+    """
+    rows = session.fetchall(
+        f'SELECT version, name, checksum, duration_ms, applied_at FROM {SCHEMA_VERSION_TABLE}',
+        name='migrations.applied'
+    )
+    return {row['version']: row for row in rows}
+
+
+def _pending(session, migrations, warn=True):
+    applied = applied_migrations(session)
+    if not warn:
+        return [migration for migration in migrations if migration.version not in applied]
+    for migration in migrations:
+        row = applied.get(migration.version)
+        if row is not None and row['checksum'] != migration.checksum:
+            logger.warning(f"Migration {migration.filename} was changed after it was applied")
+    known = {migration.version for migration in migrations}
+    unknown = sorted(version for version in applied if version not in known)
+    if unknown:
+        logger.warning(f"Database has migrations this version does not know: {unknown}")
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+def _apply(session, migration):
+    logger.info(f"Applying migration {migration.filename}...")
+    started = time.perf_counter()
+    try:
+        migration.apply(session)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        session.execute(
+            f'INSERT INTO {SCHEMA_VERSION_TABLE} (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)',
+            (migration.version, migration.name, migration.checksum, duration_ms), name='migrations.record'
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        logger.error(f"Migration {migration.filename} failed")
+        raise
+    logger.info(f"Applied migration {migration.filename} ({duration_ms}ms)")
+
+
+def migrate(directory=None):
+    """
+    Apply pending migrations
+
+    Returns:
+        list: Filenames of the migrations applied (empty when the schema was current)
+
+    Raises:
+        RuntimeError: If another process held the migration lock for MIGRATION_LOCK_TIMEOUT seconds
+    """
+    migrations = discover_migrations(directory)
+    with db_session() as session:
+        session.execute(CREATE_SCHEMA_VERSION_TABLE, name='migrations.create')
+        if not _pending(session, migrations):
+            return []
+
+        row = session.fetchone(
+            'SELECT GET_LOCK(%s, %s) AS acquired', (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT),
+            name='migrations.lock'
+        )
+        if not row or row['acquired'] != 1:
+            raise RuntimeError(f"Timed out waiting {MIGRATION_LOCK_TIMEOUT}s for another process to finish migrating")
+        try:
+            # Another process may have applied some while we waited for the lock
+            pending = _pending(session, migrations, warn=False)
+            for migration in pending:
+                _apply(session, migration)
+            return [migration.filename for migration in pending]
+        finally:
+            session.fetchone('SELECT RELEASE_LOCK(%s) AS released', (MIGRATION_LOCK_NAME,), name='migrations.unlock')
+
+
+def migration_status(directory=None):
+    """
+    Returns:
+        list: One dict per migration file (version, filename, applied_at or None)
+    """
+    migrations = discover_migrations(directory)
+    with db_session() as session:
+        session.execute(CREATE_SCHEMA_VERSION_TABLE, name='migrations.create')
+        applied = applied_migrations(session)
+    return [
+        {
+            'version': migration.version,
+            'filename': migration.filename,
+            'applied_at': applied[migration.version]['applied_at'] if migration.version in applied else None,
+        }
+        for migration in migrations
+    ]
+
+
+# ==================== HELPERS FOR .py MIGRATIONS ====================
+
+def table_exists(session, table):
+    return session.fetchone('SHOW TABLES LIKE %s', (table,), name='migrations.show_tables') is not None
+
+
+def table_columns(session, table):
+    """
+    Returns:
+        dict: column name -> lowercase type (e.g. 'datetime', 'varchar(255)')
+    """
+    rows = session.fetchall(f'SHOW COLUMNS FROM {table}', name='migrations.show_columns')
+    return {row['Field']: str(row['Type']).lower() for row in rows}
+
+
+def table_indexes(session, table):
+    rows = session.fetchall(f'SHOW INDEX FROM {table}', name='migrations.show_index')
+    return {row['Key_name'] for row in rows}
+
+
+def alter_table(session, table, clauses, algorithms=(None,)):
+    """
+    One ALTER TABLE with every clause, trying each algorithm hint in turn
+
+    Returns:
+        str: The hint that worked ('DEFAULT' when none did)
+    """
+    for algorithm in algorithms:
+        parts = list(clauses) + ([algorithm] if algorithm else [])
+        try:
+            session.execute(f"ALTER TABLE {table} {', '.join(parts)}", name='migrations.alter')
+            return algorithm or 'DEFAULT'
+        except mysql.connector.Error as err:
+            if algorithm is None or err.errno not in _ALGORITHM_NOT_SUPPORTED:
+                raise
+    return 'DEFAULT'
+
+
+def add_columns(session, table, columns):
+    """
+    Add the columns the table does not have yet, in a single ALTER
+
+    Args:
+        columns (dict): column name -> definition (e.g. "DOUBLE DEFAULT 0")
+
+    Returns:
+        list: Names of the columns added
+    """
+    existing = table_columns(session, table)
+    missing = [name for name in columns if name not in existing]
+    if not missing:
+        return []
+    algorithm = alter_table(
+        session, table, [f"ADD COLUMN {name} {columns[name]}" for name in missing], ADD_COLUMN_ALGORITHMS
+    )
+    logger.info(f"Added column(s) to {table}: {', '.join(missing)} ({algorithm})")
+    return missing
+
+
+def add_indexes(session, table, indexes):
+    """
+    Add the indexes the table does not have yet (one ALTER each, so one failure names its index)
+
+    Args:
+        indexes (dict): index name -> definition (e.g. "INDEX idx_x (a, b)")
+
+    Returns:
+        list: Names of the indexes added
+    """
+    existing = table_indexes(session, table)
+    added = []
+    for name, definition in indexes.items():
+        if name in existing:
+            continue
+        algorithm = alter_table(session, table, [f"ADD {definition}"], ADD_INDEX_ALGORITHMS)
+        logger.info(f"Added index {name} to {table} ({algorithm})")
+        added.append(name)
+    return added
+
+
+def main(argv):
+    if '--status' in argv:
+        for row in migration_status():
+            state = f"applied {row['applied_at']}" if row['applied_at'] else 'pending'
+            print(f"{row['filename']:<45} {state}")
+        return 0
+
+    from database import init_connection_pool
+    from logging_setup import setup_logging
+    setup_logging()
+    init_connection_pool()
+    applied = migrate()
+    logger.info(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,318 @@
+"""
+Production entry point: the Flask app under a multi-threaded WSGI server
+
+    python -m backend.serve        (from the project root)
+    python backend/serve.py
+
+app.py's app.run() is Werkzeug's development server. This serves the same app
+with a production server, picked by "engine":
+
+- waitress (Windows and Linux): one process with `threads` request threads
+- gunicorn (Linux/macOS only): `workers` processes x `threads` threads (gthread)
+- werkzeug: threaded fallback when neither is installed
+"auto" uses gunicorn when workers > 1, otherwise waitress, otherwise werkzeug.
+
+Shutdown (SIGTERM, Ctrl+C, Ctrl+Break on Windows) is graceful: the listening
+socket closes at once, requests already running (slip saves, PDF renders) get up
+to `graceful_timeout` seconds to finish, then the PDF job queue, the browser
+pool and the database pool are shut down. A second signal skips the wait.
+
+With gunicorn and workers > 1 every worker is a separate process with its own
+in-memory caches (set "dashboard_cache": {"store": "sqlite"} so a save in one
+worker invalidates all of them). The scheduled backup, the idempotency purge and
+the PDF job workers run in exactly one worker (the others only queue PDF jobs).
+Every worker renders its own on-demand PDFs with its own warm browsers:
+pdf.pool_size is divided among the workers (at least one browser each), so
+expect max(pool_size, workers) Chromium processes in total.
+
+CONFIGURATION (config.json "server" block, all optional):
+- host, port: bind address
+- engine: "auto", "waitress", "gunicorn" or "werkzeug"
+- workers: processes (gunicorn only)
+- threads: request threads per process
+- keepalive: seconds an idle keep-alive connection is kept open
+- graceful_timeout: seconds running requests get to finish at shutdown
+- timeout: gunicorn worker timeout (must exceed the slowest request)
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+
+# Bare module imports (database, app, ...) as in the rest of the backend
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config_loader import get_config_section
+from logging_setup import setup_logging, stop_logging
+
+logger = logging.getLogger(__name__)
+
+SERVER_DEFAULTS = {
+    'host': '127.0.0.1',
+    'port': 5000,
+    'engine': 'auto',
+    'workers': 1,
+    'threads': 8,
+    'keepalive': 5,
+    'graceful_timeout': 30,
+    'timeout': 120,
+}
+
+SERVER_ENGINES = ('auto', 'waitress', 'gunicorn', 'werkzeug')
+
+# "0" in a gunicorn worker that must not start the scheduled background jobs (read by app.py)
+BACKGROUND_JOBS_ENV = 'SLIP_SERVER_BACKGROUND_JOBS'
+
+# Number of gunicorn workers, inherited by each of them (read by pdf_engine.py)
+SERVER_WORKERS_ENV = 'SLIP_SERVER_WORKERS'
+
+
+class _StopServing(BaseException):
+    """
+    Raised in the main thread by the shutdown signal handler
+
+    A BaseException, like KeyboardInterrupt: waitress's event loop wraps channel
+    callbacks in `except Exception`, which would swallow it and skip the shutdown
+    """
+
+
+def _raise_stop(signum, frame):
+    raise _StopServing(signal.Signals(signum).name)
+
+
+def _install_signal_handlers():
+    for name in ('SIGTERM', 'SIGINT', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), _raise_stop)
+
+
+def _is_installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def choose_engine(settings):
+    """Resolve "auto" to the best installed server"""
+    engine = settings['engine']
+    if engine not in SERVER_ENGINES:
+        raise ValueError(f"server.engine must be one of: {', '.join(SERVER_ENGINES)}")
+    if engine != 'auto':
+        return engine
+
+    gunicorn = os.name != 'nt' and _is_installed('gunicorn')
+    if int(settings['workers']) > 1 and gunicorn:
+        return 'gunicorn'
+    if _is_installed('waitress'):
+        return 'waitress'
+    if gunicorn:
+        return 'gunicorn'
+    return 'werkzeug'
+
+
+class InFlightRequests:
+    """WSGI middleware counting requests whose response has not been fully sent"""
+
+    def __init__(self, app):
+        self.app = app
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        with self._cond:
+            self.active += 1
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        # The server calls close() once the last byte is handed to the socket
+        return ClosingIterator(response, [self._finished])
+
+    def _finished(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout):
+        """Block until no request is running; returns False if `timeout` expired first"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.active > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+
+def shutdown_services(timeout=10):
+    """Stop background workers and close pooled connections (after HTTP traffic has drained)"""
+    try:
+        from pdf_jobs import stop_pdf_job_queue
+        from pdf_engine import stop_pdf_engine
+        stop_pdf_job_queue(timeout)
+        stop_pdf_engine()
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.warning(f"PDF service shutdown error: {e}")
+
+    from database import close_connection_pool
+    close_connection_pool()
+    logger.info("Background services stopped")
+    stop_logging()
+
+
+# ==================== WAITRESS ====================
+
+def _waitress_flushing(server):
+    return any(channel.total_outbufs_len for channel in list(server.active_channels.values()))
+
+
+def serve_waitress(app, settings):
+    from waitress.server import create_server
+    from waitress import wasyncore
+
+    wrapped = InFlightRequests(app)
+    server = create_server(
+        wrapped,
+        host=settings['host'],
+        port=int(settings['port']),
+        threads=int(settings['threads']),
+        channel_timeout=int(settings['keepalive']),
+    )
+    logger.info(f"waitress listening on http://{settings['host']}:{settings['port']} "
+                f"({settings['threads']} threads)")
+
+    _install_signal_handlers()
+    try:
+        server.asyncore.loop(timeout=server.adj.asyncore_loop_timeout, map=server._map)
+    except (_StopServing, KeyboardInterrupt) as e:
+        logger.info(f"Shutting down ({e or 'interrupted'}) - finishing {wrapped.active} running request(s)")
+
+    # Stop listening but keep the loop (and its wake-up trigger) running: the loop
+    # is what writes responses produced by the request threads to the sockets
+    wasyncore.dispatcher.close(server)
+    deadline = time.monotonic() + float(settings['graceful_timeout'])
+    try:
+        while (wrapped.active or _waitress_flushing(server)) and time.monotonic() < deadline:
+            server.asyncore.loop(timeout=0.2, map=server._map, count=1)
+    except (_StopServing, KeyboardInterrupt):
+        logger.warning("Second shutdown signal - not waiting for running requests")
+    if wrapped.active:
+        logger.warning(f"{wrapped.active} request(s) still running at shutdown")
+
+    server.task_dispatcher.shutdown(cancel_pending=True, timeout=1)
+    wasyncore.close_all(server._map)
+
+
+# ==================== WERKZEUG ====================
+
+def serve_werkzeug(app, settings):
+    from werkzeug.serving import make_server
+
+    wrapped = InFlightRequests(app)
+    server = make_server(settings['host'], int(settings['port']), wrapped, threaded=True)
+    logger.info(f"werkzeug (threaded) listening on http://{settings['host']}:{settings['port']} - "
+                f"install waitress for production use")
+
+    _install_signal_handlers()
+    try:
+        server.serve_forever()
+    except (_StopServing, KeyboardInterrupt) as e:
+        logger.info(f"Shutting down ({e or 'interrupted'}) - finishing {wrapped.active} running request(s)")
+
+    # Request threads write their own responses; just stop accepting and wait
+    server.socket.close()
+    try:
+        if not wrapped.wait_idle(float(settings['graceful_timeout'])):
+            logger.warning(f"{wrapped.active} request(s) still running at shutdown")
+    except (_StopServing, KeyboardInterrupt):
+        logger.warning("Second shutdown signal - not waiting for running requests")
+
+
+# ==================== GUNICORN ====================
+
+def _gunicorn_pre_fork(server, worker):
+    # Runs in the master: hand the scheduled jobs to this worker unless a live one has them
+    if not any(getattr(other, 'background_jobs', False) for other in server.WORKERS.values()):
+        worker.background_jobs = True
+
+
+def _gunicorn_post_fork(server, worker):
+    os.environ[BACKGROUND_JOBS_ENV] = '1' if getattr(worker, 'background_jobs', False) else '0'
+
+
+def _gunicorn_worker_exit(server, worker):
+    # Gunicorn has already drained this worker's requests (graceful_timeout)
+    shutdown_services()
+
+
+def serve_gunicorn(settings):
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        'bind': f"{settings['host']}:{settings['port']}",
+        'workers': int(settings['workers']),
+        'threads': int(settings['threads']),
+        'worker_class': 'gthread',
+        'keepalive': int(settings['keepalive']),
+        'graceful_timeout': int(settings['graceful_timeout']),
+        'timeout': int(settings['timeout']),
+        # Each worker imports the app itself (after post_fork has set BACKGROUND_JOBS_ENV)
+        'preload_app': False,
+        'pre_fork': _gunicorn_pre_fork,
+        'post_fork': _gunicorn_post_fork,
+        'worker_exit': _gunicorn_worker_exit,
+    }
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app, start_deferred_startup
+            start_deferred_startup(app)
+            return app
+
+    os.environ[SERVER_WORKERS_ENV] = str(options['workers'])
+    logger.info(f"gunicorn starting on http://{options['bind']} "
+                f"({options['workers']} workers x {options['threads']} threads)")
+    Application().run()
+
+
+def main():
+    setup_logging()
+    settings = get_config_section('server', SERVER_DEFAULTS)
+    engine = choose_engine(settings)
+    logger.info(f"Production server: {engine}")
+
+    if engine == 'gunicorn':
+        serve_gunicorn(settings)
+        return 0
+
+    if int(settings['workers']) > 1:
+        logger.warning(f"server.workers={settings['workers']} needs gunicorn; "
+                       f"{engine} runs one process with {settings['threads']} threads")
+
+    from app import app, start_deferred_startup
+    # Schema and background services come up while the server starts listening
+    start_deferred_startup(app)
+    if engine == 'waitress':
+        serve_waitress(app, settings)
+    else:
+        serve_werkzeug(app, settings)
+    shutdown_services()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
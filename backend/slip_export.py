@@ -0,0 +1,247 @@
+"""
+Streaming CSV / XLSX export of purchase slips (GET /api/slips/export)
+
+Rows come from an unbuffered cursor (DBSession.iterate) and are written to the
+response as they arrive, so memory stays flat however many years are exported:
+
+- csv: UTF-8 with a BOM (so Excel detects the encoding), sent every
+  FLUSH_ROWS rows
+- xlsx: a minimal SpreadsheetML workbook written with zipfile; the sheet XML is
+  deflated straight into the response (inline strings, no shared-string table,
+  which would need every string in memory first)
+
+Dates are written as text in the format_ist_datetime format (DD-MM-YYYY HH:MM).
+"""
+import io
+import re
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from repository import SLIP_WRITE_COLUMNS
+from streaming import ChunkWriter
+
+FLUSH_ROWS = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Every exportable column -> 'text' / 'number' / 'datetime'
+EXPORT_COLUMN_KINDS = dict([('id', 'number'), ('bill_no', 'number')] + SLIP_WRITE_COLUMNS + [('balance', 'number')])
+
+DEFAULT_EXPORT_COLUMNS = [
+    'bill_no', 'date', 'party_name', 'vehicle_no', 'material_name', 'broker', 'paddy_unloading_godown',
+    'bags', 'net_weight_kg', 'final_weight_kg', 'weight_quintal', 'rate_basis', 'rate_value',
+    'total_purchase_amount', 'total_deduction', 'payable_amount', 'total_paid', 'balance',
+]
+
+# Header labels that are not just the column name in title case
+EXPORT_HEADERS = {
+    'id': 'ID',
+    'bill_no': 'Bill No',
+    'net_weight_kg': 'Net Weight (Kg)',
+    'gunny_weight_kg': 'Gunny Weight (Kg)',
+    'final_weight_kg': 'Final Weight (Kg)',
+    'weight_quintal': 'Weight (Quintal)',
+    'weight_khandi': 'Weight (Khandi)',
+    'paddy_unloading_godown': 'Unloading Godown',
+    'gst_no': 'GST No',
+    'company_gst_no': 'Company GST No',
+}
+
+# Characters XML 1.0 does not allow (Excel refuses the file)
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def parse_columns(value):
+    """
+    ?columns=a,b,c -> column list (the default set when empty)
+
+    Raises:
+        ValueError: If a column is not exportable
+    """
+    if not value:
+        return list(DEFAULT_EXPORT_COLUMNS)
+    columns = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in columns if name not in EXPORT_COLUMN_KINDS]
+    if unknown:
+        raise ValueError(f"Unknown export column(s): {', '.join(unknown)}")
+    return columns
+
+
+def column_header(name):
+    return EXPORT_HEADERS.get(name, name.replace('_', ' ').title())
+
+
+def export_filename(export_format, date_from=None, date_to=None, party=None):
+    """purchase_slips[_party][_from_to].<format>"""
+    parts = ['purchase_slips']
+    if party:
+        parts.append(re.sub(r'[^A-Za-z0-9]+', '_', party).strip('_') or 'party')
+    if date_from is not None or date_to is not None:
+        parts.append(date_from.strftime('%Y%m%d') if date_from is not None else 'start')
+        parts.append(date_to.strftime('%Y%m%d') if date_to is not None else 'end')
+    return '_'.join(parts) + '.' + export_format
+
+
+def _cell_values(row, columns, format_date):
+    for name in columns:
+        value = row.get(name)
+        if value is not None and EXPORT_COLUMN_KINDS[name] == 'datetime':
+            value = format_date(value)
+        yield name, value
+
+
+def iter_csv(rows, columns, format_date):
+    """
+    Yields:
+        bytes: CSV chunks (header first)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([column_header(name) for name in columns])
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(['' if value is None else value for _, value in _cell_values(row, columns, format_date)])
+        if count % FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Purchase Slips" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style 0: default, style 1: bold (header row)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+_SHEET_END = '</sheetData></worksheet>'
+
+
+def _column_letter(index):
+    """0 -> A, 25 -> Z, 26 -> AA"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _text_cell(ref, value, style=''):
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"{style}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(row_no, letters, values):
+    cells = []
+    for letter, (kind, value) in zip(letters, values):
+        if value is None or value == '':
+            continue
+        ref = f'{letter}{row_no}'
+        if kind == 'number' and isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        else:
+            cells.append(_text_cell(ref, value))
+    return f'<row r="{row_no}">{"".join(cells)}</row>'
+
+
+def iter_xlsx(rows, columns, format_date):
+    """
+    Yields:
+        bytes: Chunks of the .xlsx (ZIP) file
+    """
+    letters = [_column_letter(i) for i in range(len(columns))]
+    kinds = [EXPORT_COLUMN_KINDS[name] for name in columns]
+    writer = ChunkWriter()
+
+    with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _STYLES)
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            header = ''.join(
+                _text_cell(f'{letter}1', column_header(name), ' s="1"') for letter, name in zip(letters, columns)
+            )
+            sheet.write((_SHEET_START + f'<row r="1">{header}</row>').encode('utf-8'))
+
+            for row_no, row in enumerate(rows, 2):
+                values = zip(kinds, (value for _, value in _cell_values(row, columns, format_date)))
+                sheet.write(_xlsx_row(row_no, letters, values).encode('utf-8'))
+                if row_no % FLUSH_ROWS == 0:
+                    chunk = writer.take()
+                    if chunk:
+                        yield chunk
+
+            sheet.write(_SHEET_END.encode('utf-8'))
+
+    yield writer.take()
@@ -0,0 +1,223 @@
+"""
+Bulk import of purchase slips (POST /api/slips/import)
+
+Posting a season of weighbridge tickets one by one to /api/add-slip costs a
+transaction, a bill number round trip and a single-row INSERT per slip. The
+import instead:
+
+- reads the upload as a stream (CSV with a header row, or NDJSON: one JSON
+  object per line), so memory stays flat however large the file is
+- prepares every row on its own (the route runs calculate_fields on it); a row
+  that fails validation is reported with its line number and skipped
+- writes the valid rows in chunks of `batch_size`, one transaction per chunk:
+  one bill number reservation per financial year, one multi-row INSERT for the
+  slips, one for their payments, then one upsert per rollup cell they touch
+
+A chunk the database rejects is rolled back and each of its rows is reported;
+chunks committed before it stay imported.
+
+CONFIGURATION (config.json "slip_import" block, all optional):
+- batch_size: rows per chunk (and transaction)
+- max_errors: row errors listed in the response (all of them are counted)
+"""
+import io
+import csv
+import json
+import time
+import logging
+
+from database import transaction
+from repository import SlipRepository, PaymentRepository, slip_count_cache
+from bill_numbers import reserve_bill_numbers, format_fiscal_year
+from rollup import cell_deltas, update_cells
+from dashboard_cache import invalidate_dashboard_cache
+
+logger = logging.getLogger(__name__)
+
+IMPORT_DEFAULTS = {
+    'batch_size': 500,
+    'max_errors': 1000,
+}
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+def detect_format(requested=None, filename=None, mimetype=None):
+    """
+    Upload format from ?format=, else the file name / Content-Type (CSV by default)
+
+    Raises:
+        ValueError: If an unknown format was requested
+    """
+    if requested:
+        requested = requested.strip().lower()
+        if requested == 'jsonl':
+            requested = 'ndjson'
+        if requested not in IMPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+        return requested
+
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')) or 'json' in (mimetype or '').lower():
+        return 'ndjson'
+    return 'csv'
+
+
+def iter_csv_records(stream):
+    """(line number, record dict or ValueError) for each data row of a CSV byte stream"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [(name or '').strip() for name in reader.fieldnames]
+
+    for record in reader:
+        if None in record:
+            yield reader.line_num, ValueError('Row has more values than the header')
+            continue
+        # Short rows: missing trailing cells are blank
+        yield reader.line_num, {key: ('' if value is None else value) for key, value in record.items()}
+
+
+def iter_ndjson_records(stream):
+    """(line number, record dict or ValueError) for each non-blank line of an NDJSON byte stream"""
+    for line_no, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, ValueError(f'Invalid JSON: {e}')
+            continue
+        if not isinstance(record, dict):
+            yield line_no, ValueError('Each line must be a JSON object')
+            continue
+        yield line_no, record
+
+
+def read_records(stream, import_format):
+    if import_format == 'ndjson':
+        return iter_ndjson_records(stream)
+    return iter_csv_records(stream)
+
+
+class SlipImporter:
+    """Validates a stream of slip records and inserts the valid ones in chunked transactions"""
+
+    def __init__(self, prepare, batch_size=500, max_errors=1000):
+        """
+        Args:
+            prepare (callable): record dict -> (values, payments, fiscal_year);
+                raises ValueError for an invalid row
+            batch_size (int): Rows per chunk / transaction
+            max_errors (int): Row errors kept for the response
+        """
+        self.prepare = prepare
+        self.batch_size = max(1, int(batch_size))
+        self.max_errors = max(0, int(max_errors))
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.bill_numbers = {}   # fiscal_year -> [lowest, highest] bill number issued
+        self.read_error = None
+
+    def _error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': line_no, 'message': message})
+
+    def run(self, records):
+        """
+        Import every record of an iterator of (line number, record or ValueError)
+
+        Returns:
+            dict: Counts, row errors, bill number ranges and throughput
+        """
+        started = time.time()
+        chunk = []
+        try:
+            for line_no, record in records:
+                self.rows += 1
+                if isinstance(record, ValueError):
+                    self._error(line_no, str(record))
+                    continue
+                try:
+                    values, payments, fiscal_year = self.prepare(record)
+                except ValueError as e:
+                    self._error(line_no, str(e))
+                    continue
+
+                chunk.append((line_no, values, payments, fiscal_year))
+                if len(chunk) >= self.batch_size:
+                    self._write_chunk(chunk)
+                    chunk = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            # The rest of the upload is unreadable; keep what was read so far
+            self.read_error = f'Upload could not be read after row {self.rows}: {e}'
+            logger.warning(f"{self.read_error}")
+
+        if chunk:
+            self._write_chunk(chunk)
+
+        elapsed = time.time() - started
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'read_error': self.read_error,
+            'bill_numbers': [
+                {'fiscal_year': format_fiscal_year(fiscal_year), 'first': first, 'last': last}
+                for fiscal_year, (first, last) in sorted(self.bill_numbers.items())
+            ],
+            'elapsed_seconds': round(elapsed, 2),
+            'rows_per_minute': round(self.imported * 60.0 / elapsed) if elapsed > 0 else None,
+        }
+
+    def _write_chunk(self, chunk):
+        by_year = {}
+        for item in chunk:
+            by_year.setdefault(item[3], []).append(item)
+
+        try:
+            with transaction() as session:
+                slips = SlipRepository(session)
+                rows = []
+                ranges = []
+                # Years in a fixed order so concurrent imports lock bill_sequences rows alike
+                for fiscal_year in sorted(by_year):
+                    items = by_year[fiscal_year]
+                    first = reserve_bill_numbers(session, fiscal_year, len(items))
+                    ranges.append((fiscal_year, first, first + len(items) - 1))
+                    rows += [(values, first + offset, fiscal_year) for offset, (_, values, _, _) in enumerate(items)]
+
+                slips.insert_many(rows)
+
+                # A multi-row INSERT only reports its first id; look the ids up by bill number
+                slip_ids = []
+                payments_by_slip = []
+                for fiscal_year, first, last in ranges:
+                    ids = slips.ids_for_bill_range(fiscal_year, first, last)
+                    for offset, (_, _, payments, _) in enumerate(by_year[fiscal_year]):
+                        slip_id = ids[first + offset]
+                        slip_ids.append(slip_id)
+                        payments_by_slip.append((slip_id, payments))
+
+                PaymentRepository(session).insert_many(payments_by_slip)
+                update_cells(session, added=cell_deltas(session, slip_ids))
+        except Exception as e:
+            logger.error(f"Import chunk of {len(chunk)} row(s) rolled back: {e}")
+            for line_no, _, _, _ in chunk:
+                self._error(line_no, f'Not saved (batch rolled back): {e}')
+            return
+
+        self.imported += len(chunk)
+        for fiscal_year, first, last in ranges:
+            issued = self.bill_numbers.setdefault(fiscal_year, [first, last])
+            issued[0] = min(issued[0], first)
+            issued[1] = max(issued[1], last)
+
+        slip_count_cache.adjust(len(chunk))
+        invalidate_dashboard_cache()
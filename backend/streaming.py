@@ -0,0 +1,22 @@
+"""
+Helpers for responses generated chunk by chunk (ZIP / XLSX streams)
+"""
+
+
+class ChunkWriter:
+    """Write-only file object collecting ZipFile output between yields (non-seekable)"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,71 @@
+"""
+Shared Jinja2 environment for the slip print template
+
+Both the PDF pipeline (pdf_service) and the /print/<id> view render through this
+one Environment, so the template is parsed and compiled once per process and
+both outputs are produced by identical settings (autoescaping included).
+
+- Compiled template bytecode is cached on disk (FileSystemBytecodeCache), so even
+  a fresh process skips the Python code generation step
+- auto_reload (re-stat the template file on every render) is enabled only in
+  development; the packaged app compiles the template once
+"""
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+
+from metrics import PhaseTimer
+
+logger = logging.getLogger(__name__)
+
+PRINT_TEMPLATE = 'print_template_new.html'
+
+_env = None
+_env_lock = threading.Lock()
+
+
+def is_dev_mode():
+    """Development = running from source (the packaged exe is frozen)"""
+    return not getattr(sys, 'frozen', False)
+
+
+def get_templates_dir():
+    """Template folder in the dev tree or PyInstaller bundle"""
+    if getattr(sys, 'frozen', False):
+        return os.path.join(sys._MEIPASS, 'templates')
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+
+def _make_bytecode_cache():
+    cache_dir = os.path.join(tempfile.gettempdir(), 'smart_purchase_slip_jinja_cache')
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        return FileSystemBytecodeCache(cache_dir)
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled ({cache_dir}): {e}")
+        return None
+
+
+def get_template_env():
+    """Return the process-wide Jinja2 environment (created on first use)"""
+    global _env
+    with _env_lock:
+        if _env is None:
+            _env = Environment(
+                loader=FileSystemLoader(get_templates_dir()),
+                autoescape=select_autoescape(['html', 'xml']),
+                auto_reload=is_dev_mode(),
+                bytecode_cache=_make_bytecode_cache(),
+                cache_size=50
+            )
+        return _env
+
+
+def render_template_file(name, **context):
+    """Render a template from the shared environment"""
+    with PhaseTimer('render'):
+        return get_template_env().get_template(name).render(**context)
@@ -0,0 +1,100 @@
+"""
+The NumPy batch path of calculate_batch() must match calculate_fields() exactly:
+same values and same types, so a slip serializes identically from either path
+
+    python -m pytest backend/tests
+"""
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calculations
+from calculations import CALCULATED_FIELDS, INPUT_FIELDS, calculate_batch, calculate_fields
+
+pytestmark = pytest.mark.skipif(not calculations.NUMPY_AVAILABLE, reason='NumPy is not installed')
+
+BLANKS = [None, '', ' ', 'abc']
+
+
+def _scalar(rows):
+    return [{name: calculate_fields(dict(row))[name] for name in CALCULATED_FIELDS} for row in rows]
+
+
+def _assert_same(rows):
+    scalar = _scalar(rows)
+    batch = calculate_batch(rows, use_numpy=True)
+    assert len(batch) == len(scalar)
+    for index, (expected, actual) in enumerate(zip(scalar, batch)):
+        for name in CALCULATED_FIELDS:
+            assert type(actual[name]) is type(expected[name]), (index, name, expected[name], actual[name])
+            assert actual[name] == expected[name], (index, name, rows[index], expected[name], actual[name])
+        assert json.dumps(actual, sort_keys=True) == json.dumps(expected, sort_keys=True)
+
+
+def _random_value(rng, field):
+    roll = rng.random()
+    if roll < 0.1:
+        return rng.choice(BLANKS)
+    if roll < 0.15:
+        return 0
+    if roll < 0.2:
+        return -rng.uniform(0, 100)
+    if field in ('net_weight_kg', 'gunny_weight_kg'):
+        value = rng.uniform(0, 50000)
+    elif field == 'bags':
+        value = rng.randint(0, 600)
+    elif field.endswith('_percent'):
+        value = rng.uniform(0, 5)
+    elif field == 'rate_value':
+        value = rng.uniform(1000, 4000)
+    else:
+        value = rng.uniform(0, 2000)
+    # Values with few decimals land on rounding ties far more often than random floats
+    value = round(value, rng.choice([0, 1, 2, 3, 6]))
+    return str(value) if rng.random() < 0.3 else value
+
+
+def test_blank_slip_gives_float_zeros():
+    rows = [{}, {name: '' for name in INPUT_FIELDS}, {name: None for name in INPUT_FIELDS}]
+    _assert_same(rows)
+    for result in calculate_batch(rows, use_numpy=True):
+        for name in CALCULATED_FIELDS:
+            if name != 'rate_basis':
+                assert isinstance(result[name], float), name
+
+
+def test_rate_basis_variants():
+    base = {'net_weight_kg': 10250.5, 'gunny_weight_kg': 120, 'bags': 205, 'rate_value': 2150}
+    rows = [dict(base, rate_basis=basis) for basis in ('Quintal', 'Khandi', 'Other', '', None)]
+    rows.append(dict(base))
+    _assert_same(rows)
+
+
+def test_rounding_ties():
+    # x.xx5 amounts: Python's round() and NumPy's rint() must pick the same neighbour
+    rows = [
+        {'net_weight_kg': 1000 + i * 0.5, 'gunny_weight_kg': 0.125 * i, 'bags': i % 7,
+         'rate_value': 2000 + i * 0.25, 'batav_percent': 0.5, 'dalali_rate': 1.005 * (i % 3)}
+        for i in range(400)
+    ]
+    _assert_same(rows)
+
+
+def test_random_slips_match_scalar_path():
+    rng = random.Random(20)
+    rows = []
+    for _ in range(3000):
+        row = {field: _random_value(rng, field) for field in INPUT_FIELDS if rng.random() > 0.05}
+        row['rate_basis'] = rng.choice(['Quintal', 'Quintal', 'Khandi', 'Other'])
+        rows.append(row)
+    _assert_same(rows)
+
+
+def test_python_fallback_matches_scalar_path():
+    rows = [{'net_weight_kg': '5000', 'gunny_weight_kg': '', 'bags': 100, 'rate_value': 2100}, {}]
+    assert calculate_batch(rows, use_numpy=False) == _scalar(rows)
@@ -0,0 +1,70 @@
+"""
+PDFCache instances of several server workers share one directory: a PDF stored by
+one must be served, invalidated and counted against the limits by the others
+
+    python -m pytest backend/tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_cache import PDFCache
+
+
+def _pdf(size, fill=b'x'):
+    return b'%PDF' + fill * (size - 4)
+
+
+def test_get_adopts_file_stored_by_other_worker(tmp_path):
+    writer = PDFCache(str(tmp_path))
+    reader = PDFCache(str(tmp_path))
+
+    writer.put(7, 'abc123', _pdf(100))
+
+    assert reader.get('abc123', 7)[0] == _pdf(100)
+    assert reader.stats()['entries'] == 1
+    assert reader.stats()['hits'] == 1
+
+
+def test_get_without_slip_id_finds_file_by_key(tmp_path):
+    writer = PDFCache(str(tmp_path))
+    reader = PDFCache(str(tmp_path))
+
+    writer.put(7, 'abc123', _pdf(100))
+
+    assert reader.get('abc123')[0] == _pdf(100)
+    assert reader.get('missing') is None
+    assert reader.stats()['misses'] == 1
+
+
+def test_invalidate_removes_other_workers_files(tmp_path):
+    first = PDFCache(str(tmp_path))
+    second = PDFCache(str(tmp_path))
+
+    first.put(7, 'old', _pdf(100))
+    second.put(7, 'older', _pdf(100))
+    first.put(8, 'other', _pdf(100))
+
+    assert second.invalidate(7) == 2
+    assert first.get('old', 7) is None
+    assert sorted(os.listdir(tmp_path)) == ['8_other.pdf']
+
+
+def test_byte_limit_covers_all_workers(tmp_path):
+    first = PDFCache(str(tmp_path), max_bytes=350)
+    second = PDFCache(str(tmp_path), max_bytes=350)
+
+    first.put(1, 'a', _pdf(100))
+    first.put(2, 'b', _pdf(100))
+    second.put(3, 'c', _pdf(100))
+    second.put(4, 'd', _pdf(100))
+
+    total = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+    assert total <= 350
+    assert not os.path.exists(os.path.join(tmp_path, '1_a.pdf'))
+    assert second.stats()['bytes'] == total
+
+    # first still has the evicted file indexed - the read falls back to a clean miss
+    assert first.get('a', 1) is None
+    assert first.get('d', 4)[0] == _pdf(100)
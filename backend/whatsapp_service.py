@@ -15,12 +15,15 @@ To obtain credentials:
 4. Generate a permanent access token from WhatsApp > Configuration
 """
 
+import logging
 import os
 import sys
 import json
 import requests
 from flask import current_app
 
+logger = logging.getLogger(__name__)
+
 # WhatsApp Business API configuration
 WHATSAPP_API_VERSION = "v18.0"
 WHATSAPP_API_BASE_URL = f"https://graph.facebook.com/{WHATSAPP_API_VERSION}"
@@ -59,10 +62,10 @@ def load_whatsapp_config():
 
                         if whatsapp_config:
                             config.update(whatsapp_config)
-                            print(f"[OK] Loaded WhatsApp config from: {config_path}")
+                            logger.debug(f"Loaded WhatsApp config from: {config_path}")
                             break
         except Exception as e:
-            print(f"[WARNING] Could not load WhatsApp config from file: {e}")
+            logger.warning(f"Could not load WhatsApp config from file: {e}")
 
     return config
 
@@ -134,14 +137,14 @@ def send_pdf_via_whatsapp(recipient_number, pdf_url, message_text=None):
     }
 
     try:
-        print(f"[INFO] Sending PDF via WhatsApp to {recipient_clean}")
-        print(f"[INFO] PDF URL: {pdf_url}")
+        logger.info(f"Sending PDF via WhatsApp to {recipient_clean}")
+        logger.debug(f"PDF URL: {pdf_url}")
 
         response = requests.post(url, headers=headers, json=payload, timeout=30)
         response.raise_for_status()
 
         result = response.json()
-        print(f"[OK] WhatsApp message sent successfully. Message ID: {result.get('messages', [{}])[0].get('id')}")
+        logger.info(f"WhatsApp message sent successfully. Message ID: {result.get('messages', [{}])[0].get('id')}")
 
         return {
             'success': True,
@@ -151,7 +154,7 @@ def send_pdf_via_whatsapp(recipient_number, pdf_url, message_text=None):
         }
 
     except requests.exceptions.RequestException as e:
-        print(f"[ERROR] WhatsApp API request failed: {e}")
+        logger.error(f"WhatsApp API request failed: {e}")
 
         error_details = {
             'success': False,
@@ -163,7 +166,7 @@ def send_pdf_via_whatsapp(recipient_number, pdf_url, message_text=None):
             try:
                 error_response = json.loads(e.response.text)
                 error_details['error_response'] = error_response
-                print(f"[ERROR] WhatsApp API error response: {error_response}")
+                logger.error(f"WhatsApp API error response: {error_response}")
             except:
                 pass
 
@@ -219,7 +222,7 @@ def send_text_message(recipient_number, message_text):
         }
 
     except requests.exceptions.RequestException as e:
-        print(f"[ERROR] WhatsApp text message failed: {e}")
+        logger.error(f"WhatsApp text message failed: {e}")
         raise
 
 
@@ -266,17 +269,16 @@ def get_configuration_instructions():
 
 # Test function
 if __name__ == '__main__':
-    print("WhatsApp Business API Service - Configuration Check")
-    print("=" * 60)
+    from logging_setup import setup_logging
+    setup_logging()
+    logger.info("WhatsApp Business API Service - Configuration Check")
 
     if is_whatsapp_configured():
-        print("[OK] WhatsApp Business API is configured!")
+        logger.info("WhatsApp Business API is configured!")
         config = load_whatsapp_config()
-        print(f"[INFO] Phone Number ID: {config['phone_number_id'][:8]}...")
-        print(f"[INFO] Access Token: {'*' * 20}")
+        logger.info(f"Phone Number ID: {config['phone_number_id'][:8]}...")
+        logger.info(f"Access Token: {'*' * 20}")
     else:
-        print("[WARNING] WhatsApp Business API is NOT configured")
-        print("\nConfiguration instructions:")
+        logger.warning("WhatsApp Business API is NOT configured")
         instructions = get_configuration_instructions()
-        for line in instructions['instructions']:
-            print(line)
+        logger.info("Configuration instructions:\n" + '\n'.join(instructions['instructions']))
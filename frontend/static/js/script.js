@@ -1,5 +1,17 @@
 console.log('🚀 script.js loaded successfully at ' + new Date().toISOString());
 
+// Idempotency-Key for slip submits: one per filled-in form, reused when the same
+// submit is retried, so the server saves the slip only once.
+// crypto.randomUUID needs a secure context; LAN http access falls back to getRandomValues.
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+        return window.crypto.randomUUID();
+    }
+    const bytes = new Uint8Array(16);
+    window.crypto.getRandomValues(bytes);
+    return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
 // Global function for inline onclick fallback
 window.handleSaveGodown = function() {
     console.log('🎯 GLOBAL handleSaveGodown called');
@@ -266,9 +278,15 @@ document.addEventListener('DOMContentLoaded', function() {
     });
     console.log('✅ All .calc-input event listeners attached');
 
+    let slipIdempotencyKey = null;
+
     form.addEventListener('submit', async function(e) {
         e.preventDefault();
 
+        if (!slipIdempotencyKey) {
+            slipIdempotencyKey = newIdempotencyKey();
+        }
+
         // Prevent double submission
         const submitBtn = form.querySelector('button[type="submit"]');
         if (submitBtn) {
@@ -302,12 +320,16 @@ document.addEventListener('DOMContentLoaded', function() {
             const response = await fetch('/api/add-slip', {
                 method: 'POST',
                 headers: {
-                    'Content-Type': 'application/json'
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': slipIdempotencyKey
                 },
                 body: JSON.stringify(data)
             });
 
             if (!response.ok) {
+                // The server answered and nothing was saved: a corrected submit is a new request.
+                // (A network error keeps the key, so retrying cannot save the slip twice.)
+                slipIdempotencyKey = null;
                 const errorText = await response.text();
                 throw new Error(`Server error: ${response.status} - ${errorText}`);
             }
@@ -342,6 +364,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (confirm('Are you sure you want to clear the form?')) {
                 console.log('🗑️ Clearing form...');
                 form.reset();
+                slipIdempotencyKey = null;
                 const now = new Date();
                 const istOffset = 5.5 * 60 * 60 * 1000;
                 const istTime = new Date(now.getTime() + istOffset);